@@ -0,0 +1,304 @@
+"""Stitching in a pool of worker processes, with bounded admission.
+
+Frame parsing and pumping PCM through ffmpeg are CPU work. Run in
+`asyncio.to_thread`, they compete for the GIL with the event loop that
+serves the API, and several episodes stitching at once contend with each
+other. With AUDIO_WORKERS > 0, each episode's StreamingStitcher lives in
+one of that many worker processes, so stitch throughput scales with cores.
+An episode stays on the worker it was opened on, and new episodes go to
+the worker with the fewest.
+
+Segment audio never crosses the process boundary as pickled bytes. Each
+segment is written to a scratch file and the worker is handed its path.
+The finished MP3 comes back as a path too, and the parent uploads it.
+
+At most AUDIO_QUEUE_LIMIT stitch calls are admitted at once across all
+workers. Further callers wait, so a busy pool slows TTS down rather than
+building a backlog. Queue depth and the time calls wait for their worker
+are exported as metrics.
+
+AUDIO_WORKERS=0 keeps the stitcher in-process, running in a thread.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+
+from app.audio_stitcher import StreamingStitcher
+from app.config import settings
+from app.metrics import AUDIO_JOB_SECONDS, AUDIO_QUEUE_DEPTH, AUDIO_QUEUE_WAIT_SECONDS
+from app.storage import upload_audio_file
+
+_pool: "AudioPool | None" = None
+_worker_initializer: tuple = (None, ())
+
+
+# -- Worker process side --------------------------------------------------------
+
+_stitchers: dict[str, StreamingStitcher] = {}
+
+
+def _init_worker(overrides: dict, initializer, initargs: tuple) -> None:
+    # Spawned workers read settings from the environment; match the parent's
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _stitcher(key: str) -> StreamingStitcher:
+    try:
+        return _stitchers[key]
+    except KeyError:
+        raise RuntimeError(f"No stitcher for {key} in this audio worker (was it restarted?)")
+
+
+def _open(key: str, name: str, memory_limit_bytes: int) -> None:
+    _stitchers[key] = StreamingStitcher(name, memory_limit_bytes)
+
+
+def _add(key: str, index: int, speaker: str, path: str) -> tuple[list[dict], str | None]:
+    stitcher = _stitcher(key)
+    return stitcher.add_file(index, speaker, path), stitcher.playlist_url
+
+
+def _finalize(key: str) -> tuple[str, float, list[dict], str | None]:
+    stitcher = _stitcher(key)
+    return (*stitcher.finalize(), stitcher.playlist_url)
+
+
+def _close(key: str) -> None:
+    stitcher = _stitchers.pop(key, None)
+    if stitcher is not None:
+        stitcher.close()
+
+
+def _ping(key: str) -> None:
+    pass
+
+
+_OPERATIONS = {
+    "ping": _ping,
+    "open": _open,
+    "add": _add,
+    "finalize": _finalize,
+    "close": _close,
+}
+
+
+def _run(operation: str, key: str, *args):
+    started = time.perf_counter()
+    result = _OPERATIONS[operation](key, *args)
+    return result, time.perf_counter() - started
+
+
+# -- Parent side ----------------------------------------------------------------
+
+
+class _Worker:
+    def __init__(self, executor: ProcessPoolExecutor):
+        self.executor = executor
+        self.generation = 0  # bumped each time the process is replaced
+        self.episodes = 0  # sessions opened on the current process
+        self.outstanding = 0  # calls submitted and not yet returned
+
+
+class AudioPool:
+    """A fixed set of single-process executors that episodes are pinned to."""
+
+    def __init__(self, workers: int, queue_limit: int):
+        initializer, initargs = _worker_initializer
+        self._initargs = (settings.model_dump(), initializer, initargs)
+        # Never fork: the parent has an event loop, threads and open sockets
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(self._executor()) for _ in range(workers)]
+        self._admission = asyncio.Semaphore(max(1, queue_limit))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    def _report_depth(self) -> None:
+        # Each worker runs one call at a time; the rest are queued
+        AUDIO_QUEUE_DEPTH.set(sum(max(0, w.outstanding - 1) for w in self._workers))
+
+    def assign(self) -> tuple[_Worker, int]:
+        """Pin a new session to the least-loaded worker; returns it and its generation."""
+        worker = min(self._workers, key=lambda w: w.episodes)
+        worker.episodes += 1
+        return worker, worker.generation
+
+    def release(self, worker: _Worker, generation: int) -> None:
+        # Sessions from before a restart were already written off in _replace
+        if generation == worker.generation:
+            worker.episodes -= 1
+
+    def _replace(self, worker: _Worker, broken: ProcessPoolExecutor) -> None:
+        """Swap in a fresh process, once, however many callers saw the old one break."""
+        if worker.executor is not broken:
+            return
+        worker.executor = self._executor()
+        worker.generation += 1
+        worker.episodes = 0
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def call(self, worker: _Worker, generation: int, operation: str, key: str, *args):
+        """Run a stitcher operation on `worker`, waiting for admission if the pool is full.
+
+        Raises RuntimeError if the session's process has died, since its
+        stitcher died with it.
+        """
+        submitted = time.perf_counter()
+        async with self._admission:
+            if generation != worker.generation:
+                raise RuntimeError(f"Audio worker restarted; stitcher {key} was lost")
+            worker.outstanding += 1
+            self._report_depth()
+            executor = worker.executor
+            try:
+                future = executor.submit(_run, operation, key, *args)
+                result, run_seconds = await asyncio.wrap_future(future)
+            except BrokenProcessPool as exc:
+                # The process died (OOM, ffmpeg crash...); its stitchers are gone
+                self._replace(worker, executor)
+                raise RuntimeError(f"Audio worker process died during {operation}") from exc
+            finally:
+                worker.outstanding -= 1
+                self._report_depth()
+        AUDIO_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - submitted - run_seconds)
+        AUDIO_JOB_SECONDS.observe(run_seconds, operation=operation)
+        return result
+
+    async def warm_up(self) -> None:
+        """Start every worker process now rather than on an episode's first segment."""
+        await asyncio.gather(
+            *(asyncio.wrap_future(w.executor.submit(_run, "ping", "")) for w in self._workers)
+        )
+
+    def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def set_worker_initializer(initializer, *initargs) -> None:
+    """Run `initializer(*initargs)` in each audio worker process as it starts.
+
+    Must be called before the pool is first used.
+    """
+    global _worker_initializer
+    _worker_initializer = (initializer, initargs)
+
+
+def get_audio_pool() -> AudioPool | None:
+    """The process-wide pool, or None when AUDIO_WORKERS is 0."""
+    global _pool
+    if _pool is None and settings.audio_workers > 0:
+        _pool = AudioPool(settings.audio_workers, settings.audio_queue_limit)
+    return _pool
+
+
+async def start_audio_pool() -> None:
+    """Create the pool (if AUDIO_WORKERS > 0) and start its worker processes."""
+    pool = get_audio_pool()
+    if pool is not None:
+        await pool.warm_up()
+
+
+def shutdown_audio_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class StitchSession:
+    """One episode's stitcher, in an audio worker process or in-process.
+
+    Mirrors StreamingStitcher: `add` segments in any order, then `finish`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.playlist_url: str | None = None
+        self._pool = get_audio_pool()
+        self._key = f"{name}:{uuid.uuid4().hex[:8]}"
+        self._worker: _Worker | None = None
+        self._generation = 0
+        self._stitcher: StreamingStitcher | None = None
+        self._scratch: str | None = None
+
+    async def open(self) -> None:
+        if self._pool is None:
+            self._stitcher = StreamingStitcher(self.name)
+            return
+        self._scratch = tempfile.mkdtemp(prefix="segments-")
+        self._worker, self._generation = self._pool.assign()
+        await self._call("open", self._key, self.name, settings.stitch_memory_limit_bytes)
+
+    async def add(self, index: int, speaker: str, audio: bytes) -> list[dict]:
+        """Accept the segment for script line `index`; returns newly known timestamps."""
+        if self._pool is None:
+            timestamps = await asyncio.to_thread(self._stitcher.add, index, speaker, audio)
+            self.playlist_url = self._stitcher.playlist_url
+            return timestamps
+        path = os.path.join(self._scratch, f"segment_{index:05d}.mp3")
+        await asyncio.to_thread(_write_file, path, audio)
+        timestamps, self.playlist_url = await self._call("add", self._key, index, speaker, path)
+        return timestamps
+
+    async def finish(self) -> tuple[str, float, list[dict]]:
+        """Finalize and upload the MP3; returns (cloud_url, duration_seconds, timestamps)."""
+        if self._pool is None:
+            result = await asyncio.to_thread(self._stitcher.finish)
+            self.playlist_url = self._stitcher.playlist_url
+            return result
+        output_path, duration, timestamps, self.playlist_url = await self._call("finalize", self._key)
+        cloud_url = await asyncio.to_thread(upload_audio_file, output_path, self.name)
+        return cloud_url, duration, timestamps
+
+    async def _call(self, operation: str, *args):
+        return await self._pool.call(self._worker, self._generation, operation, *args)
+
+    async def close(self) -> None:
+        if self._stitcher is not None:
+            self._stitcher.close()
+            return
+        try:
+            # Nothing to close if the process it lived in has been replaced
+            if self._worker is not None and self._generation == self._worker.generation:
+                await self._call("close", self._key)
+        except Exception as e:
+            print(f"[audio] Failed to close stitcher {self._key}: {e}")
+        finally:
+            if self._worker is not None:
+                self._pool.release(self._worker, self._generation)
+                self._worker = None
+            if self._scratch is not None:
+                shutil.rmtree(self._scratch, ignore_errors=True)
+
+
+@asynccontextmanager
+async def stitch_session(name: str):
+    """Open a StitchSession for output `name` and close it on exit."""
+    session = StitchSession(name)
+    try:
+        await session.open()
+        yield session
+    finally:
+        await session.close()
@@ -1,12 +1,372 @@
-import io
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import IO
 
 from pydub import AudioSegment
 
-from app.storage import upload_audio
+from app import mp3_frames
+from app.config import settings
+from app.hls import HlsPublisher
+from app.mp3_frames import FrameFormat, Mp3FormatError
+from app.storage import upload_audio_file
 
 SILENCE_SAME_SPEAKER_MS = 400
 SILENCE_SPEAKER_CHANGE_MS = 600
 
+# Raw PCM used by the re-encode path: 16-bit stereo at 44.1 kHz
+PCM_SAMPLE_RATE = 44100
+PCM_CHANNELS = 2
+PCM_FRAME_BYTES = 2 * PCM_CHANNELS
+PCM_BYTES_PER_SECOND = PCM_SAMPLE_RATE * PCM_FRAME_BYTES
+PCM_BLOCK_BYTES = 64 * 1024  # ~0.4 s of audio per pipe read/write
+_PCM_ARGS = ("-f", "s16le", "-ar", str(PCM_SAMPLE_RATE), "-ac", str(PCM_CHANNELS))
+FFMPEG_ERROR_BYTES = 4096  # how much of ffmpeg's error output makes it into exceptions
+
+
+def _gap_ms(prev_speaker: str | None, speaker: str) -> int:
+    if prev_speaker is None:
+        return 0
+    if speaker == prev_speaker:
+        return SILENCE_SAME_SPEAKER_MS
+    return SILENCE_SPEAKER_CHANGE_MS
+
+
+def _ffmpeg(*args: str, **popen_kwargs) -> tuple[subprocess.Popen, IO[bytes]]:
+    """Start ffmpeg; returns the process and the temp file collecting its stderr.
+
+    A stderr pipe nobody reads until exit would fill up on damaged input
+    (one error per frame) and block ffmpeg, and with it the stitcher.
+    """
+    errors = tempfile.TemporaryFile()
+    try:
+        # pydub has already located ffmpeg (FFMPEG on PATH or its own default)
+        proc = subprocess.Popen(
+            [AudioSegment.converter, "-nostdin", "-hide_banner", "-loglevel", "error", *args],
+            stderr=errors,
+            **popen_kwargs,
+        )
+    except BaseException:
+        errors.close()
+        raise
+    return proc, errors
+
+
+def _wait(proc: subprocess.Popen, errors: IO[bytes]) -> str:
+    """Wait for ffmpeg to exit and return the start of its error output."""
+    with errors:
+        proc.wait()
+        errors.seek(0)
+        return errors.read(FFMPEG_ERROR_BYTES).decode(errors="replace").strip()
+
+
+class PcmEncoder:
+    """Encode an MP3 file from PCM streamed through ffmpeg in fixed-size blocks.
+
+    Each input file is decoded by its own ffmpeg process and piped to the
+    encoder block by block, so neither decoded audio nor the output is
+    ever held in memory.
+    """
+
+    def __init__(self, output_path: str):
+        self._proc, self._errors = _ffmpeg(
+            *_PCM_ARGS, "-i", "pipe:0", "-b:a", "128k", "-f", "mp3", "-y", output_path,
+            stdin=subprocess.PIPE,
+        )
+        self.bytes_written = 0
+
+    @property
+    def seconds(self) -> float:
+        return self.bytes_written / PCM_BYTES_PER_SECOND
+
+    def _write(self, block: bytes) -> None:
+        self._proc.stdin.write(block)
+        self.bytes_written += len(block)
+
+    def write_silence(self, duration_ms: int) -> None:
+        frames = round(duration_ms * PCM_SAMPLE_RATE / 1000)
+        remaining = frames * PCM_FRAME_BYTES
+        block = bytes(min(remaining, PCM_BLOCK_BYTES))
+        while remaining:
+            n = min(remaining, len(block))
+            self._write(block[:n])
+            remaining -= n
+
+    def write_file(self, path: str) -> None:
+        """Decode the audio file at `path` and append it."""
+        decoder, errors = _ffmpeg("-i", path, *_PCM_ARGS, "pipe:1", stdout=subprocess.PIPE)
+        try:
+            while block := decoder.stdout.read(PCM_BLOCK_BYTES):
+                self._write(block)
+        finally:
+            decoder.stdout.close()
+            stderr = _wait(decoder, errors)
+        if decoder.returncode != 0:
+            raise RuntimeError(f"ffmpeg could not decode {os.path.basename(path)}: {stderr}")
+        # Keep later writes aligned to whole sample frames
+        misaligned = self.bytes_written % PCM_FRAME_BYTES
+        if misaligned:
+            self._write(bytes(PCM_FRAME_BYTES - misaligned))
+
+    def close(self) -> None:
+        """Flush and finish the output file."""
+        self._proc.stdin.close()
+        stderr = _wait(self._proc, self._errors)
+        if self._proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed: {stderr}")
+
+    def kill(self) -> None:
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        self._errors.close()
+
+
+class StreamingStitcher:
+    """Stitch TTS segments into one MP3 on disk as they arrive.
+
+    Segments may be added in any order; each is written out as soon as every
+    earlier line has landed, and its start time is known at that moment.
+    With STITCH_MODE "auto" (default) segments are joined at the MP3 frame
+    level; if a segment's format doesn't match, the stitcher switches to
+    re-encoding through ffmpeg for the rest of the episode. "frames" and
+    "pydub" (re-encode) force one engine.
+
+    Memory use is bounded per episode: segments waiting for an earlier line
+    are held in memory only up to `memory_limit_bytes` (default
+    STITCH_MEMORY_LIMIT_BYTES) and spilled to temp files beyond that, and
+    re-encoding streams PCM through ffmpeg in small blocks. The audio passed
+    to `add` is the caller's and is not counted. `peak_buffered_bytes`
+    records the most the stitcher held at once.
+
+    With PROGRESSIVE_PUBLISH enabled, frame-level output is also cut into
+    HLS chunks that are uploaded as they fill; `playlist_url` is set once
+    the first chunk is live.
+    """
+
+    def __init__(self, output_filename: str, memory_limit_bytes: int | None = None):
+        self.output_filename = output_filename
+        self.mode = settings.stitch_mode
+        self.memory_limit_bytes = (
+            settings.stitch_memory_limit_bytes if memory_limit_bytes is None else memory_limit_bytes
+        )
+        self.timestamps: list[dict] = []
+        self.peak_buffered_bytes = 0
+        self.spilled_segments = 0
+
+        self._tmpdir = tempfile.mkdtemp(prefix="stitch-")
+        self.output_path = os.path.join(self._tmpdir, f"{output_filename}.mp3")
+        self._out = None
+        self._encoder: PcmEncoder | None = None
+        if self.mode == "pydub":
+            self._encoder = PcmEncoder(self.output_path)
+        else:
+            self._out = open(self.output_path, "wb")
+        # index -> (speaker, audio bytes or spill file path)
+        self._pending: dict[int, tuple[str, bytes | str]] = {}
+        self._pending_bytes = 0
+        self._next_index = 0
+        self._prev_speaker: str | None = None
+        self._format: FrameFormat | None = None
+        self._silence = b""
+        self._frame_count = 0
+        self._publisher: HlsPublisher | None = None
+
+    @property
+    def playlist_url(self) -> str | None:
+        """URL of the progressive playlist, once at least one chunk is published."""
+        if self._publisher is None:
+            return None
+        return self._publisher.playlist_url
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Audio bytes the stitcher currently holds in memory."""
+        held = self._pending_bytes
+        if self._publisher is not None:
+            held += self._publisher.buffered_bytes
+        return held
+
+    @property
+    def _frame_seconds(self) -> float:
+        return self._format.samples_per_frame / self._format.sample_rate
+
+    def _note_memory(self) -> None:
+        self.peak_buffered_bytes = max(self.peak_buffered_bytes, self.buffered_bytes)
+
+    def _spill_path(self, index: int) -> str:
+        return os.path.join(self._tmpdir, f"segment_{index:05d}.mp3")
+
+    def _hold(self, index: int, speaker: str, audio: bytes) -> None:
+        """Keep a segment until its turn: in memory if it fits the budget, else on disk."""
+        if self.buffered_bytes + len(audio) > self.memory_limit_bytes:
+            path = self._spill_path(index)
+            with open(path, "wb") as f:
+                f.write(audio)
+            self._pending[index] = (speaker, path)
+            self.spilled_segments += 1
+        else:
+            self._pending[index] = (speaker, audio)
+            self._pending_bytes += len(audio)
+            self._note_memory()
+
+    def _take(self, index: int) -> tuple[str, bytes]:
+        speaker, audio = self._pending.pop(index)
+        if isinstance(audio, str):
+            with open(audio, "rb") as f:
+                data = f.read()
+            os.remove(audio)
+            return speaker, data
+        self._pending_bytes -= len(audio)
+        return speaker, audio
+
+    def add(self, index: int, speaker: str, audio: bytes) -> list[dict]:
+        """Accept the segment for script line `index`.
+
+        Returns the timestamps that became known because of this segment
+        (empty while an earlier line is still missing).
+        """
+        emitted: list[dict] = []
+        if index != self._next_index:
+            self._hold(index, speaker, audio)
+            return emitted
+
+        # In order: write it straight through, then anything it unblocked
+        while True:
+            timestamp = self._append(self._next_index, speaker, audio)
+            emitted.append(timestamp)
+            self._prev_speaker = speaker
+            self._next_index += 1
+            if self._next_index not in self._pending:
+                return emitted
+            speaker, audio = self._take(self._next_index)
+
+    def add_file(self, index: int, speaker: str, path: str) -> list[dict]:
+        """Like `add`, for a segment already written to `path`.
+
+        The stitcher takes ownership of the file and deletes it once used. An
+        out-of-order segment stays on disk until its turn.
+        """
+        if index != self._next_index:
+            self._pending[index] = (speaker, path)
+            return []
+        with open(path, "rb") as f:
+            audio = f.read()
+        os.remove(path)
+        return self.add(index, speaker, audio)
+
+    def _append(self, index: int, speaker: str, audio: bytes) -> dict:
+        if self._encoder is None:
+            timestamp = self._append_frames(index, speaker, audio)
+            if timestamp is not None:
+                return timestamp
+        return self._append_pcm(index, speaker, audio)
+
+    def _append_frames(self, index: int, speaker: str, audio: bytes) -> dict | None:
+        try:
+            stream = mp3_frames.parse(audio)
+            if self._format is None:
+                self._format = stream.format
+                self._silence = mp3_frames.silent_frame(stream.first_header)
+                if settings.progressive_publish:
+                    self._publisher = HlsPublisher(
+                        self.output_filename, self._frame_seconds, settings.hls_chunk_seconds
+                    )
+            elif stream.format != self._format:
+                raise Mp3FormatError("Segments have mismatched MP3 formats")
+        except Mp3FormatError as exc:
+            if self.mode == "frames":
+                raise
+            print(f"[stitch] Frame-level join unavailable ({exc}), re-encoding the rest")
+            self._switch_to_reencode()
+            return None
+
+        gap_ms = _gap_ms(self._prev_speaker, speaker)
+        if gap_ms:
+            gap_frames = mp3_frames.silence_frame_count(self._format, gap_ms)
+            self._write_frames([self._silence] * gap_frames)
+
+        timestamp = {"index": index, "start_seconds": self._frame_count * self._frame_seconds}
+        self.timestamps.append(timestamp)
+        self._write_frames(list(stream.iter_frames()))
+        return timestamp
+
+    def _switch_to_reencode(self) -> None:
+        """Continue in PCM, starting from the frames already joined on disk.
+
+        Timestamps emitted so far stay valid: the frame-joined prefix decodes
+        to exactly the audio it was built from.
+        """
+        self._out.close()
+        self._publisher = None  # the re-encoded episode won't match published chunks
+        prefix_path = os.path.join(self._tmpdir, "frames_prefix.mp3")
+        os.replace(self.output_path, prefix_path)
+        self._encoder = PcmEncoder(self.output_path)
+        if self._frame_count:
+            self._encoder.write_file(prefix_path)
+        os.remove(prefix_path)
+
+    def _append_pcm(self, index: int, speaker: str, audio: bytes) -> dict:
+        gap_ms = _gap_ms(self._prev_speaker, speaker)
+        if gap_ms:
+            self._encoder.write_silence(gap_ms)
+
+        timestamp = {"index": index, "start_seconds": self._encoder.seconds}
+        self.timestamps.append(timestamp)
+        # ffmpeg decodes from a file so the pipe to the encoder never stalls
+        path = self._spill_path(index)
+        with open(path, "wb") as f:
+            f.write(audio)
+        try:
+            self._encoder.write_file(path)
+        finally:
+            os.remove(path)
+        return timestamp
+
+    def _write_frames(self, frames: list) -> None:
+        for frame in frames:
+            self._out.write(frame)
+        self._frame_count += len(frames)
+        if self._publisher is not None:
+            self._publisher.write(frames)
+            self._note_memory()
+
+    def finalize(self) -> tuple[str, float, list[dict]]:
+        """Finalize the MP3 on disk and return (output_path, duration_seconds, timestamps).
+
+        Also closes the progressive playlist, if one is being published. The
+        file lives until `close`.
+        """
+        if self._pending:
+            missing = self._next_index
+            raise ValueError(f"Cannot finish stitching: segment {missing} never arrived")
+
+        if self._encoder is not None:
+            self._encoder.close()
+            duration_seconds = self._encoder.seconds
+            self._encoder = None
+        else:
+            self._out.close()
+            duration_seconds = self._frame_count * self._frame_seconds if self._format else 0.0
+            if self._publisher is not None:
+                self._publisher.finish()
+        return self.output_path, duration_seconds, self.timestamps
+
+    def finish(self) -> tuple[str, float, list[dict]]:
+        """Finalize the MP3, upload it and return (cloud_url, duration_seconds, timestamps)."""
+        output_path, duration_seconds, timestamps = self.finalize()
+        cloud_url = upload_audio_file(output_path, self.output_filename)
+        return cloud_url, duration_seconds, timestamps
+
+    def close(self) -> None:
+        """Release the output file, any ffmpeg process and the scratch directory."""
+        if self._encoder is not None:
+            self._encoder.kill()
+        if self._out is not None and not self._out.closed:
+            self._out.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
 
 def stitch_audio(segments: list[dict], output_filename: str) -> tuple[str, float, list[dict]]:
     """Stitch TTS audio segments into a single MP3.
@@ -20,31 +380,10 @@ def stitch_audio(segments: list[dict], output_filename: str) -> tuple[str, float
         where cloud_url is the public HTTPS URL of the uploaded audio file
         and timestamps is a list of {"index": int, "start_seconds": float}
     """
-    combined = AudioSegment.empty()
-    prev_speaker = None
-    timestamps: list[dict] = []
-
-    for i, seg in enumerate(segments):
-        chunk = AudioSegment.from_mp3(io.BytesIO(seg["audio"]))
-
-        if prev_speaker is not None:
-            if seg["speaker"] == prev_speaker:
-                combined += AudioSegment.silent(duration=SILENCE_SAME_SPEAKER_MS)
-            else:
-                combined += AudioSegment.silent(duration=SILENCE_SPEAKER_CHANGE_MS)
-
-        timestamps.append({"index": i, "start_seconds": len(combined) / 1000.0})
-        combined += chunk
-        prev_speaker = seg["speaker"]
-
-    # Export to in-memory buffer
-    buffer = io.BytesIO()
-    combined.export(buffer, format="mp3", bitrate="128k")
-    audio_data = buffer.getvalue()
-    buffer.close()
-
-    # Upload to cloud storage
-    cloud_url = upload_audio(audio_data, output_filename)
-
-    duration_seconds = len(combined) / 1000.0
-    return cloud_url, duration_seconds, timestamps
+    stitcher = StreamingStitcher(output_filename)
+    try:
+        for i, seg in enumerate(segments):
+            stitcher.add(i, seg["speaker"], seg["audio"])
+        return stitcher.finish()
+    finally:
+        stitcher.close()
@@ -0,0 +1,150 @@
+"""Small caching helpers shared by the lookup clients.
+
+- `TTLCache`: in-process LRU with per-entry expiry (the hot layer)
+- `MongoCache`: a Mongo collection with a TTL index, fronted by a TTLCache
+- `SingleFlight`: collapses concurrent calls for the same key into one
+
+Both can store None as a value (negative caching), so lookups return the
+`MISSING` sentinel on a miss.
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from app import db as database
+
+MISSING = object()
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_key(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a lookup string."""
+    text = _NON_WORD.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after their own TTL."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value, ttl_seconds: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class MongoCache:
+    """Persistent cache in `collection`, with a hot in-process layer in front.
+
+    Documents look like {_id: key, value: ..., expires_at: datetime}; a TTL
+    index on `expires_at` (created in `db.connect_db`) lets Mongo drop
+    expired entries. With `persistent=False`, or before the database is
+    connected, only the in-process layer is used.
+    """
+
+    def __init__(self, collection: str, max_local_entries: int = 1024, persistent: bool = True):
+        self.collection = collection
+        self.persistent = persistent
+        self.local = TTLCache(max_local_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def _collection(self):
+        if not self.persistent or database.db is None:
+            return None
+        return database.db[self.collection]
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        coll = self._collection()
+        if coll is not None:
+            now = datetime.now(timezone.utc)
+            try:
+                doc = await coll.find_one({"_id": key, "expires_at": {"$gt": now}})
+            except Exception as exc:
+                print(f"[cache] {self.collection} lookup failed: {exc}")
+                doc = None
+            if doc is not None:
+                expires_at = doc["expires_at"].replace(tzinfo=timezone.utc)
+                self.local.set(key, doc["value"], (expires_at - now).total_seconds())
+                self.hits += 1
+                return doc["value"]
+
+        self.misses += 1
+        return MISSING
+
+    async def set(self, key: str, value, ttl_seconds: float) -> None:
+        self.local.set(key, value, ttl_seconds)
+        coll = self._collection()
+        if coll is None:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        try:
+            await coll.replace_one(
+                {"_id": key}, {"value": value, "expires_at": expires_at}, upsert=True
+            )
+        except Exception as exc:
+            print(f"[cache] {self.collection} store failed: {exc}")
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+        coll = self._collection()
+        if coll is not None:
+            await coll.delete_one({"_id": key})
+
+
+class SingleFlight:
+    """Share one in-flight call per key between concurrent callers.
+
+    The call runs as its own task, so a caller being cancelled does not
+    cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
@@ -0,0 +1,65 @@
+"""Per-stage checkpoints for resumable episode generation.
+
+Each completed stage records the hash of its inputs under
+`checkpoints.<stage>` on the episode document, plus any stage-private
+output needed to resume (e.g. line timestamps). Its public results stay in
+the usual episode fields. A stage is skipped on a later run when its
+checkpoint exists and its input hash still matches, so a retry or
+`regenerate?from_stage=...` only pays for the stages that actually
+changed or never finished.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+
+STAGES = ("research", "script", "audio", "citations")
+
+# Episode fields produced by each stage, cleared when the stage is reset
+STAGE_FIELDS = {
+    "research": ("research_id", "research_notes", "cover_image_url", "category"),
+    "script": ("script",),
+    "audio": ("audio_filename", "audio_url", "playlist_url", "playlist_key", "duration_seconds"),
+    "citations": ("citations",),
+}
+
+
+def input_hash(*parts) -> str:
+    """Stable hash of a stage's inputs."""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fresh_checkpoint(doc: dict, stage: str, expected_hash: str) -> dict | None:
+    """Return the stage's checkpoint if it completed with the same inputs."""
+    checkpoint = (doc.get("checkpoints") or {}).get(stage)
+    if checkpoint and checkpoint.get("input_hash") == expected_hash:
+        return checkpoint
+    return None
+
+
+def checkpoint_fields(stage: str, stage_hash: str, output: dict | None = None) -> dict:
+    """`$set` fields that record a completed stage."""
+    return {
+        f"checkpoints.{stage}": {
+            "input_hash": stage_hash,
+            "completed_at": datetime.now(timezone.utc),
+            "output": output or {},
+        }
+    }
+
+
+def reset_from_stage(stage: str) -> tuple[dict, dict]:
+    """Build ($set, $unset) updates that invalidate `stage` and every later stage.
+
+    Raises ValueError for an unknown stage name.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage '{stage}'. Expected one of: {', '.join(STAGES)}")
+    to_set: dict = {}
+    to_unset: dict = {}
+    for name in STAGES[STAGES.index(stage):]:
+        for field in STAGE_FIELDS[name]:
+            to_set[field] = None
+        to_unset[f"checkpoints.{name}"] = ""
+    return to_set, to_unset
@@ -4,11 +4,24 @@ import asyncio
 
 import httpx
 
+from app.cache import MISSING, MongoCache, normalize_key
+from app.config import settings
+from app.http_client import get_http_client
+from app.metrics import UPSTREAM_ERRORS, UPSTREAM_RETRIES, register_cache, track_upstream
+from app.rate_limit import DEFAULT_BACKOFF_SECONDS, provider_limit, retry_after_seconds
+
 OPEN_LIBRARY_SEARCH_URL = "https://openlibrary.org/search.json"
 TIMEOUT = 15.0
 MAX_RETRIES = 3
 BASE_DELAY = 1.0  # seconds; doubles each retry
 
+_cache = MongoCache(
+    "citation_cache",
+    max_local_entries=2048,
+    persistent=settings.citation_cache_backend == "mongo",
+)
+register_cache("citations", _cache)
+
 
 def _build_cover_url(cover_i: int | None) -> str | None:
     """Build an Open Library cover image URL from a cover ID."""
@@ -20,42 +33,74 @@ def _build_cover_url(cover_i: int | None) -> str | None:
 async def resolve_citation(query: str) -> dict | None:
     """Look up a citation query via Open Library and return structured metadata.
 
-    Retries with exponential backoff on 429 / 5xx responses.
+    Answers are cached by normalized query; "no result" answers are cached
+    for a shorter time, and failed lookups are not cached at all.
     Returns a dict with keys: title, authors, published_date, thumbnail_url,
     source_url, source_name.  Returns None if nothing relevant was found.
     """
+    key = normalize_key(query)
+    cached = await _cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    found, result = await _lookup(query)
+    if found:
+        ttl = settings.citation_cache_ttl_seconds if result else settings.citation_negative_ttl_seconds
+        await _cache.set(key, result, ttl)
+    return result
+
+
+async def _lookup(query: str) -> tuple[bool, dict | None]:
+    """Query Open Library. Returns (answered, result).
+
+    Every request (including retries) goes through the shared Open Library
+    provider limit. Retries with exponential backoff on 429 / 5xx responses;
+    a 429's Retry-After also pauses every other lookup.
+    `answered` is False when the lookup itself failed, so the miss must not
+    be cached.
+    """
     params = {"q": query, "limit": 1, "fields": "title,author_name,first_publish_year,cover_i,key"}
 
+    client = get_http_client(OPEN_LIBRARY_SEARCH_URL)
+
+    limit = provider_limit("openlibrary")
     for attempt in range(MAX_RETRIES):
         try:
-            async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-                resp = await client.get(OPEN_LIBRARY_SEARCH_URL, params=params)
+            async with limit.slot():
+                with track_upstream("openlibrary", "search"):
+                    resp = await client.get(OPEN_LIBRARY_SEARCH_URL, params=params, timeout=TIMEOUT)
 
-                if resp.status_code == 429 or resp.status_code >= 500:
-                    delay = BASE_DELAY * (2 ** attempt)
-                    print(f"[citations] {resp.status_code} for '{query}', retrying in {delay}s (attempt {attempt + 1}/{MAX_RETRIES})")
-                    await asyncio.sleep(delay)
-                    continue
+            if resp.status_code == 429 or resp.status_code >= 500:
+                UPSTREAM_ERRORS.inc(service="openlibrary", error=f"HTTP {resp.status_code}")
+                UPSTREAM_RETRIES.inc(service="openlibrary")
+                delay = BASE_DELAY * (2 ** attempt)
+                if resp.status_code == 429:
+                    retry_after = retry_after_seconds(resp.headers)
+                    limit.back_off(DEFAULT_BACKOFF_SECONDS if retry_after is None else retry_after)
+                    delay = max(delay, retry_after or 0.0)
+                print(f"[citations] {resp.status_code} for '{query}', retrying in {delay}s (attempt {attempt + 1}/{MAX_RETRIES})")
+                await asyncio.sleep(delay)
+                continue
 
-                resp.raise_for_status()
-                data = resp.json()
+            resp.raise_for_status()
+            data = resp.json()
         except (httpx.HTTPError, Exception) as exc:
             print(f"[citations] Open Library lookup failed for '{query}': {exc}")
-            return None
+            return False, None
         else:
             break
     else:
         print(f"[citations] Exhausted retries for '{query}'")
-        return None
+        return False, None
 
     docs = data.get("docs", [])
     if not docs:
-        return None
+        return True, None
 
     doc = docs[0]
     work_key = doc.get("key", "")  # e.g. "/works/OL12345W"
 
-    return {
+    return True, {
         "title": doc.get("title", "Unknown"),
         "authors": doc.get("author_name", []),
         "published_date": str(doc["first_publish_year"]) if doc.get("first_publish_year") else None,
@@ -63,3 +108,11 @@ async def resolve_citation(query: str) -> dict | None:
         "source_url": f"https://openlibrary.org{work_key}" if work_key else None,
         "source_name": "Open Library",
     }
+
+
+async def resolve_citations(queries: list[str]) -> list[dict | None]:
+    """Resolve many queries concurrently, paced by the shared rate limiter.
+
+    Results are returned in the same order as `queries`.
+    """
+    return await asyncio.gather(*(resolve_citation(q) for q in queries))
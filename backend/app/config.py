@@ -15,7 +15,57 @@ class Settings(BaseSettings):
     audio_dir: str = "static/audio"
     gcs_bucket_name: str = ""
     gcs_project_id: str = ""
+    storage_backend: str = "gcs"  # "gcs", "local", or "s3"
+    storage_url_mode: str = "public"  # "public" (bucket-level read access) or "signed"
+    storage_signed_url_seconds: int = 7 * 24 * 3600  # the maximum GCS allows
+    storage_public_base_url: str = ""  # e.g. a CDN in front of the bucket
+    storage_chunk_bytes: int = 8 * 1024 * 1024
+    storage_local_dir: str = "static"
+    storage_max_concurrency: int = 8  # uploads in flight per process
+    s3_bucket_name: str = ""
+    s3_endpoint_url: str = ""  # for S3-compatible stores (MinIO, R2, ...)
+    s3_region: str = ""
     google_cse_cx: str = ""
+    research_cache_ttl_seconds: int = 7 * 24 * 3600
+    image_hedge_seconds: float = 1.0  # how long Google CSE gets before Wikipedia may win
+    image_lookup_timeout_seconds: float = 8.0
+    image_cache_ttl_seconds: int = 30 * 24 * 3600
+    script_streaming: bool = True  # start TTS on each script line as the model writes it
+    stitch_mode: str = "auto"  # "auto" (frame-level, re-encode fallback), "frames", or "pydub" (re-encode)
+    stitch_memory_limit_bytes: int = 16 * 1024 * 1024  # per episode; waiting segments spill to disk beyond it
+    audio_workers: int = 2  # stitching processes; 0 stitches in a thread in-process
+    audio_queue_limit: int = 32  # stitch calls admitted at once across all audio workers
+    progressive_publish: bool = False  # publish an HLS playlist while audio is generating
+    hls_chunk_seconds: float = 10.0
+    response_cache_backend: str = "local"  # "local" (in-process), "mongo" (shared), or "none"
+    episode_cache_ttl_seconds: int = 3600
+    list_cache_ttl_seconds: int = 30
+    search_candidate_limit: int = 1000  # newest matches ranked per search; older ones are not scored
+    pipeline_executor: str = "inline"  # "inline" (API background task) or "queue" (app.worker)
+    worker_concurrency: int = 2
+    job_max_attempts: int = 3
+    job_lease_seconds: int = 120
+    job_heartbeat_seconds: int = 30
+    job_sweep_interval_seconds: int = 30
+    pipeline_max_concurrency: int = 4  # pipelines run at once by the API (PIPELINE_EXECUTOR=inline)
+    pipeline_queue_limit: int = 50  # episodes waiting to start before POST /episodes returns 429
+    batch_max_episodes: int = 50  # items per POST /episodes/batch; keep <= PIPELINE_QUEUE_LIMIT
+    gemini_pro_max_concurrency: int = 4  # research + scripts
+    gemini_pro_rps: float = 1.0
+    gemini_flash_max_concurrency: int = 16  # categorization
+    gemini_flash_rps: float = 10.0
+    tts_max_concurrency: int = 4
+    tts_rps: float = 0.0  # 0 = concurrency cap only
+    http_max_connections_per_host: int = 10
+    openlibrary_rps: float = 2.0  # Open Library requests per second, shared across episodes
+    citation_cache_backend: str = "mongo"  # "mongo" (persistent + in-process LRU) or "memory"
+    citation_cache_ttl_seconds: int = 30 * 24 * 3600
+    citation_negative_ttl_seconds: int = 24 * 3600  # for queries with no match
+    tts_cache_backend: str = "disk"  # "none", "disk", or "gridfs" (disk + shared GridFS)
+    tts_cache_dir: str = "cache/tts_segments"
+    tts_cache_max_bytes: int = 512 * 1024 * 1024
+    topic_classifier_path: str = "cache/topic_classifier.json"  # written by `python -m app.topic_classifier train`
+    topic_classifier_threshold: float = 0.8  # local predictions below this confidence go to Gemini
 
     model_config = {"env_file": ENV_FILE}
 
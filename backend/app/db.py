@@ -3,18 +3,51 @@ from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
 from app.config import settings
 
+EPISODE_SORT_FIELDS = ("created_at", "duration_seconds", "topic")
+
 client: AsyncIOMotorClient | None = None
 db: AsyncIOMotorDatabase | None = None
 
 
+def _tls_options(uri: str) -> dict:
+    """Atlas (`mongodb+srv://`) and `tls=true` URIs get the certifi CA bundle.
+
+    Plain `mongodb://` URIs (a local mongod) connect without TLS.
+    """
+    query = uri.partition("?")[2].lower()
+    if uri.startswith("mongodb+srv://") or "tls=true" in query or "ssl=true" in query:
+        return {"tlsCAFile": certifi.where()}
+    return {}
+
+
 async def connect_db() -> None:
     global client, db
-    client = AsyncIOMotorClient(settings.mongodb_uri, tlsCAFile=certifi.where())
+    client = AsyncIOMotorClient(settings.mongodb_uri, **_tls_options(settings.mongodb_uri))
     db = client[settings.mongodb_db_name]
     await client.admin.command("ping")
     print(f"Connected to MongoDB: {settings.mongodb_db_name}")
-    await db["episodes"].create_index("category")
-    await db["episodes"].create_index("tone")
+    # Compound indexes for every filter + sort combination served by GET /episodes
+    for filters in ((), ("category",), ("tone",), ("category", "tone")):
+        for sort_field in EPISODE_SORT_FIELDS:
+            keys = [(f, 1) for f in filters] + [(sort_field, 1), ("_id", 1)]
+            await db["episodes"].create_index(keys)
+    # Matches are walked newest first, so the candidate cap stops the scan early
+    await db["episodes"].create_index([("search_terms", 1), ("_id", -1)])
+    await db["episodes"].create_index("batch_id", sparse=True)
+    await db["jobs"].create_index([("status", 1), ("priority", -1), ("available_at", 1)])
+    await db["jobs"].create_index([("status", 1), ("lease_expires_at", 1)])
+    await db["jobs"].create_index("episode_id")
+    # One queued-or-running job per episode, so two workers never run the same one
+    await db["jobs"].create_index(
+        "episode_id",
+        name="episode_id_active_unique",
+        unique=True,
+        partialFilterExpression={"status": {"$in": ["queued", "running"]}},  # jobs.ACTIVE_STATUSES; MongoDB 6.0+
+    )
+    await db["research"].create_index([("topic_key", 1), ("created_at", -1)])
+    await db["citation_cache"].create_index("expires_at", expireAfterSeconds=0)
+    await db["image_cache"].create_index("expires_at", expireAfterSeconds=0)
+    await db["response_cache"].create_index("expires_at", expireAfterSeconds=0)
 
 
 async def close_db() -> None:
@@ -1,28 +1,144 @@
 import asyncio
+import time
 import traceback
+from contextlib import aclosing
+from datetime import datetime, timezone
 
 from bson import ObjectId
 
 from app import db as database
-from app.audio_stitcher import stitch_audio
-from app.citations_client import resolve_citation
+from app.audio_pool import stitch_session
+from app.cache import normalize_key
+from app.checkpoints import checkpoint_fields, fresh_checkpoint, input_hash
+from app.citations_client import resolve_citations
 from app.config import settings
-from app.gemini_client import categorize_topic, generate_script, research_topic
+from app.events import change_streams_active
+from app.gemini_client import generate_script, stream_script
+from app.hls import playlist_key
 from app.image_client import fetch_cover_image
-from app.storage import upload_audio
-from app.tts_client import synthesize_line
+from app.metrics import EPISODES, EPISODES_IN_PROGRESS, stage_timer
+from app.research_store import get_research, load_research_notes
+from app.response_cache import response_cache
+from app.search import search_fields
+from app.topic_classifier import categorize
+from app.tts_client import iter_synthesized, line_segment_key
 
 
 async def update_status(
     episode_id: ObjectId, status: str, extra: dict | None = None
 ) -> None:
-    update = {"$set": {"status": status}}
+    update = {"$set": {"status": status, "updated_at": datetime.now(timezone.utc)}}
     if extra:
         update["$set"].update(extra)
     await database.db["episodes"].update_one({"_id": episode_id}, update)
+    if not change_streams_active():
+        # Otherwise the API's change listener invalidates it (main.lifespan)
+        await response_cache.invalidate_episode(str(episode_id), update["$set"])
+
+
+def _playlist_fields(episode_id: ObjectId, playlist_url: str | None) -> dict:
+    # The key lets signed playlist URLs be re-signed on read (storage.episode_playlist_url)
+    return {
+        "playlist_url": playlist_url,
+        "playlist_key": playlist_key(str(episode_id)) if playlist_url else None,
+    }
+
+
+async def _category(doc: dict) -> tuple[str, str]:
+    """The episode's (category, source); batch creation may have assigned it already."""
+    if doc.get("category"):
+        return doc["category"], doc.get("category_source", "llm")
+    return await categorize(doc["topic"])
+
+
+async def _resolve_script_citations(
+    script: list[dict], timings: dict[str, float]
+) -> dict[int, dict | None]:
+    """Resolve every line's citation_query, keyed by script line index."""
+    with stage_timer("citations", timings):
+        indices = [i for i, line in enumerate(script) if line.get("citation_query")]
+        results = await resolve_citations([script[i]["citation_query"] for i in indices])
+    return dict(zip(indices, results))
+
+
+async def _stream_script_lines(
+    episode_id: ObjectId,
+    topic: str,
+    research: str,
+    tone: str,
+    script: list[dict],
+    script_hash: str,
+    timings: dict[str, float],
+    on_complete,
+):
+    """Yield script lines as the model writes them, appending each to `script`.
+
+    Once the script is complete and validated it is checkpointed, and
+    `on_complete(script)` is called.
+    """
+    with stage_timer("script", timings):
+        async with aclosing(stream_script(topic, research, tone)) as lines:
+            async for line in lines:
+                script.append(line)
+                yield line
+    await update_status(
+        episode_id,
+        "generating_audio",
+        {"script": script, **checkpoint_fields("script", script_hash)},
+    )
+    on_complete(script)
+
+
+async def _produce_audio(
+    episode_id: ObjectId, script: list[dict], timings: dict[str, float], lines=None
+) -> tuple[str, str | None, float, list[dict]]:
+    """TTS every line and stitch to disk as segments land.
+
+    With `lines`, an async iterator that fills `script` while the script is
+    still being written, each line is synthesized as soon as it arrives.
+
+    Returns (audio_url, playlist_url, duration_seconds, timestamps).
+    """
+    if lines is None:
+        await update_status(episode_id, "generating_audio")
+    async with stitch_session(str(episode_id)) as stitcher:
+        with stage_timer("audio", timings):
+            playlist_announced = False
+            source = script if lines is None else lines
+            async with aclosing(iter_synthesized(source)) as synthesized:
+                async for index, audio_bytes in synthesized:
+                    await stitcher.add(index, script[index]["speaker"], audio_bytes)
+                    if stitcher.playlist_url and not playlist_announced:
+                        # First chunk is live: listeners can start playing now
+                        await update_status(
+                            episode_id,
+                            "generating_audio",
+                            _playlist_fields(episode_id, stitcher.playlist_url),
+                        )
+                        playlist_announced = True
+
+        await update_status(episode_id, "stitching")
+        with stage_timer("upload", timings):
+            cloud_url, duration, timestamps = await stitcher.finish()
+        playlist_url = stitcher.playlist_url
+    print(
+        f"[pipeline] {episode_id}: tts+stitch {timings['audio']:.1f}s, "
+        f"finalize/upload {timings['upload']:.1f}s after last segment"
+    )
+    return cloud_url, playlist_url, duration, timestamps
 
 
 async def generate_episode(episode_id: ObjectId) -> None:
+    """Run (or resume) the generation pipeline for an episode.
+
+    Stages whose checkpoint matches their current inputs are skipped, so
+    retries and partial regenerations only redo what changed. The seconds
+    spent in each stage that ran are saved as `stage_timings`.
+    """
+    citation_task: asyncio.Task | None = None
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    EPISODES_IN_PROGRESS.inc()
     try:
         doc = await database.db["episodes"].find_one({"_id": episode_id})
         if not doc:
@@ -32,93 +148,162 @@ async def generate_episode(episode_id: ObjectId) -> None:
         tone = doc.get("tone", "conversational")
 
         # Step 1: Research (+ fetch cover image + categorize in parallel)
-        await update_status(episode_id, "researching")
-        research, cover_image_url, category = await asyncio.gather(
-            research_topic(topic),
-            fetch_cover_image(topic),
-            categorize_topic(topic),
-        )
-        await update_status(
-            episode_id,
-            "researching",
-            {
-                "research_notes": research,
-                "cover_image_url": cover_image_url,
-                "category": category,
-            },
-        )
+        research_hash = input_hash(normalize_key(topic))
+        research = None
+        if fresh_checkpoint(doc, "research", research_hash):
+            research_id = doc.get("research_id")
+            research = await load_research_notes(research_id)
+        if research is None:
+            await update_status(episode_id, "researching")
+            with stage_timer("research", timings):
+                (research_id, research), cover_image_url, (category, category_source) = await asyncio.gather(
+                    get_research(topic),
+                    fetch_cover_image(topic),
+                    _category(doc),
+                )
+            await update_status(
+                episode_id,
+                "researching",
+                {
+                    "research_id": research_id,
+                    "cover_image_url": cover_image_url,
+                    "category": category,
+                    "category_source": category_source,
+                    **search_fields(topic, category, tone),
+                    **checkpoint_fields("research", research_hash),
+                },
+            )
 
-        # Step 2: Script generation
-        await update_status(episode_id, "scriptwriting")
-        script = await generate_script(topic, research, tone)
-        await update_status(episode_id, "scriptwriting", {"script": script})
+        citations_hash = citations_checkpoint = None
 
-        # Step 3: TTS for each line
-        await update_status(episode_id, "generating_audio")
-        segments = []
-        for line in script:
-            audio_bytes = await asyncio.to_thread(
-                synthesize_line, line["speaker"], line["text"]
+        def start_citations(script: list[dict]) -> None:
+            # Citations only need the script, so resolve them while audio is produced
+            nonlocal citation_task, citations_hash, citations_checkpoint
+            citations_hash = input_hash([line.get("citation_query") for line in script])
+            citations_checkpoint = fresh_checkpoint(doc, "citations", citations_hash)
+            if not citations_checkpoint:
+                citation_task = asyncio.create_task(_resolve_script_citations(script, timings))
+
+        # Step 2: Script generation
+        script_hash = input_hash(research_id, tone)
+        streamed_audio = None
+        if fresh_checkpoint(doc, "script", script_hash) and doc.get("script"):
+            script = doc["script"]
+            start_citations(script)
+        elif settings.script_streaming:
+            # Steps 2-4 overlap: each line is voiced as soon as the model has written it
+            await update_status(episode_id, "scriptwriting")
+            script = []
+            lines = _stream_script_lines(
+                episode_id, topic, research, tone, script, script_hash, timings, start_citations
             )
-            segments.append({"speaker": line["speaker"], "audio": audio_bytes})
+            streamed_audio = await _produce_audio(episode_id, script, timings, lines)
+        else:
+            await update_status(episode_id, "scriptwriting")
+            with stage_timer("script", timings):
+                script = await generate_script(topic, research, tone)
+            await update_status(
+                episode_id,
+                "scriptwriting",
+                {"script": script, **checkpoint_fields("script", script_hash)},
+            )
+            start_citations(script)
 
-        # Step 4: Stitch audio
-        await update_status(episode_id, "stitching")
-        filename = str(episode_id)
-        cloud_url, duration, timestamps = await asyncio.to_thread(
-            stitch_audio, segments, filename
+        # Step 3+4: TTS + stitching (+ upload)
+        audio_hash = input_hash(
+            [line_segment_key(line["speaker"], line["text"]) for line in script],
+            settings.stitch_mode,
+            settings.progressive_publish,
         )
-        audio_url = cloud_url
-
-        # Step 5: Resolve citations
-        citation_indices = []  # track which script line each task corresponds to
-        for i, line in enumerate(script):
-            if line.get("citation_query"):
-                citation_indices.append(i)
+        audio_checkpoint = fresh_checkpoint(doc, "audio", audio_hash)
+        if streamed_audio is None and audio_checkpoint and doc.get("audio_url"):
+            audio_url = doc["audio_url"]
+            playlist_url = doc.get("playlist_url")
+            duration = doc["duration_seconds"]
+            timestamps = audio_checkpoint["output"]["timestamps"]
+        else:
+            audio_url, playlist_url, duration, timestamps = (
+                streamed_audio or await _produce_audio(episode_id, script, timings)
+            )
+            await update_status(
+                episode_id,
+                "stitching",
+                {
+                    "audio_filename": f"{episode_id}.mp3",
+                    "audio_url": audio_url,
+                    **_playlist_fields(episode_id, playlist_url),
+                    "duration_seconds": duration,
+                    **checkpoint_fields("audio", audio_hash, {"timestamps": timestamps}),
+                },
+            )
 
+        # Step 5: Join citations with the line timestamps
+        if citation_task is not None:
+            citation_results = await citation_task
+            await update_status(
+                episode_id,
+                "stitching",
+                checkpoint_fields(
+                    "citations",
+                    citations_hash,
+                    {"results": [{"index": i, "result": r} for i, r in citation_results.items()]},
+                ),
+            )
+        else:
+            citation_results = {
+                item["index"]: item["result"]
+                for item in citations_checkpoint["output"]["results"]
+            }
+        ts_map = {t["index"]: t["start_seconds"] for t in timestamps}
         citations = []
-        if citation_indices:
-            # Resolve sequentially with a small delay to avoid 429 rate limits
-            results = []
-            for idx in citation_indices:
-                result = await resolve_citation(script[idx]["citation_query"])
-                results.append(result)
-                await asyncio.sleep(0.5)  # throttle requests
-            ts_map = {t["index"]: t["start_seconds"] for t in timestamps}
-            for idx, result in zip(citation_indices, results):
-                if result is None:
-                    continue
-                line = script[idx]
-                citations.append(
-                    {
-                        "timestamp_seconds": ts_map.get(idx, 0.0),
-                        "speaker": line["speaker"],
-                        "text_snippet": line["text"][:120],
-                        "query": line["citation_query"],
-                        "title": result["title"],
-                        "authors": result.get("authors", []),
-                        "published_date": result.get("published_date"),
-                        "thumbnail_url": result.get("thumbnail_url"),
-                        "source_url": result.get("source_url"),
-                        "source_name": result.get("source_name", "Google Books"),
-                    }
-                )
+        for idx, result in citation_results.items():
+            if result is None:
+                continue
+            line = script[idx]
+            citations.append(
+                {
+                    "timestamp_seconds": ts_map.get(idx, 0.0),
+                    "speaker": line["speaker"],
+                    "text_snippet": line["text"][:120],
+                    "query": line["citation_query"],
+                    "title": result["title"],
+                    "authors": result.get("authors", []),
+                    "published_date": result.get("published_date"),
+                    "thumbnail_url": result.get("thumbnail_url"),
+                    "source_url": result.get("source_url"),
+                    "source_name": result.get("source_name", "Google Books"),
+                }
+            )
 
         # Step 6: Mark completed
+        timings["total"] = round(time.perf_counter() - started, 3)
         await update_status(
             episode_id,
             "completed",
             {
-                "audio_filename": f"{filename}.mp3",
+                "audio_filename": f"{episode_id}.mp3",
                 "audio_url": audio_url,
+                **_playlist_fields(episode_id, playlist_url),
                 "duration_seconds": duration,
                 "citations": citations if citations else None,
+                "error": None,
+                "stage_timings": timings,
             },
         )
+        EPISODES.inc(status="completed")
 
     except Exception as exc:
         error_msg = f"{type(exc).__name__}: {exc}\n{traceback.format_exc()}"
+        EPISODES.inc(status="failed")
+        timings["total"] = round(time.perf_counter() - started, 3)
         try:
-            await update_status(episode_id, "failed", {"error": error_msg})
+            await update_status(
+                episode_id, "failed", {"error": error_msg, "stage_timings": timings}
+            )
         except Exception:
             print(f"Failed to update episode {episode_id} status to failed: {exc}")
+    finally:
+        # Also on CancelledError, e.g. a worker that lost the job's lease
+        if citation_task is not None:
+            citation_task.cancel()
+        EPISODES_IN_PROGRESS.dec()
@@ -0,0 +1,176 @@
+"""Push-based episode progress for SSE subscribers.
+
+One watcher per process follows a MongoDB change stream on `episodes` and
+fans updates out to every subscriber, so status changes made by any API
+or worker process reach every listener. A dropped stream is resumed from
+its last token, and subscribed episodes are re-read in full afterwards in
+case the token could not be used. On deployments without change streams
+(standalone mongod), the watcher polls the subscribed episodes instead,
+which still sees writes made by queue workers.
+"""
+
+import asyncio
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app import db as database
+
+QUEUE_SIZE = 100
+RETRY_DELAY = 5.0  # seconds before re-opening a dropped change stream
+POLL_INTERVAL = 1.0  # seconds between reads when change streams are unavailable
+
+# Internal bookkeeping that subscribers never need
+_HIDDEN_PREFIXES = ("checkpoints", "search_terms", "topic_tokens")
+_HIDDEN_PROJECTION = {prefix: 0 for prefix in _HIDDEN_PREFIXES}
+
+
+class EventBus:
+    """Fan-out of episode updates to per-subscriber queues."""
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    def subscribe(self, episode_ids: list[str]) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        for episode_id in episode_ids:
+            self._subscribers.setdefault(episode_id, set()).add(queue)
+        return queue
+
+    def episode_ids(self) -> list[str]:
+        return list(self._subscribers)
+
+    def unsubscribe(self, episode_ids: list[str], queue: asyncio.Queue) -> None:
+        for episode_id in episode_ids:
+            queues = self._subscribers.get(episode_id)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[episode_id]
+
+    def publish(self, episode_id: str, fields: dict) -> None:
+        queues = self._subscribers.get(episode_id)
+        if not queues:
+            return
+        event = {"id": episode_id, **_visible(fields)}
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()  # slow consumer: drop the oldest update
+            queue.put_nowait(event)
+
+
+def _visible(fields: dict) -> dict:
+    return {k: v for k, v in fields.items() if not k.startswith(_HIDDEN_PREFIXES)}
+
+
+bus = EventBus()
+_watcher: asyncio.Task | None = None
+_change_streams_active = False
+_change_listeners: list = []
+
+
+def add_change_listener(callback) -> None:
+    """Call `callback(episode_id: str, fields: dict)` for every update seen on the change stream.
+
+    Unlike bus subscribers, this includes writes made by other processes,
+    so it is how per-process state (e.g. local caches) stays coherent.
+    """
+    _change_listeners.append(callback)
+
+
+def change_streams_active() -> bool:
+    """Whether change listeners currently see every write to `episodes`."""
+    return _change_streams_active
+
+
+async def _publish_current(episode_ids: list[str], seen: dict | None = None) -> None:
+    """Publish the stored state of each episode as an update.
+
+    With `seen` (episode id -> last `updated_at` published), episodes that
+    haven't changed since are skipped.
+    """
+    if not episode_ids:
+        return
+    cursor = database.db["episodes"].find(
+        {"_id": {"$in": [ObjectId(i) for i in episode_ids]}}, _HIDDEN_PROJECTION
+    )
+    async for doc in cursor:
+        episode_id = str(doc.pop("_id"))
+        changed = doc.get("updated_at") or doc.get("created_at")
+        if seen is not None:
+            if seen.get(episode_id) == changed:
+                continue
+            seen[episode_id] = changed
+        bus.publish(episode_id, doc)
+
+
+async def _poll() -> None:
+    """Fallback for servers without change streams: re-read subscribed episodes."""
+    seen: dict = {}
+    while True:
+        episode_ids = bus.episode_ids()
+        for episode_id in set(seen) - set(episode_ids):
+            del seen[episode_id]
+        try:
+            await _publish_current(episode_ids, seen)
+        except PyMongoError as exc:
+            print(f"[events] Polling episodes failed: {exc}")
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def _watch() -> None:
+    global _change_streams_active
+    pipeline = [{"$match": {"operationType": "update"}}]
+    resume_token = None
+    opened = False
+    while True:
+        try:
+            async with database.db["episodes"].watch(pipeline, resume_after=resume_token) as stream:
+                _change_streams_active = True
+                resume_token = stream.resume_token
+                if opened:
+                    # Covers writes the resumed stream can't replay, e.g. a lost token
+                    await _publish_current(bus.episode_ids())
+                opened = True
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    fields = change.get("updateDescription", {}).get("updatedFields", {})
+                    episode_id = str(change["documentKey"]["_id"])
+                    for callback in _change_listeners:
+                        callback(episode_id, fields)
+                    if fields:
+                        bus.publish(episode_id, fields)
+        except OperationFailure as exc:
+            _change_streams_active = False
+            if not opened:
+                # Standalone servers don't support change streams at all
+                print(f"[events] Change streams unavailable ({exc.code}), polling for updates")
+                await _poll()
+                return
+            # e.g. the resume token has fallen off the oplog: start afresh
+            print(f"[events] Change stream failed: {exc}, reopening in {RETRY_DELAY}s")
+            resume_token = None
+            await asyncio.sleep(RETRY_DELAY)
+        except PyMongoError as exc:
+            _change_streams_active = False
+            print(f"[events] Change stream dropped: {exc}, resuming in {RETRY_DELAY}s")
+            await asyncio.sleep(RETRY_DELAY)
+
+
+async def start_event_watcher() -> None:
+    global _watcher
+    if _watcher is None:
+        _watcher = asyncio.create_task(_watch())
+
+
+async def stop_event_watcher() -> None:
+    global _watcher, _change_streams_active
+    if _watcher is not None:
+        _watcher.cancel()
+        try:
+            await _watcher
+        except asyncio.CancelledError:
+            pass
+        _watcher = None
+    _change_streams_active = False
@@ -3,11 +3,20 @@ import logging
 
 from google import genai
 from google.genai import types
+from pydantic import ValidationError
 
 from app.config import settings
+from app.json_stream import JsonArrayStream
+from app.metrics import UPSTREAM_RETRIES, track_upstream
+from app.models import DialogueLine
+from app.rate_limit import provider_limit, rate_limit_info
 
 logger = logging.getLogger(__name__)
 
+PRO_MODEL = "gemini-3-pro-preview"
+FLASH_MODEL = "gemini-2.0-flash"
+MAX_RETRIES = 3  # for 429s only; other errors fail the call
+
 _client: genai.Client | None = None
 
 
@@ -18,6 +27,26 @@ def _get_client() -> genai.Client:
     return _client
 
 
+async def _generate(provider: str, operation: str, **request):
+    """Call generate_content under the provider limit ("gemini_pro" / "gemini_flash").
+
+    A 429 pauses every caller of that provider for its cool-down, after
+    which the call is retried.
+    """
+    for attempt in range(MAX_RETRIES):
+        try:
+            async with provider_limit(provider).slot():
+                with track_upstream("gemini", operation):
+                    return await _get_client().aio.models.generate_content(**request)
+        except Exception as exc:
+            if rate_limit_info(exc) is None or attempt == MAX_RETRIES - 1:
+                raise
+            UPSTREAM_RETRIES.inc(service="gemini")
+            logger.info(
+                "Gemini %s rate-limited, retrying (attempt %d/%d)", operation, attempt + 1, MAX_RETRIES
+            )
+
+
 RESEARCH_SYSTEM_PROMPT = (
     "You are a podcast researcher. Given a topic, find key facts, anecdotes, "
     "timeline of events, notable figures, surprising details, and controversies. "
@@ -89,11 +118,16 @@ CATEGORIZE_SYSTEM_PROMPT = (
 )
 
 
-async def categorize_topic(topic: str) -> str:
-    """Classify a topic into one of the predefined categories. Never raises."""
+async def categorize_topic(topic: str, default: str | None = "other") -> str | None:
+    """Classify a topic into one of the predefined categories.
+
+    Never raises: returns `default` if the call fails.
+    """
     try:
-        response = await _get_client().aio.models.generate_content(
-            model="gemini-2.0-flash",
+        response = await _generate(
+            "gemini_flash",
+            "categorize",
+            model=FLASH_MODEL,
             contents=f"Classify this podcast topic: {topic}",
             config=types.GenerateContentConfig(
                 system_instruction=CATEGORIZE_SYSTEM_PROMPT,
@@ -108,12 +142,55 @@ async def categorize_topic(topic: str) -> str:
         return category
     except Exception as exc:
         logger.warning("categorize_topic failed for %r: %s", topic, exc)
-        return "other"
+        return default
+
+
+CATEGORIZE_BATCH_SYSTEM_PROMPT = (
+    "You are a topic classifier. Given a numbered list of podcast topics, classify each "
+    "into exactly one of the following categories: technology, science, history, politics, "
+    "health, business, entertainment, sports, education, culture, philosophy, art, other.\n\n"
+    'Return a JSON object with a single key "categories": an array with one category per '
+    "topic, in the same order as the list.\n"
+    'Example: {"categories": ["technology", "history"]}'
+)
+
+
+async def categorize_topics(topics: list[str]) -> list[str | None]:
+    """Classify many topics with one request. Never raises.
+
+    Returns one category per topic, or None for every topic if the call
+    fails or the answer doesn't line up with the list.
+    """
+    if not topics:
+        return []
+    listing = "\n".join(f"{i}. {topic}" for i, topic in enumerate(topics, 1))
+    try:
+        response = await _generate(
+            "gemini_flash",
+            "categorize_batch",
+            model=FLASH_MODEL,
+            contents=f"Classify these {len(topics)} podcast topics:\n{listing}",
+            config=types.GenerateContentConfig(
+                system_instruction=CATEGORIZE_BATCH_SYSTEM_PROMPT,
+                temperature=0.0,
+                response_mime_type="application/json",
+            ),
+        )
+        categories = json.loads(response.text)["categories"]
+        if len(categories) != len(topics):
+            raise ValueError(f"got {len(categories)} categories for {len(topics)} topics")
+    except Exception as exc:
+        logger.warning("categorize_topics failed for %d topics: %s", len(topics), exc)
+        return [None] * len(topics)
+    cleaned = [str(c).lower().strip() for c in categories]
+    return [c if c in ALLOWED_CATEGORIES else "other" for c in cleaned]
 
 
 async def research_topic(topic: str) -> str:
-    response = await _get_client().aio.models.generate_content(
-        model="gemini-3-pro-preview",
+    response = await _generate(
+        "gemini_pro",
+        "research",
+        model=PRO_MODEL,
         contents=f"Research this topic for a podcast episode: {topic}",
         config=types.GenerateContentConfig(
             system_instruction=RESEARCH_SYSTEM_PROMPT,
@@ -124,9 +201,7 @@ async def research_topic(topic: str) -> str:
     return response.text
 
 
-async def generate_script(
-    topic: str, research: str, tone: str = "conversational"
-) -> list[dict]:
+def _script_request(topic: str, research: str, tone: str) -> dict:
     tone_instruction = TONE_STYLES.get(tone, TONE_STYLES["conversational"])
     system_prompt = f"{SCRIPT_SYSTEM_PROMPT_BASE}\n\nTONE GUIDANCE: {tone_instruction}"
 
@@ -137,17 +212,20 @@ async def generate_script(
         "Use the facts, anecdotes, and details from the research to create an "
         "accurate, engaging dialogue. Now write the podcast script as a JSON array."
     )
-    response = await _get_client().aio.models.generate_content(
-        model="gemini-3-pro-preview",
-        contents=prompt,
-        config=types.GenerateContentConfig(
+    return {
+        "model": PRO_MODEL,
+        "contents": prompt,
+        "config": types.GenerateContentConfig(
             system_instruction=system_prompt,
             temperature=0.7,
             response_mime_type="application/json",
         ),
-    )
+    }
+
+
+def _parse_script(text: str | None) -> list[dict]:
     try:
-        script = json.loads(response.text)
+        script = json.loads(text)
     except (json.JSONDecodeError, TypeError) as exc:
         raise ValueError(f"Gemini returned invalid JSON: {exc}") from exc
 
@@ -158,3 +236,54 @@ async def generate_script(
         raise ValueError("Gemini returned unexpected script format")
 
     return script
+
+
+async def generate_script(
+    topic: str, research: str, tone: str = "conversational"
+) -> list[dict]:
+    response = await _generate("gemini_pro", "script", **_script_request(topic, research, tone))
+    return _parse_script(response.text)
+
+
+async def stream_script(topic: str, research: str, tone: str = "conversational"):
+    """Like `generate_script`, but yield each line as soon as the model finishes it.
+
+    Lines are validated as DialogueLine and yielded as dicts. Once the
+    stream ends, the whole response is validated like `generate_script`'s,
+    so a malformed script still raises ValueError (after the lines already
+    yielded). A 429 before the first line is retried after the provider's
+    cool-down.
+    """
+    for attempt in range(MAX_RETRIES):
+        parser = JsonArrayStream()
+        text: list[str] = []
+        yielded = 0
+        try:
+            async with provider_limit("gemini_pro").slot():
+                with track_upstream("gemini", "script"):
+                    stream = await _get_client().aio.models.generate_content_stream(
+                        **_script_request(topic, research, tone)
+                    )
+                    async for chunk in stream:
+                        if not chunk.text:
+                            continue
+                        text.append(chunk.text)
+                        for element in parser.feed(chunk.text):
+                            try:
+                                line = DialogueLine.model_validate(element)
+                            except ValidationError as exc:
+                                raise ValueError(f"Gemini returned an invalid script line: {exc}")
+                            yield line.model_dump()
+                            yielded += 1
+            break
+        except Exception as exc:
+            if yielded or rate_limit_info(exc) is None or attempt == MAX_RETRIES - 1:
+                raise
+            UPSTREAM_RETRIES.inc(service="gemini")
+            logger.info(
+                "Gemini script stream rate-limited, retrying (attempt %d/%d)", attempt + 1, MAX_RETRIES
+            )
+
+    script = _parse_script("".join(text))
+    if not parser.finished or len(script) != yielded:
+        raise ValueError("Gemini script stream ended before the JSON array was complete")
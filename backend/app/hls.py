@@ -0,0 +1,109 @@
+"""Progressive HLS publishing for episodes that are still being stitched.
+
+Audio frames are grouped into fixed-length chunks (HLS "packed audio":
+raw MP3 with an ID3 timestamp tag). Each chunk is uploaded as soon as it
+fills up and the EVENT playlist is rewritten, so listeners can start
+playing while later lines are still being synthesized.
+"""
+
+import math
+import struct
+
+from app.config import settings
+from app.storage import upload_bytes
+
+PLAYLIST_NAME = "playlist.m3u8"
+_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\0"
+
+
+def playlist_key(name: str) -> str:
+    """Storage key of the playlist for output `name`."""
+    return f"audio/{name}/{PLAYLIST_NAME}"
+
+
+def _syncsafe(n: int) -> bytes:
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+
+
+def _timestamp_tag(start_seconds: float) -> bytes:
+    """ID3v2.4 tag carrying the chunk's 90 kHz MPEG-TS timestamp, as HLS requires."""
+    pts = round(start_seconds * 90000) & 0x1FFFFFFFF
+    payload = _TIMESTAMP_OWNER + struct.pack(">Q", pts)
+    frame = b"PRIV" + _syncsafe(len(payload)) + b"\0\0" + payload
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+class HlsPublisher:
+    """Cut a frame stream into chunks and publish them with a live playlist."""
+
+    def __init__(self, name: str, frame_seconds: float, chunk_seconds: float):
+        self.name = name
+        self.prefix = f"audio/{name}"
+        self.frame_seconds = frame_seconds
+        self.frames_per_chunk = max(1, int(chunk_seconds / frame_seconds))
+        self.target_duration = math.ceil(self.frames_per_chunk * frame_seconds)
+        self.playlist_url: str | None = None
+        self.finished = False
+
+        self._chunk = bytearray()
+        self._chunk_frames = 0
+        self._published_frames = 0
+        self._entries: list[tuple[str, float]] = []  # (chunk URI, duration)
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Size of the chunk being filled, not yet uploaded."""
+        return len(self._chunk)
+
+    def write(self, frames) -> None:
+        """Append MP3 frames, publishing every chunk that fills up."""
+        for frame in frames:
+            self._chunk += frame
+            self._chunk_frames += 1
+            if self._chunk_frames >= self.frames_per_chunk:
+                self._publish_chunk()
+
+    def finish(self) -> str | None:
+        """Publish the last partial chunk and close the playlist."""
+        if self._chunk_frames:
+            self._publish_chunk()
+        self.finished = True
+        self._publish_playlist()
+        return self.playlist_url
+
+    def _publish_chunk(self) -> None:
+        name = f"chunk_{len(self._entries):05d}.mp3"
+        start_seconds = self._published_frames * self.frame_seconds
+        url = upload_bytes(
+            _timestamp_tag(start_seconds) + bytes(self._chunk),
+            f"{self.prefix}/{name}",
+            content_type="audio/mpeg",
+        )
+        # Signed chunk URLs carry their own credentials; public ones resolve
+        # relative to the playlist
+        uri = url if settings.storage_url_mode == "signed" else name
+        self._entries.append((uri, self._chunk_frames * self.frame_seconds))
+        self._published_frames += self._chunk_frames
+        self._chunk = bytearray()
+        self._chunk_frames = 0
+        self._publish_playlist()
+
+    def _publish_playlist(self) -> None:
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for uri, duration in self._entries:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(uri)
+        if self.finished:
+            lines.append("#EXT-X-ENDLIST")
+        self.playlist_url = upload_bytes(
+            ("\n".join(lines) + "\n").encode("utf-8"),
+            playlist_key(self.name),
+            content_type="application/vnd.apple.mpegurl",
+            cache_control="no-cache" if not self.finished else None,
+        )
@@ -0,0 +1,58 @@
+"""Process-wide pooled HTTP clients for outbound lookups.
+
+One `httpx.AsyncClient` is kept per upstream host so connection limits
+apply per host and keep-alive connections (and TLS sessions) are reused
+across lookups. HTTP/2 is negotiated when the optional `h2` package is
+installed. Clients are opened and closed by the FastAPI lifespan; callers
+outside it (scripts, workers) get lazily created clients and should call
+`close_http_clients` on shutdown.
+"""
+
+import importlib.util
+
+import httpx
+
+from app.config import settings
+
+DEFAULT_TIMEOUT = 15.0
+KEEPALIVE_EXPIRY = 30.0  # seconds an idle connection is kept open
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections_per_host,
+            max_keepalive_connections=settings.http_max_connections_per_host,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """Borrow the pooled client for `url`'s host. Never close the returned client."""
+    host = httpx.URL(url).host
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _new_client()
+        _clients[host] = client
+    return client
+
+
+async def open_http_clients(*urls: str) -> None:
+    """Pre-create pooled clients for the given upstreams."""
+    for url in urls:
+        get_http_client(url)
+    print(f"HTTP client pool ready (http2={'on' if HTTP2_AVAILABLE else 'off'})")
+
+
+async def close_http_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -1,19 +1,27 @@
 """Fetch a cover image for a podcast topic.
 
-Sources tried in order:
+Sources, queried concurrently (hedged) and chosen by priority:
 1. Google Custom Search (if GOOGLE_CSE_CX is configured) – best coverage
 2. Wikipedia API (free, no key) – fallback
+
+Results are cached per normalized topic.
 """
 
-import httpx
+import asyncio
 
+from app.cache import MISSING, MongoCache, normalize_key
 from app.config import settings
+from app.http_client import get_http_client
+from app.metrics import register_cache, track_upstream
 
 WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
 GOOGLE_CSE_API = "https://www.googleapis.com/customsearch/v1"
 TIMEOUT = 10.0
 HEADERS = {"User-Agent": "PodcastGPT/1.0 (podcast cover image lookup; contact@example.com)"}
 
+_cache = MongoCache("image_cache", max_local_entries=1024)
+register_cache("images", _cache)
+
 
 async def _google_cse_image(topic: str) -> str | None:
     """Search Google Custom Search for an image related to the topic."""
@@ -30,10 +38,11 @@ async def _google_cse_image(topic: str) -> str | None:
         "safe": "active",
     }
     try:
-        async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-            resp = await client.get(GOOGLE_CSE_API, params=params)
+        client = get_http_client(GOOGLE_CSE_API)
+        with track_upstream("google_cse", "image_search"):
+            resp = await client.get(GOOGLE_CSE_API, params=params, timeout=TIMEOUT)
             resp.raise_for_status()
-            data = resp.json()
+        data = resp.json()
 
         items = data.get("items", [])
         if items:
@@ -57,10 +66,11 @@ async def _wikipedia_image(topic: str) -> str | None:
         "pithumbsize": 500,
     }
     try:
-        async with httpx.AsyncClient(timeout=TIMEOUT, headers=HEADERS) as client:
-            resp = await client.get(WIKIPEDIA_API, params=params)
+        client = get_http_client(WIKIPEDIA_API)
+        with track_upstream("wikipedia", "image_search"):
+            resp = await client.get(WIKIPEDIA_API, params=params, headers=HEADERS, timeout=TIMEOUT)
             resp.raise_for_status()
-            data = resp.json()
+        data = resp.json()
 
         pages = data.get("query", {}).get("pages", {})
         for page in pages.values():
@@ -73,16 +83,49 @@ async def _wikipedia_image(topic: str) -> str | None:
     return None
 
 
+async def _hedged_lookup(topic: str) -> str | None:
+    """Query both sources at once and pick by priority.
+
+    Google CSE wins if it answers with an image within the hedge window;
+    after that, the first source to return an image wins.
+    """
+    cse = asyncio.create_task(_google_cse_image(topic))
+    wiki = asyncio.create_task(_wikipedia_image(topic))
+    try:
+        await asyncio.wait({cse}, timeout=settings.image_hedge_seconds)
+        if cse.done() and cse.result():
+            return cse.result()
+
+        remaining = [wiki] if cse.done() else [cse, wiki]
+        for next_done in asyncio.as_completed(remaining):
+            url = await next_done
+            if url:
+                return url
+        return None
+    finally:
+        cse.cancel()
+        wiki.cancel()
+
+
 async def fetch_cover_image(topic: str) -> str | None:
-    """Try multiple sources and return the first image URL found."""
-    # 1. Google Custom Search (best results, needs CSE configured)
-    url = await _google_cse_image(topic)
-    if url:
-        return url
+    """Return a cover image URL for the topic, or None. Never raises.
 
-    # 2. Wikipedia fallback (free, no key)
-    url = await _wikipedia_image(topic)
-    if url:
-        return url
+    The whole lookup is capped at IMAGE_LOOKUP_TIMEOUT_SECONDS so it never
+    holds up the research step it runs alongside.
+    """
+    key = normalize_key(topic)
+    cached = await _cache.get(key)
+    if cached is not MISSING:
+        return cached
 
-    return None
+    try:
+        url = await asyncio.wait_for(
+            _hedged_lookup(topic), timeout=settings.image_lookup_timeout_seconds
+        )
+    except asyncio.TimeoutError:
+        print(f"[image] Cover lookup timed out for '{topic}'")
+        return None
+
+    if url:
+        await _cache.set(key, url, settings.image_cache_ttl_seconds)
+    return url
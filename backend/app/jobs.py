@@ -0,0 +1,197 @@
+"""Durable, Mongo-backed queue of episode generation jobs.
+
+Jobs live in the `jobs` collection and move through
+queued -> running -> done | dead. A worker claims a job with a lease
+(`lease_expires_at`) and keeps extending it with heartbeats while the
+pipeline runs. If the worker dies, the sweeper puts the job back in the
+queue once the lease has expired. A job is retried until it has been
+attempted JOB_MAX_ATTEMPTS times.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app import db as database
+from app.config import settings
+
+COLLECTION = "jobs"
+ACTIVE_STATUSES = ["queued", "running"]  # at most one job per episode in these (unique index)
+RETRY_BASE_DELAY = 30  # seconds; doubles with each failed attempt
+
+
+def _jobs():
+    return database.db[COLLECTION]
+
+
+def _new_job(kind: str, priority: int, now: datetime) -> dict:
+    return {
+        "kind": kind,
+        "priority": priority,
+        "attempts": 0,
+        "max_attempts": settings.job_max_attempts,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "last_error": None,
+    }
+
+
+async def enqueue_job(episode_id: ObjectId, kind: str = "generate", priority: int = 0) -> None:
+    """Queue a job for the episode unless one is already queued or running."""
+    try:
+        await _jobs().update_one(
+            {"episode_id": episode_id, "status": {"$in": ACTIVE_STATUSES}},
+            {"$setOnInsert": {"status": "queued", **_new_job(kind, priority, datetime.now(timezone.utc))}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # a concurrent enqueue won the race
+
+
+async def active_job_status(episode_id: ObjectId) -> str | None:
+    """"queued" or "running" if the episode has an active job, else None."""
+    job = await _jobs().find_one(
+        {"episode_id": episode_id, "status": {"$in": ACTIVE_STATUSES}}, {"status": 1}
+    )
+    return job["status"] if job else None
+
+
+async def enqueue_jobs(episode_ids: list[ObjectId], kind: str = "generate", priority: int = 0) -> None:
+    """Queue jobs for newly created episodes in one write.
+
+    Unlike `enqueue_job` this doesn't check for an active job, so only use
+    it for episodes that have never been queued.
+    """
+    now = datetime.now(timezone.utc)
+    await _jobs().insert_many([
+        {"episode_id": oid, "status": "queued", **_new_job(kind, priority, now)} for oid in episode_ids
+    ])
+
+
+async def cancel_jobs(episode_ids: list[ObjectId]) -> None:
+    """Drop the episodes' jobs that no worker has claimed yet."""
+    await _jobs().delete_many({"episode_id": {"$in": episode_ids}, "status": "queued"})
+
+
+async def queued_job_count() -> int:
+    return await _jobs().count_documents({"status": "queued"})
+
+
+async def queue_position(episode_id: ObjectId) -> int | None:
+    """1-based place of the episode's queued job in claim order, or None if not queued."""
+    job = await _jobs().find_one({"episode_id": episode_id, "status": "queued"})
+    if job is None:
+        return None
+    ahead = await _jobs().count_documents({
+        "status": "queued",
+        "$or": [
+            {"priority": {"$gt": job["priority"]}},
+            {"priority": job["priority"], "available_at": {"$lt": job["available_at"]}},
+        ],
+    })
+    return ahead + 1
+
+
+async def claim_job(worker_id: str) -> dict | None:
+    """Lease the highest-priority job that is ready to run, or return None."""
+    now = datetime.now(timezone.utc)
+    return await _jobs().find_one_and_update(
+        {"status": "queued", "available_at": {"$lte": now}},
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=settings.job_lease_seconds),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("priority", -1), ("available_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def heartbeat(job_id: ObjectId, worker_id: str) -> bool:
+    """Extend the lease. Returns False if the worker no longer holds it."""
+    now = datetime.now(timezone.utc)
+    result = await _jobs().update_one(
+        {"_id": job_id, "status": "running", "lease_owner": worker_id},
+        {
+            "$set": {
+                "lease_expires_at": now + timedelta(seconds=settings.job_lease_seconds),
+                "updated_at": now,
+            }
+        },
+    )
+    return result.modified_count == 1
+
+
+async def complete_job(job_id: ObjectId, worker_id: str) -> None:
+    await _jobs().update_one(
+        {"_id": job_id, "lease_owner": worker_id},
+        {
+            "$set": {
+                "status": "done",
+                "lease_expires_at": None,
+                "updated_at": datetime.now(timezone.utc),
+            }
+        },
+    )
+
+
+async def fail_job(job: dict, worker_id: str, error: str) -> bool:
+    """Record a failed attempt. Returns True if the job was requeued for a retry."""
+    now = datetime.now(timezone.utc)
+    retry = job["attempts"] < job.get("max_attempts", settings.job_max_attempts)
+    update = {
+        "status": "queued" if retry else "dead",
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "last_error": error,
+        "updated_at": now,
+    }
+    if retry:
+        delay = RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1))
+        update["available_at"] = now + timedelta(seconds=delay)
+    await _jobs().update_one({"_id": job["_id"], "lease_owner": worker_id}, {"$set": update})
+    return retry
+
+
+async def reclaim_expired() -> int:
+    """Requeue jobs whose worker stopped heartbeating; give up on exhausted ones.
+
+    Returns the number of jobs requeued.
+    """
+    now = datetime.now(timezone.utc)
+    expired = {"status": "running", "lease_expires_at": {"$lt": now}}
+
+    # Exhausted jobs: the episode would otherwise sit in a working state forever
+    async for job in _jobs().find({**expired, "$expr": {"$gte": ["$attempts", "$max_attempts"]}}):
+        result = await _jobs().update_one(
+            {"_id": job["_id"], "status": "running", "lease_expires_at": job["lease_expires_at"]},
+            {"$set": {"status": "dead", "last_error": "Lease expired", "updated_at": now}},
+        )
+        if result.modified_count:
+            await database.db["episodes"].update_one(
+                {"_id": job["episode_id"]},
+                {"$set": {"status": "failed", "error": f"Worker lost after {job['attempts']} attempts"}},
+            )
+
+    result = await _jobs().update_many(
+        {**expired, "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+        {
+            "$set": {
+                "status": "queued",
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "available_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+    return result.modified_count
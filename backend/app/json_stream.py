@@ -0,0 +1,77 @@
+"""Incremental parser for a JSON array arriving in arbitrary text chunks.
+
+Model output is streamed a few tokens at a time. `JsonArrayStream` scans
+each chunk once, tracking nesting depth and string state, and hands back
+every top-level element as soon as its closing character arrives, so
+callers can act on element 1 while element 20 is still being written.
+Only the complete elements are decoded, with the standard `json` module.
+"""
+
+import json
+
+
+class JsonArrayStream:
+    """Feed text chunks with `feed`; each call returns the elements it completed.
+
+    Text before the opening `[` (e.g. a stray code fence) is ignored. After
+    the closing `]`, `finished` is True and further input is ignored.
+    """
+
+    def __init__(self):
+        self.finished = False
+        self._started = False
+        self._buffer: list[str] = []  # text of the element being read
+        self._depth = 0  # nesting inside the current element
+        self._in_string = False
+        self._escaped = False
+        self._after_comma = False
+
+    def feed(self, chunk: str) -> list:
+        elements = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                continue
+
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0 and char in ",]":
+                if self._buffer:
+                    elements.append(self._decode())
+                elif char == "," or self._after_comma:
+                    raise ValueError("Empty element in JSON array")
+                self._after_comma = char == ","
+                self.finished = char == "]"
+                continue
+
+            if char.isspace() and not self._buffer:
+                continue  # between elements; inside one it is kept for json to judge
+            self._buffer.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth < 0:
+                    raise ValueError(f"Unbalanced '{char}' in JSON array")
+        return elements
+
+    def _decode(self):
+        text = "".join(self._buffer)
+        self._buffer = []
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON array element: {exc}") from exc
@@ -1,30 +1,93 @@
+import asyncio
+import json
+import os
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from email.utils import format_datetime
 
 from bson import ObjectId
 from bson.errors import InvalidId
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
 
 from app import db as database
-from app.db import close_db, connect_db
-from app.episode_pipeline import generate_episode
+from app import metrics
+from app.audio_pool import shutdown_audio_pool, start_audio_pool
+from app.cache import MISSING, normalize_key
+from app.db import EPISODE_SORT_FIELDS, close_db, connect_db
+from app.checkpoints import reset_from_stage
+from app.citations_client import OPEN_LIBRARY_SEARCH_URL
+from app.config import settings
+from app.events import add_change_listener, bus, start_event_watcher, stop_event_watcher
+from app.http_client import close_http_clients, open_http_clients
+from app.image_client import GOOGLE_CSE_API, WIKIPEDIA_API
 from app.models import (
-    EpisodeListItem,
+    EPISODE_LIST_PROJECTION,
+    BatchRequest,
+    BatchResponse,
+    EpisodePage,
     EpisodeResponse,
     GenerateRequest,
     doc_to_episode_list_item,
     doc_to_episode_response,
+    docs_to_batch_response,
 )
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+from app.research_store import invalidate_research, load_research_notes
+from app.response_cache import episode_etag, response_cache, signing_window
+from app.scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_NEW,
+    PRIORITY_REGENERATE,
+    AlreadyRunning,
+    QueueFull,
+    admit_episode,
+    pipeline_status,
+    schedule_episode,
+    schedule_episodes,
+    start_scheduler,
+    stop_scheduler,
+    unschedule_episodes,
+)
+from app.search import query_tokens, relevance_expression, search_fields, search_filter
+from app.topic_classifier import categorize_many
+
+
+_invalidations: set[asyncio.Task] = set()  # strong refs so pending tasks aren't collected
+
+
+def _invalidate_cached_episode(episode_id: str, fields: dict) -> None:
+    task = asyncio.create_task(response_cache.invalidate_episode(episode_id, fields))
+    _invalidations.add(task)
+    task.add_done_callback(_invalidations.discard)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    await open_http_clients(OPEN_LIBRARY_SEARCH_URL, GOOGLE_CSE_API, WIKIPEDIA_API)
+    # Writes from other processes (workers) invalidate this replica's cache too
+    add_change_listener(_invalidate_cached_episode)
+    await start_event_watcher()
+    if settings.pipeline_executor != "queue":
+        # Queue workers stitch in their own pools (app.worker)
+        await start_audio_pool()
+    start_scheduler()
     yield
+    await stop_scheduler()
+    await stop_event_watcher()
+    shutdown_audio_pool()
+    await close_http_clients()
     await close_db()
 
 
+TERMINAL_STATUSES = {"completed", "failed"}
+ALREADY_RUNNING_DETAIL = "Episode is being generated; regenerate it once it has finished"
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
 app = FastAPI(title="PodcastGPT", version="0.1.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +95,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.storage_backend == "local":
+    # LocalStorage URLs point here
+    os.makedirs(settings.storage_local_dir, exist_ok=True)
+    app.mount("/static", StaticFiles(directory=settings.storage_local_dir), name="static")
+
+
+async def _admit_or_429(count: int = 1) -> None:
+    """Turn the request away with 429 + Retry-After when the episode queue is full."""
+    try:
+        await admit_episode(count)
+    except QueueFull as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        )
 
 
 @app.get("/health")
@@ -39,110 +116,409 @@ async def health():
     return {"status": "ok"}
 
 
-@app.post("/episodes", response_model=EpisodeResponse, status_code=201)
-async def create_episode(req: GenerateRequest, background_tasks: BackgroundTasks):
-    doc = {
-        "topic": req.topic,
-        "tone": req.tone.value,
-        "category": None,
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint for this process."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _new_episode_doc(
+    topic: str, tone: str, category: str | None = None, category_source: str | None = None
+) -> dict:
+    return {
+        "topic": topic,
+        "tone": tone,
+        "category": category,
+        "category_source": category_source,
         "status": "pending",
         "created_at": datetime.now(timezone.utc),
+        "updated_at": None,
         "cover_image_url": None,
-        "research_notes": None,
+        "research_id": None,
         "script": None,
         "citations": None,
         "audio_filename": None,
         "audio_url": None,
+        "playlist_url": None,
+        "playlist_key": None,
         "duration_seconds": None,
         "error": None,
+        **search_fields(topic, category, tone),
     }
+
+
+@app.post(
+    "/episodes",
+    response_model=EpisodeResponse,
+    status_code=201,
+    responses={429: {"description": "Too many episodes queued; see Retry-After"}},
+)
+async def create_episode(req: GenerateRequest):
+    await _admit_or_429()
+    doc = _new_episode_doc(req.topic, req.tone.value)
     result = await database.db["episodes"].insert_one(doc)
     doc["_id"] = result.inserted_id
+    await response_cache.invalidate_episode(str(doc["_id"]))
 
-    background_tasks.add_task(generate_episode, doc["_id"])
-    return doc_to_episode_response(doc)
+    episode = doc_to_episode_response(doc)
+    episode.queue_position = await schedule_episode(doc["_id"], PRIORITY_NEW)
+    return episode
+
+
+@app.post(
+    "/episodes/batch",
+    response_model=BatchResponse,
+    status_code=201,
+    responses={429: {"description": "Too many episodes queued; see Retry-After"}},
+)
+async def create_episode_batch(req: BatchRequest):
+    """Create many episodes at once; follow them with GET /episodes/batch/{id}.
+
+    Costs one categorization request and one insert for the whole batch.
+    Repeated topic/tone pairs become a single episode, and episodes on the
+    same topic share one research call.
+    """
+    unique: dict[tuple[str, str], GenerateRequest] = {}
+    for item in req.items:
+        unique.setdefault((normalize_key(item.topic), item.tone.value), item)
+    items = list(unique.values())
+    if len(items) > settings.pipeline_queue_limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch of {len(items)} episodes exceeds the queue limit of {settings.pipeline_queue_limit}",
+        )
+    await _admit_or_429(len(items))
+
+    batch_id = ObjectId()
+    categories = await categorize_many([item.topic for item in items])
+    docs = [
+        {**_new_episode_doc(item.topic, item.tone.value, category, source), "batch_id": batch_id}
+        for item, (category, source) in zip(items, categories)
+    ]
+    try:
+        await database.db["episodes"].insert_many(docs)  # fills in each doc's _id
+        await schedule_episodes([doc["_id"] for doc in docs], PRIORITY_BATCH)
+    except Exception as exc:
+        # Episodes without a pipeline would stay pending forever
+        print(f"[batch] Could not queue batch {batch_id}: {exc}")
+        await _discard_batch(batch_id, [doc["_id"] for doc in docs if "_id" in doc])
+        raise HTTPException(status_code=503, detail="Could not queue the batch, try again")
+    finally:
+        await response_cache.invalidate_lists()
+
+    episode_ids = {key: str(doc["_id"]) for key, doc in zip(unique, docs)}
+    batch = docs_to_batch_response(str(batch_id), docs)
+    batch.item_episode_ids = [episode_ids[(normalize_key(i.topic), i.tone.value)] for i in req.items]
+    return batch
+
+
+async def _discard_batch(batch_id: ObjectId, episode_ids: list[ObjectId]) -> None:
+    try:
+        await unschedule_episodes(episode_ids)
+        await database.db["episodes"].delete_many({"batch_id": batch_id})
+    except Exception as exc:
+        print(f"[batch] Could not discard batch {batch_id}: {exc}")
+
+
+@app.get("/episodes/batch/{batch_id}", response_model=BatchResponse)
+async def get_episode_batch(batch_id: str):
+    """Aggregate progress of a batch, plus a summary of each of its episodes."""
+    oid = _parse_object_id(batch_id, "batch")
+    cursor = database.db["episodes"].find({"batch_id": oid}, EPISODE_LIST_PROJECTION).sort("_id", 1)
+    docs = await cursor.to_list(length=None)
+    if not docs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return docs_to_batch_response(batch_id, docs)
 
 
 @app.get("/episodes/categories")
 async def list_categories():
+    cached = await response_cache.get_list("categories", {})
+    if cached is not MISSING:
+        return cached
     raw = await database.db["episodes"].distinct("category")
-    return sorted([c for c in raw if c])
+    categories = sorted([c for c in raw if c])
+    await response_cache.set_list("categories", {}, categories)
+    return categories
 
 
-@app.get("/episodes/{episode_id}", response_model=EpisodeResponse)
-async def get_episode(episode_id: str):
+def _parse_object_id(value: str, kind: str) -> ObjectId:
     try:
-        oid = ObjectId(episode_id)
-    except (InvalidId, Exception):
-        raise HTTPException(status_code=400, detail="Invalid episode ID format")
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {kind} ID format")
 
+
+def _parse_episode_id(episode_id: str) -> ObjectId:
+    return _parse_object_id(episode_id, "episode")
+
+
+async def _load_episode_doc(oid: ObjectId) -> dict | None:
     doc = await database.db["episodes"].find_one({"_id": oid})
     if not doc:
-        raise HTTPException(status_code=404, detail="Episode not found")
+        return None
+    if doc.get("research_id") and not doc.get("research_notes"):
+        doc["research_notes"] = await load_research_notes(doc["research_id"])
+    return doc
 
-    return doc_to_episode_response(doc)
 
+async def _load_episode(oid: ObjectId) -> EpisodeResponse | None:
+    doc = await _load_episode_doc(oid)
+    return doc_to_episode_response(doc) if doc else None
 
-@app.post("/episodes/{episode_id}/regenerate", response_model=EpisodeResponse)
-async def regenerate_episode(episode_id: str, background_tasks: BackgroundTasks):
-    try:
-        oid = ObjectId(episode_id)
-    except (InvalidId, Exception):
-        raise HTTPException(status_code=400, detail="Invalid episode ID format")
 
+def _sse(event: str, data: dict) -> str:
+    def default(value):
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+
+    return f"event: {event}\ndata: {json.dumps(data, default=default)}\n\n"
+
+
+def _event_stream(request: Request, oids: list[ObjectId]) -> StreamingResponse:
+    """Stream a snapshot of each episode, then its updates, until all are finished."""
+    ids = [str(oid) for oid in oids]
+
+    async def stream():
+        # Subscribe before taking snapshots so no update falls in between
+        queue = bus.subscribe(ids)
+        try:
+            active = set()
+            for oid in oids:
+                episode = await _load_episode(oid)
+                if episode is None:
+                    continue
+                yield _sse("snapshot", episode.model_dump(mode="json"))
+                if episode.status.value not in TERMINAL_STATUSES:
+                    active.add(episode.id)
+
+            while active:
+                if await request.is_disconnected():
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse("update", event)
+                if event.get("status") in TERMINAL_STATUSES:
+                    active.discard(event["id"])
+            yield _sse("end", {})
+        finally:
+            bus.unsubscribe(ids, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/episodes/events")
+async def stream_episodes_events(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated episode IDs"),
+):
+    """Server-sent events for several episodes over a single connection."""
+    oids = [_parse_episode_id(i) for i in dict.fromkeys(ids.split(",")) if i]
+    if not oids or len(oids) > 100:
+        raise HTTPException(status_code=400, detail="Provide between 1 and 100 episode IDs")
+    return _event_stream(request, oids)
+
+
+@app.get("/episodes/{episode_id}", response_model=EpisodeResponse)
+async def get_episode(episode_id: str, request: Request, response: Response):
+    oid = _parse_episode_id(episode_id)
+
+    window = signing_window()
+    cached = await response_cache.get_episode(str(oid))
+    if cached is not MISSING and cached.get("window") != window:
+        cached = MISSING  # its signed URLs are due to be re-signed
+    if cached is MISSING:
+        doc = await _load_episode_doc(oid)
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Episode not found")
+        cached = {
+            "etag": episode_etag(doc, window),
+            "window": window,
+            "last_modified": format_datetime(
+                (doc.get("updated_at") or doc["created_at"]).replace(tzinfo=timezone.utc),
+                usegmt=True,
+            ),
+            "body": doc_to_episode_response(doc).model_dump(mode="json"),
+        }
+        # Only finished episodes are stable enough to cache
+        if doc["status"] == "completed":
+            await response_cache.set_episode(str(oid), cached)
+            # A regenerate may have reset the episode since it was read, and
+            # its invalidation may have run before the entry was stored
+            current = {"_id": oid, "updated_at": doc.get("updated_at")}
+            if not await database.db["episodes"].find_one(current, {"_id": 1}):
+                await response_cache.drop_episode(str(oid))
+
+    headers = {
+        "ETag": cached["etag"],
+        "Last-Modified": cached["last_modified"],
+        "Cache-Control": "no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if cached["etag"] in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return cached["body"]
+
+
+@app.get("/episodes/{episode_id}/events")
+async def stream_episode_events(episode_id: str, request: Request):
+    """Server-sent events: a `snapshot`, then `update`s as fields change, then `end`."""
+    oid = _parse_episode_id(episode_id)
+    if not await database.db["episodes"].find_one({"_id": oid}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Episode not found")
+    return _event_stream(request, [oid])
+
+
+@app.post(
+    "/episodes/{episode_id}/regenerate",
+    response_model=EpisodeResponse,
+    responses={
+        409: {"description": "The episode is being generated right now"},
+        429: {"description": "Too many episodes queued; see Retry-After"},
+    },
+)
+async def regenerate_episode(
+    episode_id: str,
+    from_stage: str = Query(
+        default="research",
+        description="Stage to restart from (research, script, audio, citations), "
+        "or 'auto' to resume from the first stage that changed or never finished",
+    ),
+    refresh_research: bool = Query(default=False),
+):
+    oid = _parse_episode_id(episode_id)
     doc = await database.db["episodes"].find_one({"_id": oid})
     if not doc:
         raise HTTPException(status_code=404, detail="Episode not found")
+    # A second pipeline on the same document would race the first one
+    if await pipeline_status(oid) == "running":
+        raise HTTPException(status_code=409, detail=ALREADY_RUNNING_DETAIL)
+    await _admit_or_429()
 
-    # Reset the episode to pending and clear all generated data
-    reset = {
-        "status": "pending",
-        "category": None,
-        "cover_image_url": None,
-        "research_notes": None,
-        "script": None,
-        "citations": None,
-        "audio_filename": None,
-        "audio_url": None,
-        "duration_seconds": None,
-        "error": None,
-    }
-    await database.db["episodes"].update_one({"_id": oid}, {"$set": reset})
+    if refresh_research:
+        await invalidate_research(doc["topic"])
+        from_stage = "research"
+
+    # Reset the episode to pending and clear the data of every stage being redone
+    reset = {"status": "pending", "error": None, "updated_at": datetime.now(timezone.utc)}
+    unset = {}
+    if from_stage != "auto":
+        try:
+            stage_reset, unset = reset_from_stage(from_stage)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        reset.update(stage_reset)
+    update = {"$set": reset}
+    if unset:
+        update["$unset"] = unset
+    await database.db["episodes"].update_one({"_id": oid}, update)
+    await response_cache.invalidate_episode(str(oid))
     doc.update(reset)
 
-    background_tasks.add_task(generate_episode, oid)
-    return doc_to_episode_response(doc)
+    episode = doc_to_episode_response(doc)
+    try:
+        episode.queue_position = await schedule_episode(oid, PRIORITY_REGENERATE)
+    except AlreadyRunning:
+        # Started between the check above and now
+        raise HTTPException(status_code=409, detail=ALREADY_RUNNING_DETAIL)
+    return episode
 
 
-@app.get("/episodes", response_model=list[EpisodeListItem])
+@app.get("/episodes", response_model=EpisodePage)
 async def list_episodes(
     limit: int = Query(default=20, ge=1, le=100),
-    offset: int = Query(default=0, ge=0),
+    cursor: str = Query(default="", description="next_cursor from the previous page"),
     search: str = Query(default=""),
     category: str = Query(default=""),
     tone: str = Query(default=""),
-    sort_by: str = Query(default="created_at"),
-    sort_order: str = Query(default="desc"),
+    sort_by: str = Query(default="created_at", description="Ignored when `search` is set"),
+    sort_order: str = Query(default="desc", description="Ignored when `search` is set"),
 ):
+    """List episodes, newest first by default.
+
+    With `search`, results are ranked by relevance instead and `sort_by`/
+    `sort_order` are ignored. Only the newest SEARCH_CANDIDATE_LIMIT
+    matching episodes are ranked.
+    """
+    cache_params = {
+        "limit": limit,
+        "cursor": cursor,
+        "search": search,
+        "category": category,
+        "tone": tone,
+        "sort_by": sort_by,
+        "sort_order": sort_order,
+    }
+    cached = await response_cache.get_list("episodes", cache_params)
+    if cached is not MISSING:
+        return cached
+
     query = {}
-    if search.strip():
-        query["topic"] = {"$regex": search.strip(), "$options": "i"}
+    tokens = query_tokens(search)
+    if tokens:
+        query.update(search_filter(tokens))
     if category.strip():
         query["category"] = category.strip()
     if tone.strip():
         query["tone"] = tone.strip()
 
-    # Build sort spec
-    allowed_sort_fields = {"created_at", "duration_seconds", "topic"}
-    sort_field = sort_by if sort_by in allowed_sort_fields else "created_at"
-    direction = 1 if sort_order == "asc" else -1
-
-    cursor = (
-        database.db["episodes"]
-        .find(query)
-        .sort(sort_field, direction)
-        .skip(offset)
-        .limit(limit)
-    )
-    docs = await cursor.to_list(length=limit)
-    return [doc_to_episode_list_item(doc) for doc in docs]
+    # Build sort spec: searches are ranked by relevance, then newest first (sort_by is ignored)
+    if tokens:
+        sort_field, direction = "score", -1
+    else:
+        sort_field = sort_by if sort_by in EPISODE_SORT_FIELDS else "created_at"
+        direction = 1 if sort_order == "asc" else -1
+
+    after = None
+    if cursor:
+        try:
+            last_value, last_id = decode_cursor(cursor, sort_field, direction)
+        except InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        after = keyset_filter(sort_field, direction, last_value, last_id)
+
+    # Fetch one extra row to know whether another page exists
+    episodes = database.db["episodes"]
+    if tokens:
+        pipeline = [
+            {"$match": query},
+            # Bound the ranked set before scoring; served from the search_terms + _id index
+            {"$sort": {"_id": -1}},
+            {"$limit": settings.search_candidate_limit},
+            {"$addFields": {"score": relevance_expression(tokens)}},
+        ]
+        if after:
+            pipeline.append({"$match": after})
+        pipeline += [
+            {"$sort": {"score": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {**EPISODE_LIST_PROJECTION, "score": 1}},
+        ]
+        docs = await episodes.aggregate(pipeline).to_list(length=limit + 1)
+    else:
+        if after:
+            query = {"$and": [query, after]}
+        docs = await (
+            episodes.find(query, EPISODE_LIST_PROJECTION)
+            .sort([(sort_field, direction), ("_id", direction)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort_field, direction, docs[-1])
+    page = EpisodePage(
+        items=[doc_to_episode_list_item(doc) for doc in docs],
+        next_cursor=next_cursor,
+    ).model_dump(mode="json")
+    await response_cache.set_list("episodes", cache_params, page)
+    return page
@@ -0,0 +1,252 @@
+"""Process-local metrics in the Prometheus text exposition format.
+
+A deliberately small registry: counters, gauges and histograms with
+labels, safe to update from worker threads (TTS runs in
+`asyncio.to_thread`). Caches that already count their own hits and misses
+are registered and read at scrape time rather than double-counted.
+
+The API serves `render()` on `GET /metrics`; `app.worker` can serve it on
+`--metrics-port`, since pipelines run there when PIPELINE_EXECUTOR=queue.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "podcastgpt_"
+
+# Seconds; spans a fast cache lookup up to a long Gemini call
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_metrics: list["_Metric"] = []
+_caches: dict[str, object] = {}
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple[str, ...], object] = {}
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}"
+            for key, v in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0}
+            state["sum"] += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CacheStats:
+    """Hit/miss counters for caches that do not keep their own."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+
+def register_cache(name: str, cache) -> None:
+    """Report `cache.hits` / `cache.misses` (read at scrape time) under `name`."""
+    _caches[name] = cache
+
+
+def _render_caches() -> list[str]:
+    hits = [f"# HELP {PREFIX}cache_hits_total Cache lookups answered from the cache.",
+            f"# TYPE {PREFIX}cache_hits_total counter"]
+    misses = [f"# HELP {PREFIX}cache_misses_total Cache lookups that missed.",
+              f"# TYPE {PREFIX}cache_misses_total counter"]
+    ratios = [f"# HELP {PREFIX}cache_hit_ratio Hits / lookups since process start.",
+              f"# TYPE {PREFIX}cache_hit_ratio gauge"]
+    for name, cache in _caches.items():
+        label = f'{{cache="{_escape(name)}"}}'
+        total = cache.hits + cache.misses
+        hits.append(f"{PREFIX}cache_hits_total{label} {cache.hits}")
+        misses.append(f"{PREFIX}cache_misses_total{label} {cache.misses}")
+        ratios.append(f"{PREFIX}cache_hit_ratio{label} {cache.hits / total if total else 0.0}")
+    return hits + misses + ratios
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    with _lock:
+        lines = [line for metric in _metrics for line in metric.render()]
+    lines += _render_caches()
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# -- Pipeline ------------------------------------------------------------------
+
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+EPISODES = Counter("episodes_total", "Pipeline runs by outcome.", ("status",))
+EPISODES_IN_PROGRESS = Gauge("episodes_in_progress", "Pipelines currently running.")
+PIPELINE_QUEUE_DEPTH = Gauge("pipeline_queue_depth", "Episodes waiting for a pipeline slot in this process.")
+PIPELINE_REJECTED = Counter(
+    "pipeline_rejected_total", "Episode requests turned away with 429 because the queue was full."
+)
+CATEGORIZATIONS = Counter(
+    "categorizations_total", "Topics categorized by the local classifier, by Gemini, or by fallback when Gemini failed.", ("source",)
+)
+
+# -- Outbound clients ------------------------------------------------------------
+
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_seconds", "Latency of calls to external services.", ("service", "operation")
+)
+UPSTREAM_IN_FLIGHT = Gauge("upstream_in_flight", "Calls to external services in flight.", ("service",))
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total", "Failed calls to external services, by error type.", ("service", "error")
+)
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Retried calls to external services.", ("service",))
+PROVIDER_WAIT_SECONDS = Histogram(
+    "provider_wait_seconds", "Time calls wait for a provider's concurrency and rate budget.", ("provider",)
+)
+PROVIDER_CONCURRENCY = Gauge(
+    "provider_concurrency_limit", "Calls currently allowed in flight per provider.", ("provider",)
+)
+PROVIDER_BACKOFFS = Counter(
+    "provider_backoffs_total", "Cool-downs started by a provider answering 429.", ("provider",)
+)
+
+# -- Audio worker processes ------------------------------------------------------
+
+AUDIO_QUEUE_DEPTH = Gauge("audio_queue_depth", "Stitch calls waiting for an audio worker process.")
+AUDIO_QUEUE_WAIT_SECONDS = Histogram(
+    "audio_queue_wait_seconds", "Time stitch calls wait before an audio worker runs them."
+)
+AUDIO_JOB_SECONDS = Histogram(
+    "audio_job_seconds", "Time audio workers spend on each stitch call.", ("operation",)
+)
+
+
+@contextmanager
+def track_upstream(service: str, operation: str):
+    """Time a call to an external service and count its failure, if any.
+
+    Works in both sync and async code (`with`, not `async with`).
+    """
+    UPSTREAM_IN_FLIGHT.inc(service=service)
+    started = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        UPSTREAM_ERRORS.inc(service=service, error=type(exc).__name__)
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(service=service)
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, service=service, operation=operation)
+
+
+@contextmanager
+def stage_timer(stage: str, timings: dict[str, float]):
+    """Observe a pipeline stage and record its duration in `timings[stage]`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings[stage] = round(elapsed, 3)
@@ -3,6 +3,9 @@ from enum import Enum
 
 from pydantic import BaseModel, Field
 
+from app.config import settings
+from app.storage import episode_audio_url, episode_playlist_url
+
 
 class EpisodeStatus(str, Enum):
     pending = "pending"
@@ -44,6 +47,10 @@ class GenerateRequest(BaseModel):
     tone: ToneStyle = Field(default=ToneStyle.conversational, description="The tone and style of the podcast")
 
 
+class BatchRequest(BaseModel):
+    items: list[GenerateRequest] = Field(..., min_length=1, max_length=settings.batch_max_episodes)
+
+
 class DialogueLine(BaseModel):
     speaker: str
     text: str
@@ -76,7 +83,10 @@ class EpisodeResponse(BaseModel):
     script: list[DialogueLine] | None = None
     citations: list[Citation] | None = None
     audio_url: str | None = None
+    playlist_url: str | None = None
     duration_seconds: float | None = None
+    stage_timings: dict[str, float] | None = None  # seconds per stage of the last run
+    queue_position: int | None = None  # set on create/regenerate while the episode waits for a slot
     error: str | None = None
 
 
@@ -92,6 +102,35 @@ class EpisodeListItem(BaseModel):
     duration_seconds: float | None = None
 
 
+class EpisodePage(BaseModel):
+    items: list[EpisodeListItem]
+    next_cursor: str | None = None
+
+
+class BatchResponse(BaseModel):
+    id: str
+    total: int  # distinct episodes; repeated topic/tone pairs share one
+    progress: dict[str, int]  # episode count per status
+    done: bool  # every episode has completed or failed
+    episodes: list[EpisodeListItem]
+    item_episode_ids: list[str] | None = None  # on create: the episode for each request item, in order
+
+
+# Fields needed to build an EpisodeListItem; keeps list queries off the
+# large research_notes/script fields
+EPISODE_LIST_PROJECTION = {
+    "topic": 1,
+    "tone": 1,
+    "category": 1,
+    "status": 1,
+    "created_at": 1,
+    "cover_image_url": 1,
+    "audio_url": 1,
+    "audio_filename": 1,
+    "duration_seconds": 1,
+}
+
+
 def doc_to_episode_response(doc: dict) -> EpisodeResponse:
     return EpisodeResponse(
         id=str(doc["_id"]),
@@ -104,8 +143,10 @@ def doc_to_episode_response(doc: dict) -> EpisodeResponse:
         research_notes=doc.get("research_notes"),
         script=[DialogueLine(**line) for line in doc["script"]] if doc.get("script") else None,
         citations=[Citation(**c) for c in doc["citations"]] if doc.get("citations") else None,
-        audio_url=doc.get("audio_url"),
+        audio_url=episode_audio_url(doc),
+        playlist_url=episode_playlist_url(doc),
         duration_seconds=doc.get("duration_seconds"),
+        stage_timings=doc.get("stage_timings"),
         error=doc.get("error"),
     )
 
@@ -119,6 +160,19 @@ def doc_to_episode_list_item(doc: dict) -> EpisodeListItem:
         status=doc["status"],
         created_at=doc["created_at"],
         cover_image_url=doc.get("cover_image_url"),
-        audio_url=doc.get("audio_url"),
+        audio_url=episode_audio_url(doc),
         duration_seconds=doc.get("duration_seconds"),
     )
+
+
+def docs_to_batch_response(batch_id: str, docs: list[dict]) -> BatchResponse:
+    progress: dict[str, int] = {}
+    for doc in docs:
+        progress[doc["status"]] = progress.get(doc["status"], 0) + 1
+    return BatchResponse(
+        id=batch_id,
+        total=len(docs),
+        progress=progress,
+        done=all(doc["status"] in ("completed", "failed") for doc in docs),
+        episodes=[doc_to_episode_list_item(doc) for doc in docs],
+    )
@@ -0,0 +1,168 @@
+"""Minimal MPEG audio (Layer III) frame parser and writer.
+
+Used to join MP3 segments at the frame level without decoding to PCM and
+re-encoding. Only what stitching needs is implemented: frame walking,
+format checks between segments, and generating silent frames.
+"""
+
+from dataclasses import dataclass
+
+# Indexed by the 2-bit version field: 0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+_BITRATES_V1_L3 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2_L3 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_LAYER_III = 1
+_CHANNEL_MODE_MONO = 3
+
+
+class Mp3FormatError(ValueError):
+    """Raised when data cannot be joined at the frame level."""
+
+
+@dataclass(frozen=True)
+class FrameFormat:
+    """Stream properties that must match for frames to be concatenated."""
+
+    version: int
+    sample_rate_index: int
+    mono: bool
+
+    @property
+    def sample_rate(self) -> int:
+        return _SAMPLE_RATES[self.version][self.sample_rate_index]
+
+    @property
+    def samples_per_frame(self) -> int:
+        return 1152 if self.version == 3 else 576
+
+
+@dataclass(frozen=True)
+class FrameHeader:
+    format: FrameFormat
+    bitrate_index: int
+    channel_mode: int
+    length: int  # bytes, header included
+
+
+def parse_header(data: bytes | memoryview, pos: int) -> FrameHeader | None:
+    """Parse the 4-byte frame header at `pos`, or return None if there is none."""
+    if pos + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer != _LAYER_III:
+        return None
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    padding = (b2 >> 1) & 0x01
+    channel_mode = b3 >> 6
+    fmt = FrameFormat(version, sample_rate_index, channel_mode == _CHANNEL_MODE_MONO)
+    bitrates = _BITRATES_V1_L3 if version == 3 else _BITRATES_V2_L3
+    coefficient = 144 if version == 3 else 72
+    length = coefficient * bitrates[bitrate_index] * 1000 // fmt.sample_rate + padding
+    return FrameHeader(fmt, bitrate_index, channel_mode, length)
+
+
+def _side_info_length(header: FrameHeader) -> int:
+    if header.format.version == 3:
+        return 17 if header.format.mono else 32
+    return 9 if header.format.mono else 17
+
+
+def _is_info_frame(data: bytes, pos: int, header: FrameHeader) -> bool:
+    """True for the Xing/Info/VBRI metadata frame some encoders prepend."""
+    tag_pos = pos + 4 + _side_info_length(header)
+    return data[tag_pos:tag_pos + 4] in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI"
+
+
+def _skip_id3v2(data: bytes) -> int:
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+@dataclass
+class Mp3Stream:
+    """Audio frames of one MP3 file as (offset, length) slices into `data`."""
+
+    data: bytes
+    frames: list[tuple[int, int]]
+    format: FrameFormat
+    first_header: FrameHeader
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.frames) * self.format.samples_per_frame / self.format.sample_rate
+
+    def iter_frames(self):
+        view = memoryview(self.data)
+        for offset, length in self.frames:
+            yield view[offset:offset + length]
+
+
+def parse(data: bytes) -> Mp3Stream:
+    """Split MP3 data into audio frames, dropping ID3 tags and metadata frames.
+
+    Raises Mp3FormatError if no frames are found or the stream changes
+    sample rate or channel count part-way through.
+    """
+    pos = _skip_id3v2(data)
+    frames: list[tuple[int, int]] = []
+    fmt: FrameFormat | None = None
+    first_header: FrameHeader | None = None
+    end = len(data)
+
+    while pos + 4 <= end:
+        header = parse_header(data, pos)
+        if header is None or pos + header.length > end:
+            if data[pos:pos + 3] == b"TAG":
+                break  # trailing ID3v1 tag
+            pos += 1  # resync on garbage between frames
+            continue
+        if fmt is None:
+            if _is_info_frame(data, pos, header):
+                pos += header.length
+                continue
+            fmt, first_header = header.format, header
+        elif header.format != fmt:
+            raise Mp3FormatError("MP3 stream changes format mid-stream")
+        frames.append((pos, header.length))
+        pos += header.length
+
+    if fmt is None or first_header is None:
+        raise Mp3FormatError("No MPEG Layer III frames found")
+    return Mp3Stream(data, frames, fmt, first_header)
+
+
+def silent_frame(template: FrameHeader) -> bytes:
+    """Build one silent frame matching `template`'s format and bitrate.
+
+    All-zero side information means no main data and zero-length Huffman
+    regions, which every decoder renders as silence. The frame never
+    borrows from the bit reservoir, so it can sit between any two streams.
+    """
+    fmt = template.format
+    b1 = 0xE0 | (fmt.version << 3) | (_LAYER_III << 1) | 0x01  # no CRC
+    b2 = (template.bitrate_index << 4) | (fmt.sample_rate_index << 2)  # no padding
+    b3 = template.channel_mode << 6
+    bitrates = _BITRATES_V1_L3 if fmt.version == 3 else _BITRATES_V2_L3
+    coefficient = 144 if fmt.version == 3 else 72
+    length = coefficient * bitrates[template.bitrate_index] * 1000 // fmt.sample_rate
+    return bytes((0xFF, b1, b2, b3)) + bytes(length - 4)
+
+
+def silence_frame_count(fmt: FrameFormat, duration_ms: int) -> int:
+    """Number of frames closest to `duration_ms` of audio."""
+    return max(1, round(duration_ms / 1000 * fmt.sample_rate / fmt.samples_per_frame))
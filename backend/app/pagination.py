@@ -0,0 +1,62 @@
+"""Keyset (cursor) pagination for episode listings.
+
+Pages are ordered by (sort_field, _id). A cursor records the last row's
+values, and the next page starts strictly after them, so deep pages cost
+the same as the first one. Cursors are opaque to clients: base64url
+encoded Extended JSON that also records the sort they belong to.
+"""
+
+import base64
+
+from bson import ObjectId, json_util
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_field: str, direction: int, doc: dict) -> str:
+    payload = {"f": sort_field, "d": direction, "v": doc.get(sort_field), "id": doc["_id"]}
+    raw = json_util.dumps(payload).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str, direction: int) -> tuple[object, ObjectId]:
+    """Return (last_value, last_id). Raises InvalidCursor if it is malformed or
+    was issued for a different sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json_util.loads(raw)
+        if payload["f"] != sort_field or payload["d"] != direction:
+            raise InvalidCursor("Cursor does not match the requested sort")
+        if not isinstance(payload["id"], ObjectId):
+            raise InvalidCursor("Malformed cursor")
+        return payload["v"], payload["id"]
+    except InvalidCursor:
+        raise
+    except Exception as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+
+
+def keyset_filter(sort_field: str, direction: int, last_value, last_id: ObjectId) -> dict:
+    """Filter for rows strictly after (last_value, last_id) in the given order.
+
+    Mongo sorts missing/null values before everything else and comparison
+    operators never match across types, so nulls need their own branches:
+    they come first in ascending order and last in descending order.
+    """
+    id_op = "$gt" if direction == 1 else "$lt"
+    if last_value is None:
+        same = {sort_field: None, "_id": {id_op: last_id}}
+        if direction == 1:
+            return {"$or": [same, {sort_field: {"$ne": None}}]}
+        return same
+
+    value_op = "$gt" if direction == 1 else "$lt"
+    branches = [
+        {sort_field: {value_op: last_value}},
+        {sort_field: last_value, "_id": {id_op: last_id}},
+    ]
+    if direction == -1:
+        branches.append({sort_field: None})
+    return {"$or": branches}
@@ -0,0 +1,166 @@
+"""Rate limiting shared by every episode in the process.
+
+`TokenBucket` paces requests; `ProviderLimit` combines a bucket with a
+concurrency cap and a cool-down after 429s for each upstream provider.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from app.config import settings
+from app.metrics import PROVIDER_BACKOFFS, PROVIDER_CONCURRENCY, PROVIDER_WAIT_SECONDS
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until `tokens` are available, then take them.
+
+        Waiters are served in arrival order: the lock is held while sleeping
+        so a later caller cannot jump ahead of one already waiting.
+        """
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+DEFAULT_BACKOFF_SECONDS = 5.0  # pause after a 429 that came without Retry-After
+MAX_BACKOFF_SECONDS = 120.0
+
+
+def retry_after_seconds(headers) -> float | None:
+    """Seconds from a Retry-After header, if present and numeric."""
+    if not headers:
+        return None
+    value = next((v for k, v in dict(headers).items() if k.lower() == "retry-after"), None)
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; callers fall back to their default
+
+
+def rate_limit_info(exc: BaseException) -> float | None:
+    """If `exc` is a provider's 429, return how long to back off; otherwise None.
+
+    Understands the ElevenLabs SDK (`status_code`, `headers`) and google-genai
+    (`code`, `response`) errors.
+    """
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if status != 429:
+        return None
+    headers = getattr(exc, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    retry_after = retry_after_seconds(headers)
+    return DEFAULT_BACKOFF_SECONDS if retry_after is None else retry_after
+
+
+class ProviderLimit:
+    """Concurrency cap, request rate and 429 cool-down for one upstream provider.
+
+    Every episode in the process shares one ProviderLimit per provider, so a
+    burst of episodes queues here instead of all hitting the provider and
+    being rate-limited together. When the provider does answer 429,
+    `back_off` pauses every caller, not just the one that got it, and halves
+    the concurrency allowed; it then grows back by one after each run of
+    `concurrency` successful calls, up to `max_concurrency`. A configured cap
+    above what the account really allows therefore settles at the real one.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rate: float = 0.0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self.in_flight = 0
+        self._successes = 0
+        self._changed = asyncio.Condition()
+        self._bucket = TokenBucket(rate) if rate > 0 else None
+        self._paused_until = 0.0
+        PROVIDER_CONCURRENCY.set(self.concurrency, provider=name)
+
+    def back_off(self, seconds: float) -> None:
+        """Hold new calls for `seconds` (e.g. the provider's Retry-After) and halve concurrency."""
+        now = time.monotonic()
+        if now >= self._paused_until:  # one cut per burst of 429s, not one per call
+            self.concurrency = max(1, self.concurrency // 2)
+            self._successes = 0
+        self._paused_until = max(self._paused_until, now + min(seconds, MAX_BACKOFF_SECONDS))
+        PROVIDER_CONCURRENCY.set(self.concurrency, provider=self.name)
+        PROVIDER_BACKOFFS.inc(provider=self.name)
+
+    def _succeeded(self) -> None:
+        self._successes += 1
+        if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self._successes = 0
+            PROVIDER_CONCURRENCY.set(self.concurrency, provider=self.name)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a free slot, any cool-down and the rate budget, then run the call.
+
+        A 429 raised by the call starts a cool-down before being re-raised.
+        """
+        started = time.perf_counter()
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            while (pause := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            PROVIDER_WAIT_SECONDS.observe(time.perf_counter() - started, provider=self.name)
+            try:
+                yield
+            except Exception as exc:
+                backoff = rate_limit_info(exc)
+                if backoff is not None:
+                    self.back_off(backoff)
+                raise
+            self._succeeded()
+        finally:
+            async with self._changed:
+                self.in_flight -= 1
+                self._changed.notify_all()
+
+
+# name -> (max concurrency, requests per second; 0 = no rate cap)
+def _provider_settings() -> dict[str, tuple[int, float]]:
+    return {
+        "gemini_pro": (settings.gemini_pro_max_concurrency, settings.gemini_pro_rps),
+        "gemini_flash": (settings.gemini_flash_max_concurrency, settings.gemini_flash_rps),
+        "elevenlabs": (settings.tts_max_concurrency, settings.tts_rps),
+        "openlibrary": (settings.http_max_connections_per_host, settings.openlibrary_rps),
+    }
+
+
+_limits: dict[str, ProviderLimit] = {}
+
+
+def provider_limit(name: str) -> ProviderLimit:
+    """The process-wide limit for provider `name`, configured from settings."""
+    limit = _limits.get(name)
+    if limit is None:
+        max_concurrency, rate = _provider_settings()[name]
+        limit = _limits[name] = ProviderLimit(name, max_concurrency, rate)
+    return limit
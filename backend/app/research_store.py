@@ -0,0 +1,75 @@
+"""Shared research notes, memoized per topic.
+
+Research (pro model + Google Search grounding) is the most expensive call
+in the pipeline, so notes are stored once in the `research` collection
+and episodes reference them by `research_id`. A fresh entry for the same
+normalized topic is reused, and concurrent requests for one topic share a
+single in-flight call.
+
+Entries are never deleted, because episodes keep pointing at them.
+Invalidation only marks them stale so the next episode researches again.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from app import db as database
+from app.cache import SingleFlight, normalize_key
+from app.config import settings
+from app.gemini_client import research_topic
+from app.metrics import CacheStats, register_cache
+
+COLLECTION = "research"
+
+_inflight = SingleFlight()
+_stats = CacheStats()
+register_cache("research", _stats)
+
+
+async def _find_fresh(topic_key: str) -> dict | None:
+    return await database.db[COLLECTION].find_one(
+        {"topic_key": topic_key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        sort=[("created_at", -1)],
+    )
+
+
+async def _research_and_store(topic: str, topic_key: str) -> tuple[ObjectId, str]:
+    notes = await research_topic(topic)
+    now = datetime.now(timezone.utc)
+    result = await database.db[COLLECTION].insert_one(
+        {
+            "topic_key": topic_key,
+            "topic": topic,
+            "notes": notes,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=settings.research_cache_ttl_seconds),
+        }
+    )
+    return result.inserted_id, notes
+
+
+async def get_research(topic: str) -> tuple[ObjectId, str]:
+    """Return (research_id, notes) for the topic, researching only on a miss."""
+    topic_key = normalize_key(topic)
+    doc = await _find_fresh(topic_key)
+    if doc is not None:
+        _stats.hits += 1
+        return doc["_id"], doc["notes"]
+    _stats.misses += 1
+    return await _inflight.do(topic_key, lambda: _research_and_store(topic, topic_key))
+
+
+async def invalidate_research(topic: str) -> None:
+    """Mark every stored entry for the topic stale so the next request re-researches."""
+    await database.db[COLLECTION].update_many(
+        {"topic_key": normalize_key(topic)},
+        {"$set": {"expires_at": datetime.now(timezone.utc)}},
+    )
+
+
+async def load_research_notes(research_id: ObjectId | None) -> str | None:
+    if research_id is None:
+        return None
+    doc = await database.db[COLLECTION].find_one({"_id": research_id}, {"notes": 1})
+    return doc["notes"] if doc else None
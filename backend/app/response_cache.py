@@ -0,0 +1,210 @@
+"""Read-path response cache for the episode API.
+
+Caches single completed episodes (which never change until regenerated),
+list pages and the category list. List entries are keyed by a generation
+counter that episode writes visible in list items bump, so one bump
+invalidates all of them at once; progress writes during generation leave
+the lists cached. Single episodes are invalidated by ID.
+
+Backends (RESPONSE_CACHE_BACKEND):
+- "local" (default): in-process TTL/LRU, the single-node stand-in
+- "mongo": shared `response_cache` collection with a TTL index, so every
+  API replica sees the same entries and invalidations
+- "none": caching disabled
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from app import db as database
+from app.cache import MISSING, TTLCache
+from app.config import settings
+from app.metrics import register_cache
+
+COLLECTION = "response_cache"
+LIST_GENERATION = "episodes"
+# Fields shown in list items (models.EPISODE_LIST_PROJECTION) and the
+# statuses worth refreshing a list for: creation, regeneration and the end
+LIST_FIELDS = {"topic", "tone", "category", "cover_image_url", "audio_url", "audio_filename", "duration_seconds"}
+LIST_STATUSES = {"pending", "completed", "failed"}
+
+
+class LocalBackend:
+    def __init__(self, max_entries: int = 2048):
+        self._entries = TTLCache(max_entries)
+        self._generations: dict[str, int] = {}
+
+    async def get(self, key: str):
+        return self._entries.get(key)
+
+    async def set(self, key: str, value, ttl_seconds: float) -> None:
+        self._entries.set(key, value, ttl_seconds)
+
+    async def delete(self, key: str) -> None:
+        self._entries.delete(key)
+
+    async def generation(self, name: str) -> int:
+        return self._generations.get(name, 0)
+
+    async def bump(self, name: str) -> None:
+        self._generations[name] = self._generations.get(name, 0) + 1
+
+
+class MongoBackend:
+    def _coll(self):
+        return database.db[COLLECTION]
+
+    async def get(self, key: str):
+        doc = await self._coll().find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        return MISSING if doc is None else doc["value"]
+
+    async def set(self, key: str, value, ttl_seconds: float) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        await self._coll().replace_one(
+            {"_id": key}, {"value": value, "expires_at": expires_at}, upsert=True
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._coll().delete_one({"_id": key})
+
+    async def generation(self, name: str) -> int:
+        doc = await self._coll().find_one({"_id": f"gen:{name}"})
+        return doc["value"] if doc else 0
+
+    async def bump(self, name: str) -> None:
+        # No expires_at, so the TTL index never removes generation counters
+        await self._coll().update_one({"_id": f"gen:{name}"}, {"$inc": {"value": 1}}, upsert=True)
+
+
+class NullBackend:
+    async def get(self, key: str):
+        return MISSING
+
+    async def set(self, key: str, value, ttl_seconds: float) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def generation(self, name: str) -> int:
+        return 0
+
+    async def bump(self, name: str) -> None:
+        pass
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def _get(self, key: str):
+        try:
+            value = await self.backend.get(key)
+        except Exception as exc:
+            print(f"[response_cache] lookup failed: {exc}")
+            value = MISSING
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def _set(self, key: str, value, ttl_seconds: float) -> None:
+        try:
+            await self.backend.set(key, value, ttl_seconds)
+        except Exception as exc:
+            print(f"[response_cache] store failed: {exc}")
+
+    async def _list_key(self, kind: str, params: dict) -> str | None:
+        """Cache key for a list page, or None if the generation can't be read."""
+        try:
+            generation = await self.backend.generation(LIST_GENERATION)
+        except Exception as exc:
+            print(f"[response_cache] generation lookup failed: {exc}")
+            return None
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:32]
+        return f"{kind}:{generation}:{digest}"
+
+    async def get_episode(self, episode_id: str):
+        return await self._get(f"episode:{episode_id}")
+
+    async def set_episode(self, episode_id: str, payload: dict) -> None:
+        await self._set(f"episode:{episode_id}", payload, settings.episode_cache_ttl_seconds)
+
+    async def get_list(self, kind: str, params: dict):
+        key = await self._list_key(kind, params)
+        if key is None:
+            self.misses += 1
+            return MISSING
+        return await self._get(key)
+
+    async def set_list(self, kind: str, params: dict, payload) -> None:
+        key = await self._list_key(kind, params)
+        if key is not None:
+            await self._set(key, payload, settings.list_cache_ttl_seconds)
+
+    async def invalidate_lists(self) -> None:
+        """Drop every cached list page, e.g. after inserting episodes."""
+        try:
+            await self.backend.bump(LIST_GENERATION)
+        except Exception as exc:
+            print(f"[response_cache] invalidation failed: {exc}")
+
+    async def drop_episode(self, episode_id: str) -> None:
+        """Drop the episode's entry, leaving list pages cached."""
+        try:
+            await self.backend.delete(f"episode:{episode_id}")
+        except Exception as exc:
+            print(f"[response_cache] invalidation failed: {exc}")
+
+    async def invalidate_episode(self, episode_id: str, fields: dict | None = None) -> None:
+        """Drop the episode's entry, and every cached list page if the write shows in lists.
+
+        `fields` are the fields written; without them lists are always dropped.
+        """
+        await self.drop_episode(episode_id)
+        if fields is None or _list_visible(fields):
+            await self.invalidate_lists()
+
+
+def _list_visible(fields: dict) -> bool:
+    if fields.get("status") in LIST_STATUSES:
+        return True
+    return any(key.split(".")[0] in LIST_FIELDS for key in fields)
+
+
+def _build() -> ResponseCache:
+    backend = settings.response_cache_backend
+    if backend == "none":
+        return ResponseCache(NullBackend())
+    if backend == "mongo":
+        return ResponseCache(MongoBackend())
+    return ResponseCache(LocalBackend())
+
+
+response_cache = _build()
+register_cache("responses", response_cache)
+
+
+def signing_window() -> int | None:
+    """Index of the current half-lifetime of signed URLs, or None if URLs aren't signed.
+
+    Responses carrying signed URLs are only reused (cached or 304'd) within
+    one window, so a reused URL always has at least half its lifetime left.
+    """
+    if settings.storage_url_mode != "signed":
+        return None
+    return int(time.time() // max(1, settings.storage_signed_url_seconds // 2))
+
+
+def episode_etag(doc: dict, window: int | None = None) -> str:
+    """Validator that changes with every write to the episode, and with the signing window."""
+    changed = doc.get("updated_at") or doc["created_at"]
+    raw = f"{doc['_id']}:{doc['status']}:{changed.isoformat()}:{window}"
+    return f'"{hashlib.sha256(raw.encode()).hexdigest()[:24]}"'
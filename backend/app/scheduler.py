@@ -0,0 +1,210 @@
+"""Admission control and priority scheduling for episode pipelines.
+
+Episodes wait in a bounded priority queue rather than all starting at once.
+Without it, a burst of requests would hit every provider together and be
+rate-limited together.
+
+- PIPELINE_EXECUTOR=inline: the API process runs at most
+  PIPELINE_MAX_CONCURRENCY pipelines and keeps the rest in memory.
+- PIPELINE_EXECUTOR=queue: episodes wait in the Mongo job queue
+  (app.jobs) until a worker claims them.
+
+New episodes go ahead of batch-created ones (POST /episodes/batch), which
+go ahead of regenerations. Once PIPELINE_QUEUE_LIMIT episodes are waiting,
+`admit` raises QueueFull and the API answers 429 with a
+Retry-After. Calls inside a pipeline are limited separately, per provider
+(app.rate_limit.ProviderLimit).
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+from bson import ObjectId
+
+from app.config import settings
+from app.episode_pipeline import generate_episode
+from app.jobs import (
+    active_job_status,
+    cancel_jobs,
+    enqueue_job,
+    enqueue_jobs,
+    queue_position,
+    queued_job_count,
+)
+from app.metrics import PIPELINE_QUEUE_DEPTH, PIPELINE_REJECTED
+
+PRIORITY_NEW = 10
+PRIORITY_BATCH = 5  # bulk imports shouldn't hold up episodes someone is waiting on
+PRIORITY_REGENERATE = 0
+DEFAULT_PIPELINE_SECONDS = 90.0  # assumed until a pipeline has finished here
+QUEUE_RETRY_AFTER_SECONDS = 30  # PIPELINE_EXECUTOR=queue; worker throughput is unknown here
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many episodes waiting; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AlreadyRunning(Exception):
+    """The episode's pipeline is running; it can't be queued again until it ends."""
+
+
+class PipelineScheduler:
+    """Run queued pipelines in priority order, at most `max_running` at a time."""
+
+    def __init__(self, max_running: int, queue_limit: int):
+        self.max_running = max(1, max_running)
+        self.queue_limit = queue_limit
+        self.running = 0
+        self._heap: list[tuple[int, int, ObjectId]] = []  # (-priority, arrival, episode)
+        self._queued: dict[ObjectId, tuple[int, int, ObjectId]] = {}  # episode -> its heap entry
+        self._running_ids: set[ObjectId] = set()
+        self._arrivals = itertools.count()
+        self._ready = asyncio.Semaphore(0)
+        self._runners: list[asyncio.Task] = []
+        self._avg_seconds = DEFAULT_PIPELINE_SECONDS
+
+    @property
+    def depth(self) -> int:
+        return len(self._heap)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue place frees up: the time between pipeline completions."""
+        return max(1, math.ceil(self._avg_seconds / self.max_running))
+
+    def admit(self, count: int = 1) -> None:
+        if self.depth + count > self.queue_limit:
+            raise QueueFull(self.retry_after())
+
+    def status(self, episode_id: ObjectId) -> str | None:
+        """"queued" or "running" if the episode is in this scheduler, else None."""
+        if episode_id in self._running_ids:
+            return "running"
+        return "queued" if episode_id in self._queued else None
+
+    def submit(self, episode_id: ObjectId, priority: int) -> None:
+        """Queue the episode (once). Raises AlreadyRunning if its pipeline is running."""
+        if episode_id in self._running_ids:
+            raise AlreadyRunning(f"Episode {episode_id} is already being generated")
+        if episode_id not in self._queued:
+            entry = (-priority, next(self._arrivals), episode_id)
+            heapq.heappush(self._heap, entry)
+            self._queued[episode_id] = entry
+            self._ready.release()
+            PIPELINE_QUEUE_DEPTH.set(self.depth)
+
+    def position(self, episode_id: ObjectId) -> int | None:
+        """1-based queue position, or None if the episode starts now (or isn't queued)."""
+        entry = self._queued.get(episode_id)
+        if entry is None:
+            return None
+        place = sum(1 for other in self._heap if other < entry)
+        # Entries within the free runner slots are about to start
+        free = self.max_running - self.running
+        return None if place < free else place - free + 1
+
+    def start(self) -> None:
+        self._runners = [asyncio.create_task(self._runner()) for _ in range(self.max_running)]
+
+    async def stop(self) -> None:
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+
+    async def _runner(self) -> None:
+        while True:
+            await self._ready.acquire()
+            _, _, episode_id = heapq.heappop(self._heap)
+            del self._queued[episode_id]
+            self._running_ids.add(episode_id)
+            PIPELINE_QUEUE_DEPTH.set(self.depth)
+            self.running += 1
+            started = time.perf_counter()
+            try:
+                await generate_episode(episode_id)
+            except Exception as e:
+                print(f"[scheduler] Pipeline for {episode_id} raised: {e}")
+            finally:
+                self.running -= 1
+                self._running_ids.discard(episode_id)
+                elapsed = time.perf_counter() - started
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+
+
+_scheduler: PipelineScheduler | None = None
+
+
+def start_scheduler() -> None:
+    """Start the in-process scheduler (PIPELINE_EXECUTOR=inline only)."""
+    global _scheduler
+    if settings.pipeline_executor != "queue" and _scheduler is None:
+        _scheduler = PipelineScheduler(settings.pipeline_max_concurrency, settings.pipeline_queue_limit)
+        _scheduler.start()
+
+
+async def stop_scheduler() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+        _scheduler = None
+
+
+async def admit_episode(count: int = 1) -> None:
+    """Raise QueueFull if `count` more episodes may not be queued right now.
+
+    Call before creating or resetting the episode. The bound is soft by the
+    few requests admitted concurrently (and, in queue mode, across replicas).
+    """
+    try:
+        if settings.pipeline_executor == "queue":
+            if await queued_job_count() + count > settings.pipeline_queue_limit:
+                raise QueueFull(QUEUE_RETRY_AFTER_SECONDS)
+        else:
+            _scheduler.admit(count)
+    except QueueFull:
+        PIPELINE_REJECTED.inc()
+        raise
+
+
+async def pipeline_status(episode_id: ObjectId) -> str | None:
+    """"queued" or "running" if the episode's pipeline is waiting or in progress."""
+    if settings.pipeline_executor == "queue":
+        return await active_job_status(episode_id)
+    return _scheduler.status(episode_id)
+
+
+async def schedule_episode(episode_id: ObjectId, priority: int = PRIORITY_NEW) -> int | None:
+    """Queue the episode's pipeline. Returns its queue position, or None if it starts now.
+
+    Raises AlreadyRunning (inline mode) if the pipeline is running; check
+    `pipeline_status` first.
+    """
+    if settings.pipeline_executor == "queue":
+        await enqueue_job(episode_id, priority=priority)
+        return await queue_position(episode_id)
+    _scheduler.submit(episode_id, priority)
+    return _scheduler.position(episode_id)
+
+
+async def schedule_episodes(episode_ids: list[ObjectId], priority: int = PRIORITY_BATCH) -> None:
+    """Queue pipelines for newly created episodes, with one write in queue mode."""
+    if settings.pipeline_executor == "queue":
+        await enqueue_jobs(episode_ids, priority=priority)
+        return
+    for episode_id in episode_ids:
+        _scheduler.submit(episode_id, priority)
+
+
+async def unschedule_episodes(episode_ids: list[ObjectId]) -> None:
+    """Take back queued pipelines of episodes that are being deleted.
+
+    In inline mode pipelines already submitted stay queued and end as soon
+    as they find their episode gone.
+    """
+    if settings.pipeline_executor == "queue":
+        await cancel_jobs(episode_ids)
@@ -0,0 +1,128 @@
+"""Indexed type-ahead search over episode topics, categories and tones.
+
+Every episode stores:
+- `search_terms`: all prefixes (edge n-grams) of its topic, category and
+  tone tokens, with a multikey index, so a query is an index lookup
+  (`$all` of the query tokens) instead of a collection scan
+- `topic_tokens`: the full topic tokens, used to rank exact word matches
+  above prefix-only ones
+
+Query text is only ever compared as data, never compiled as a regex.
+
+Ranking is bounded: only the newest SEARCH_CANDIDATE_LIMIT matches (walked
+in index order) are scored and sorted, and one-character query tokens are
+ignored since they match nearly every episode.
+
+Episodes created before search indexing existed are indexed by a one-off
+migration:
+
+    cd backend
+    python -m app.search backfill
+"""
+
+import asyncio
+import sys
+
+from pymongo import UpdateOne
+
+from app import db as database
+from app.cache import normalize_key
+
+MAX_PREFIX = 20  # longer query tokens are truncated to match the stored prefixes
+MAX_QUERY_TOKENS = 8
+MIN_TOKEN_LENGTH = 2
+BACKFILL_BATCH_SIZE = 500
+
+
+def tokenize(text: str | None) -> list[str]:
+    return normalize_key(text or "").split()
+
+
+def _prefixes(token: str) -> list[str]:
+    return [token[:n] for n in range(1, min(len(token), MAX_PREFIX) + 1)]
+
+
+def search_fields(topic: str, category: str | None, tone: str | None) -> dict:
+    """Search fields to store on an episode with these values."""
+    topic_tokens = tokenize(topic)
+    terms = set()
+    for token in topic_tokens + tokenize(category) + tokenize(tone):
+        terms.update(_prefixes(token))
+    return {"search_terms": sorted(terms), "topic_tokens": sorted(set(topic_tokens))}
+
+
+def query_tokens(search: str) -> list[str]:
+    tokens = [t for t in tokenize(search) if len(t) >= MIN_TOKEN_LENGTH]
+    return list(dict.fromkeys(tokens))[:MAX_QUERY_TOKENS]
+
+
+def search_filter(tokens: list[str]) -> dict:
+    """Match episodes where every query token prefixes some indexed word."""
+    return {"search_terms": {"$all": [t[:MAX_PREFIX] for t in tokens]}}
+
+
+def relevance_expression(tokens: list[str]) -> dict:
+    """Aggregation expression scoring a match.
+
+    Whole topic words count double; whole category/tone words count once;
+    prefix-only matches score zero but still pass the filter.
+    """
+    return {
+        "$add": [
+            {
+                "$multiply": [
+                    2,
+                    {
+                        "$size": {
+                            "$filter": {
+                                "input": tokens,
+                                "as": "token",
+                                "cond": {"$in": ["$$token", {"$ifNull": ["$topic_tokens", []]}]},
+                            }
+                        }
+                    },
+                ]
+            },
+            {"$cond": [{"$in": [{"$ifNull": ["$category", ""]}, tokens]}, 1, 0]},
+            {"$cond": [{"$in": [{"$ifNull": ["$tone", ""]}, tokens]}, 1, 0]},
+        ]
+    }
+
+
+async def backfill_search_fields(db) -> int:
+    """Add search fields to episodes created before search indexing existed.
+
+    Writes go out in batches of BACKFILL_BATCH_SIZE, so memory stays flat
+    however many episodes need indexing. Safe to rerun.
+    """
+    total = 0
+    updates = []
+    async for doc in db["episodes"].find(
+        {"search_terms": {"$exists": False}}, {"topic": 1, "category": 1, "tone": 1}
+    ):
+        fields = search_fields(doc["topic"], doc.get("category"), doc.get("tone"))
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(updates) >= BACKFILL_BATCH_SIZE:
+            await db["episodes"].bulk_write(updates, ordered=False)
+            total += len(updates)
+            updates = []
+            print(f"Indexed {total} episode(s) for search...")
+    if updates:
+        await db["episodes"].bulk_write(updates, ordered=False)
+        total += len(updates)
+    return total
+
+
+async def _backfill() -> None:
+    await database.connect_db()
+    try:
+        total = await backfill_search_fields(database.db)
+    finally:
+        await database.close_db()
+    print(f"Indexed {total} episode(s) for search")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        raise SystemExit("usage: python -m app.search backfill")
+    asyncio.run(_backfill())
@@ -0,0 +1,196 @@
+"""Content-addressed cache for synthesized TTS segments.
+
+Segments are keyed by a hash of everything that determines the audio
+(voice, model, output format and text), so regenerating an episode or
+reusing stock lines never pays for the same synthesis twice.
+
+Tiers:
+1. Local disk (always on unless disabled) – LRU eviction under a size cap
+2. GridFS (optional) – shared between API/worker replicas
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from app import db as database
+from app.config import settings
+from app.metrics import register_cache
+
+GRIDFS_BUCKET = "tts_segments"
+
+
+def segment_key(voice_id: str, model_id: str, output_format: str, text: str) -> str:
+    """Return the content address for a synthesis request."""
+    digest = hashlib.sha256()
+    for part in (voice_id, model_id, output_format, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskSegmentCache:
+    """Directory of segment files with LRU eviction once `max_bytes` is exceeded."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: OrderedDict[str, int] = OrderedDict()  # key -> size, oldest first
+        self._total_bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.mp3"
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU order from file access times left by a previous run."""
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.glob("*/*.mp3"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            self._forget(key)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            evicted = self._evict_locked()
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+
+    def _evict_locked(self) -> list[str]:
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            old_key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(old_key)
+        return evicted
+
+
+class GridFSSegmentCache:
+    """Segment store shared by every process pointed at the same database."""
+
+    def _bucket(self) -> AsyncIOMotorGridFSBucket:
+        return AsyncIOMotorGridFSBucket(database.db, bucket_name=GRIDFS_BUCKET)
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            stream = await self._bucket().open_download_stream_by_name(key)
+        except NoFile:
+            return None
+        return await stream.read()
+
+    async def put(self, key: str, data: bytes) -> None:
+        await self._bucket().upload_from_stream(key, data)
+
+
+class SegmentCache:
+    """Two-tier segment cache with hit/miss counters."""
+
+    def __init__(self, local: DiskSegmentCache | None, shared: GridFSSegmentCache | None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> bytes | None:
+        if self.local is not None:
+            data = await asyncio.to_thread(self.local.get, key)
+            if data is not None:
+                self.hits += 1
+                return data
+        if self.shared is not None:
+            try:
+                data = await self.shared.get(key)
+            except Exception as exc:
+                print(f"[segment_cache] shared lookup failed for {key[:12]}: {exc}")
+                data = None
+            if data is not None:
+                self.hits += 1
+                self.shared_hits += 1
+                if self.local is not None:
+                    await asyncio.to_thread(self.local.put, key, data)
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        if self.local is not None:
+            await asyncio.to_thread(self.local.put, key, data)
+        if self.shared is not None:
+            try:
+                await self.shared.put(key, data)
+            except Exception as exc:
+                print(f"[segment_cache] shared store failed for {key[:12]}: {exc}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+_cache: SegmentCache | None = None
+
+
+def get_segment_cache() -> SegmentCache | None:
+    """Return the process-wide segment cache, or None if caching is disabled."""
+    global _cache
+    backend = settings.tts_cache_backend
+    if backend == "none":
+        return None
+    if _cache is None:
+        local = DiskSegmentCache(settings.tts_cache_dir, settings.tts_cache_max_bytes)
+        shared = GridFSSegmentCache() if backend == "gridfs" else None
+        _cache = SegmentCache(local, shared)
+        register_cache("tts_segments", _cache)
+    return _cache
@@ -1,11 +1,49 @@
-"""Google Cloud Storage integration for audio file uploads."""
+"""Object storage for episode audio, with GCS, local and S3-compatible backends.
 
+Backends (STORAGE_BACKEND):
+- "gcs" (default): Google Cloud Storage bucket GCS_BUCKET_NAME
+- "local": files under STORAGE_LOCAL_DIR, served by the API at /static
+- "s3": any S3-compatible store (S3_BUCKET_NAME, S3_ENDPOINT_URL); needs
+  the optional `boto3` package
+
+Uploads stream from a file or an iterator of chunks. Anything larger than
+STORAGE_CHUNK_BYTES goes up as a resumable (GCS) or multipart (S3) upload
+in chunks of that size, so memory use does not grow with episode length.
+
+Objects are never made public one by one. With STORAGE_URL_MODE=public
+the bucket itself must grant public read (GCS uniform bucket-level access
+with allUsers as Storage Object Viewer, or an S3 bucket policy), and URLs
+are plain object URLs, optionally under STORAGE_PUBLIC_BASE_URL (a CDN).
+With STORAGE_URL_MODE=signed the bucket stays private and every URL is a
+time-limited signed URL; episode audio URLs are re-signed when read.
+Signing on GCS uses the credentials' private key when they have one (a
+service account key file). Default Cloud Run/GCE credentials have none,
+so URLs are signed through the IAM signBlob API instead, which needs the
+runtime service account to hold Service Account Token Creator on itself.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Iterable, Iterator
+from datetime import timedelta
+from pathlib import Path
+
+from google.auth.credentials import Signing
+from google.auth.transport.requests import Request
 from google.cloud import storage
 
 from app.config import settings
+from app.metrics import track_upstream
+
+_GCS_CHUNK_MULTIPLE = 256 * 1024  # GCS resumable chunks must be multiples of 256 KiB
 
 # Initialize GCS client once at module level for reuse
 _storage_client = None
+_backend: "Storage | None" = None
+_upload_slots: threading.BoundedSemaphore | None = None
 
 
 def _get_storage_client() -> storage.Client:
@@ -16,42 +54,327 @@ def _get_storage_client() -> storage.Client:
     return _storage_client
 
 
+def _read_chunks(path: str, chunk_size: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+class _IterReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+class Storage:
+    """Interface shared by the storage backends. Keys look like `audio/<name>.mp3`."""
+
+    name = ""
+
+    def upload_file(
+        self, path: str, key: str, content_type: str, cache_control: str | None = None
+    ) -> None:
+        raise NotImplementedError
+
+    def upload_stream(
+        self, chunks: Iterable[bytes], key: str, content_type: str, cache_control: str | None = None
+    ) -> None:
+        raise NotImplementedError
+
+    def upload_bytes(
+        self, data: bytes, key: str, content_type: str, cache_control: str | None = None
+    ) -> None:
+        self.upload_stream([data], key, content_type, cache_control)
+
+    def url_for(self, key: str) -> str:
+        """URL listeners use to fetch `key`, per STORAGE_URL_MODE."""
+        if settings.storage_url_mode == "signed":
+            return self._signed_url(key)
+        if settings.storage_public_base_url:
+            return f"{settings.storage_public_base_url.rstrip('/')}/{key}"
+        return self._public_url(key)
+
+    def _public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def _signed_url(self, key: str) -> str:
+        raise NotImplementedError
+
+
+class GCSStorage(Storage):
+    name = "gcs"
+
+    def __init__(self, bucket_name: str):
+        if not bucket_name:
+            raise ValueError("GCS_BUCKET_NAME environment variable not configured")
+        self.bucket = _get_storage_client().bucket(bucket_name)
+        self.chunk_size = max(
+            _GCS_CHUNK_MULTIPLE,
+            settings.storage_chunk_bytes // _GCS_CHUNK_MULTIPLE * _GCS_CHUNK_MULTIPLE,
+        )
+
+    def _blob(self, key: str, cache_control: str | None):
+        blob = self.bucket.blob(key, chunk_size=self.chunk_size)
+        if cache_control:
+            blob.cache_control = cache_control
+        return blob
+
+    def upload_file(self, path, key, content_type, cache_control=None):
+        # Small files go up in one request; larger ones stream in resumable chunks
+        self._blob(key, cache_control).upload_from_filename(path, content_type=content_type)
+
+    def upload_stream(self, chunks, key, content_type, cache_control=None):
+        blob = self._blob(key, cache_control)
+        with blob.open("wb", content_type=content_type) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+
+    def upload_bytes(self, data, key, content_type, cache_control=None):
+        self._blob(key, cache_control).upload_from_string(data, content_type=content_type)
+
+    def _public_url(self, key):
+        return self.bucket.blob(key).public_url
+
+    def _signed_url(self, key):
+        return self.bucket.blob(key).generate_signed_url(
+            version="v4",
+            expiration=timedelta(seconds=settings.storage_signed_url_seconds),
+            method="GET",
+            **self._iam_signing(),
+        )
+
+    def _iam_signing(self) -> dict:
+        """Arguments that sign through IAM when the credentials hold no private key."""
+        credentials = self.bucket.client._credentials
+        if isinstance(credentials, Signing):
+            return {}
+        # e.g. Cloud Run/GCE metadata-server credentials; refreshing also
+        # resolves their service_account_email from "default"
+        if not credentials.valid:
+            credentials.refresh(Request())
+        return {
+            "service_account_email": credentials.service_account_email,
+            "access_token": credentials.token,
+        }
+
+
+class LocalStorage(Storage):
+    """Files on local disk, for development and single-node deployments."""
+
+    name = "local"
+    URL_PREFIX = "/static"  # where main.py mounts the directory
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f"Storage key escapes the storage directory: {key}")
+        return path
+
+    def upload_file(self, path, key, content_type, cache_control=None):
+        self.upload_stream(_read_chunks(path, settings.storage_chunk_bytes), key, content_type)
+
+    def upload_stream(self, chunks, key, content_type, cache_control=None):
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write beside the target and rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(io.BufferedReader(_IterReader(chunks)), f)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _public_url(self, key):
+        return f"{self.URL_PREFIX}/{key}"
+
+    def _signed_url(self, key):
+        return self._public_url(key)  # nothing to sign; access is controlled by the API host
+
+
+class S3Storage(Storage):
+    """Amazon S3 or any S3-compatible store (MinIO, R2, ...)."""
+
+    name = "s3"
+
+    def __init__(self, bucket_name: str):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError as exc:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package") from exc
+        if not bucket_name:
+            raise ValueError("S3_BUCKET_NAME environment variable not configured")
+
+        self.bucket_name = bucket_name
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url or None,
+            region_name=settings.s3_region or None,
+        )
+        chunk = max(5 * 1024 * 1024, settings.storage_chunk_bytes)  # S3's minimum part size
+        self.transfer = TransferConfig(
+            multipart_threshold=chunk, multipart_chunksize=chunk, max_concurrency=4
+        )
+
+    @staticmethod
+    def _extra_args(content_type: str, cache_control: str | None) -> dict:
+        args = {"ContentType": content_type}
+        if cache_control:
+            args["CacheControl"] = cache_control
+        return args
+
+    def upload_file(self, path, key, content_type, cache_control=None):
+        self.client.upload_file(
+            path,
+            self.bucket_name,
+            key,
+            ExtraArgs=self._extra_args(content_type, cache_control),
+            Config=self.transfer,
+        )
+
+    def upload_stream(self, chunks, key, content_type, cache_control=None):
+        self.client.upload_fileobj(
+            io.BufferedReader(_IterReader(chunks)),
+            self.bucket_name,
+            key,
+            ExtraArgs=self._extra_args(content_type, cache_control),
+            Config=self.transfer,
+        )
+
+    def upload_bytes(self, data, key, content_type, cache_control=None):
+        self.client.put_object(
+            Bucket=self.bucket_name,
+            Key=key,
+            Body=data,
+            **self._extra_args(content_type, cache_control),
+        )
+
+    def _public_url(self, key):
+        if settings.s3_endpoint_url:
+            return f"{settings.s3_endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        region = settings.s3_region or "us-east-1"
+        return f"https://{self.bucket_name}.s3.{region}.amazonaws.com/{key}"
+
+    def _signed_url(self, key):
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket_name, "Key": key},
+            ExpiresIn=settings.storage_signed_url_seconds,
+        )
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage backend selected by STORAGE_BACKEND."""
+    global _backend
+    if _backend is None:
+        backend = settings.storage_backend
+        if backend == "local":
+            _backend = LocalStorage(settings.storage_local_dir)
+        elif backend == "s3":
+            _backend = S3Storage(settings.s3_bucket_name)
+        else:
+            _backend = GCSStorage(settings.gcs_bucket_name)
+    return _backend
+
+
+def _get_upload_slots() -> threading.BoundedSemaphore:
+    """Process-wide cap on concurrent uploads (uploads run in worker threads)."""
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = threading.BoundedSemaphore(max(1, settings.storage_max_concurrency))
+    return _upload_slots
+
+
+def _upload(upload, key: str) -> str:
+    backend = get_storage()
+    try:
+        with _get_upload_slots(), track_upstream(backend.name, "upload"):
+            upload(backend)
+        return backend.url_for(key)
+    except Exception as e:
+        raise Exception(f"Failed to upload '{key}' to {backend.name} storage: {e}") from e
+
+
 def upload_audio(audio_data: bytes, filename: str) -> str:
-    """Upload MP3 audio data to Google Cloud Storage.
+    """Upload MP3 audio data held in memory.
 
     Args:
         audio_data: The audio file bytes to upload
         filename: The filename (without extension) for the audio file
 
     Returns:
-        The public HTTPS URL of the uploaded file
+        The URL listeners use to fetch the file
 
     Raises:
-        ValueError: If GCS_BUCKET_NAME is not configured
+        ValueError: If the storage backend is not configured
         Exception: If upload fails due to network, authentication, or quota issues
     """
-    bucket_name = settings.gcs_bucket_name
-    if not bucket_name:
-        raise ValueError("GCS_BUCKET_NAME environment variable not configured")
+    key = f"audio/{filename}.mp3"
+    return _upload(lambda backend: backend.upload_bytes(audio_data, key, "audio/mpeg"), key)
 
-    try:
-        # Get GCS client
-        client = _get_storage_client()
-        bucket = client.bucket(bucket_name)
 
-        # Upload to audio/ prefix in the bucket
-        blob_name = f"audio/{filename}.mp3"
-        blob = bucket.blob(blob_name)
+def upload_audio_file(path: str, filename: str) -> str:
+    """Upload an MP3 file from disk, streaming it in chunks.
+
+    Same as `upload_audio`, but memory use stays constant whatever the
+    file size.
+    """
+    key = f"audio/{filename}.mp3"
+    return _upload(lambda backend: backend.upload_file(path, key, "audio/mpeg"), key)
 
-        # Upload the audio data
-        blob.upload_from_string(audio_data, content_type="audio/mpeg")
 
-        # Make the blob publicly accessible
-        blob.make_public()
+def upload_stream(chunks: Iterable[bytes], key: str, content_type: str) -> str:
+    """Upload data produced incrementally (e.g. by a generator) under `key`."""
+    return _upload(lambda backend: backend.upload_stream(chunks, key, content_type), key)
 
-        # Return the public URL
-        return blob.public_url
-    except Exception as e:
-        raise Exception(
-            f"Failed to upload audio to GCS bucket '{bucket_name}': {e}"
-        ) from e
+
+def upload_bytes(
+    data: bytes, blob_name: str, content_type: str, cache_control: str | None = None
+) -> str:
+    """Upload small objects (playlists, audio chunks) under `blob_name` in one request.
+
+    Returns the URL listeners use to fetch the object.
+    """
+    return _upload(
+        lambda backend: backend.upload_bytes(data, blob_name, content_type, cache_control),
+        blob_name,
+    )
+
+
+def episode_playlist_url(doc: dict) -> str | None:
+    """The episode's HLS playlist URL, re-signed like `episode_audio_url`.
+
+    Chunk URLs inside a signed playlist are signed at publish time and
+    expire after STORAGE_SIGNED_URL_SECONDS.
+    """
+    if settings.storage_url_mode == "signed" and doc.get("playlist_key") and doc.get("playlist_url"):
+        return get_storage().url_for(doc["playlist_key"])
+    return doc.get("playlist_url")
+
+
+def episode_audio_url(doc: dict) -> str | None:
+    """The episode's audio URL, re-signed if URLs are signed (stored ones expire)."""
+    if settings.storage_url_mode == "signed" and doc.get("audio_filename") and doc.get("audio_url"):
+        return get_storage().url_for(f"audio/{doc['audio_filename']}")
+    return doc.get("audio_url")
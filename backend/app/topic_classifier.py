@@ -0,0 +1,322 @@
+"""In-process topic classifier that answers before Gemini does.
+
+Topics are turned into hashed n-gram features (words, word pairs and
+character 3-5-grams, so "astrophysics" and "astronomy" share evidence)
+and scored by a multinomial logistic regression trained on episodes that
+Gemini already labelled. `categorize` uses the local prediction when its
+probability reaches TOPIC_CLASSIFIER_THRESHOLD and asks Gemini otherwise,
+so most topics need no network call. Without a trained model (the file at
+TOPIC_CLASSIFIER_PATH is missing), every topic goes to Gemini.
+
+Pure Python: the model is a sparse weight map, small enough to load at
+startup and fast enough to score a topic in well under a millisecond.
+
+    cd backend
+    python -m app.topic_classifier train      # hold-out report, then fit on everything and save
+    python -m app.topic_classifier evaluate   # the saved model against the Gemini labels
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import zlib
+from datetime import datetime, timezone
+
+from app import db as database
+from app.cache import normalize_key
+from app.config import settings
+from app.gemini_client import ALLOWED_CATEGORIES, categorize_topic, categorize_topics
+from app.metrics import CATEGORIZATIONS
+
+FEATURE_BITS = 18
+MODEL_VERSION = 1
+THRESHOLD_SWEEP = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+GEMINI_BATCH_SIZE = 50  # topics per batched categorization prompt
+
+_model: "TopicClassifier | None" = None
+_model_loaded = False
+
+
+def features(topic: str) -> dict[int, float]:
+    """Hashed n-gram counts of `topic`, log-scaled and L2-normalized."""
+    words = normalize_key(topic).split()
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        for n in (3, 4, 5):
+            grams += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+
+    mask = (1 << FEATURE_BITS) - 1
+    counts: dict[int, float] = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) & mask  # stable across processes, unlike hash()
+        counts[index] = counts.get(index, 0.0) + 1.0
+    values = {i: 1.0 + math.log(c) for i, c in counts.items()}
+    norm = math.sqrt(sum(v * v for v in values.values())) or 1.0
+    return {i: v / norm for i, v in values.items()}
+
+
+class TopicClassifier:
+    """Multinomial logistic regression over hashed n-gram features."""
+
+    def __init__(self, labels: list[str]):
+        self.labels = sorted(labels)
+        self.bias = {label: 0.0 for label in self.labels}
+        self.weights: dict[str, dict[int, float]] = {label: {} for label in self.labels}
+        self.meta: dict = {}
+
+    def predict_proba(self, topic: str) -> dict[str, float]:
+        return self._softmax(features(topic))
+
+    def predict(self, topic: str) -> tuple[str, float]:
+        """The most likely label and its probability."""
+        probs = self.predict_proba(topic)
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+    def _softmax(self, x: dict[int, float]) -> dict[str, float]:
+        scores = {
+            label: self.bias[label] + sum(self.weights[label].get(i, 0.0) * v for i, v in x.items())
+            for label in self.labels
+        }
+        top = max(scores.values())
+        exps = {label: math.exp(s - top) for label, s in scores.items()}
+        total = sum(exps.values())
+        return {label: e / total for label, e in exps.items()}
+
+    def fit(
+        self,
+        examples: list[tuple[str, str]],
+        epochs: int = 30,
+        learning_rate: float = 0.5,
+        l2: float = 1e-5,
+        seed: int = 0,
+    ) -> "TopicClassifier":
+        """Train with SGD on cross-entropy; `examples` are (topic, label) pairs."""
+        data = [(features(topic), label) for topic, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch * 0.1)
+            for x, label in data:
+                probs = self._softmax(x)
+                for candidate in self.labels:
+                    grad = probs[candidate] - (1.0 if candidate == label else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    weights = self.weights[candidate]
+                    for i, v in x.items():
+                        w = weights.get(i, 0.0)
+                        weights[i] = w - rate * (grad * v + l2 * w)
+                    self.bias[candidate] -= rate * grad
+        # Drop weights too small to matter, to keep the saved model compact
+        for label in self.labels:
+            self.weights[label] = {i: w for i, w in self.weights[label].items() if abs(w) >= 1e-4}
+        return self
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "version": MODEL_VERSION,
+            "feature_bits": FEATURE_BITS,
+            "labels": self.labels,
+            "bias": self.bias,
+            "weights": {label: {str(i): round(w, 6) for i, w in ws.items()} for label, ws in self.weights.items()},
+            "meta": self.meta,
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TopicClassifier":
+        with open(path) as f:
+            payload = json.load(f)
+        if payload.get("version") != MODEL_VERSION or payload.get("feature_bits") != FEATURE_BITS:
+            raise ValueError(f"{path} was trained by an incompatible classifier version")
+        model = cls(payload["labels"])
+        model.bias = payload["bias"]
+        model.weights = {
+            label: {int(i): w for i, w in ws.items()} for label, ws in payload["weights"].items()
+        }
+        model.meta = payload.get("meta", {})
+        return model
+
+
+def get_classifier() -> TopicClassifier | None:
+    """The model at TOPIC_CLASSIFIER_PATH, loaded once; None if there isn't a usable one."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        _model_loaded = True
+        path = settings.topic_classifier_path
+        if os.path.exists(path):
+            try:
+                _model = TopicClassifier.load(path)
+                print(f"[classifier] Loaded topic classifier ({_model.meta.get('examples', '?')} examples)")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[classifier] Ignoring topic classifier at {path}: {e}")
+    return _model
+
+
+def classify_locally(topic: str) -> tuple[str, float] | None:
+    """(category, confidence) from the local model, or None if there is no model."""
+    model = get_classifier()
+    if model is None:
+        return None
+    return model.predict(topic)
+
+
+async def categorize(topic: str) -> tuple[str, str]:
+    """Pick the topic's category. Returns (category, source).
+
+    The source is "local" or "llm", or "fallback" when Gemini failed and the
+    topic was filed under "other". Never raises.
+    """
+    local = classify_locally(topic)
+    if local is not None and local[1] >= settings.topic_classifier_threshold:
+        CATEGORIZATIONS.inc(source="local")
+        return local[0], "local"
+    category = await categorize_topic(topic, default=None)
+    if category is None:
+        CATEGORIZATIONS.inc(source="fallback")
+        return "other", "fallback"
+    CATEGORIZATIONS.inc(source="llm")
+    return category, "llm"
+
+
+async def categorize_many(topics: list[str]) -> list[tuple[str | None, str | None]]:
+    """`categorize` for many topics, asking Gemini about the unsure ones in batched prompts.
+
+    Never raises. Topics Gemini couldn't answer for come back as
+    (None, None); the pipeline categorizes those itself.
+    """
+    results: list[tuple[str | None, str | None]] = [(None, None)] * len(topics)
+    unsure = []
+    for i, topic in enumerate(topics):
+        local = classify_locally(topic)
+        if local is not None and local[1] >= settings.topic_classifier_threshold:
+            CATEGORIZATIONS.inc(source="local")
+            results[i] = (local[0], "local")
+        else:
+            unsure.append(i)
+
+    chunks = [unsure[start:start + GEMINI_BATCH_SIZE] for start in range(0, len(unsure), GEMINI_BATCH_SIZE)]
+    answers = await asyncio.gather(*(categorize_topics([topics[i] for i in chunk]) for chunk in chunks))
+    for chunk, categories in zip(chunks, answers):
+        for i, category in zip(chunk, categories):
+            if category is not None:
+                CATEGORIZATIONS.inc(source="llm")
+                results[i] = (category, "llm")
+    return results
+
+
+# -- Offline training and evaluation ------------------------------------------------
+
+
+async def load_examples() -> list[tuple[str, str]]:
+    """(topic, category) pairs labelled by Gemini, one per distinct topic.
+
+    Episodes categorized by the local model are left out, so the classifier
+    never trains on its own output, and so are the "other" fallbacks for
+    failed Gemini calls. Episodes from before `category_source` existed
+    were labelled by Gemini, except that a failed call also filed them
+    under "other"; their "other" labels can't be told apart and are
+    skipped too.
+    """
+    cursor = database.db["episodes"].find(
+        {
+            "category": {"$in": sorted(ALLOWED_CATEGORIES)},
+            "category_source": {"$nin": ["local", "fallback"]},
+            "$nor": [{"category": "other", "category_source": None}],
+        },
+        {"topic": 1, "category": 1},
+    ).sort("created_at", -1)
+    examples: dict[str, tuple[str, str]] = {}
+    async for doc in cursor:
+        examples.setdefault(normalize_key(doc["topic"]), (doc["topic"], doc["category"]))
+    return list(examples.values())
+
+
+def _split(examples: list[tuple[str, str]], test_fraction: float):
+    # Stable split by topic, so repeated runs test on the same topics
+    train, test = [], []
+    for example in examples:
+        bucket = zlib.crc32(normalize_key(example[0]).encode("utf-8")) % 1000
+        (test if bucket < test_fraction * 1000 else train).append(example)
+    return train, test
+
+
+def evaluate(model: TopicClassifier, examples: list[tuple[str, str]]) -> dict:
+    """Accuracy, plus coverage and accuracy of the local answers at each threshold."""
+    predictions = [(model.predict(topic), label) for topic, label in examples]
+    total = len(predictions)
+    correct = sum(1 for (guess, _), label in predictions if guess == label)
+    sweep = {}
+    for threshold in THRESHOLD_SWEEP:
+        confident = [(guess, label) for (guess, p), label in predictions if p >= threshold]
+        right = sum(1 for guess, label in confident if guess == label)
+        sweep[threshold] = {
+            "coverage": round(len(confident) / total, 3) if total else 0.0,
+            "accuracy": round(right / len(confident), 3) if confident else None,
+        }
+    return {"examples": total, "accuracy": round(correct / total, 3) if total else None, "thresholds": sweep}
+
+
+def print_report(title: str, report: dict) -> None:
+    print(f"\n{title}: {report['examples']} topics, accuracy {report['accuracy']}")
+    print(f"{'threshold':>10}{'local share':>13}{'accuracy':>10}")
+    for threshold, row in report["thresholds"].items():
+        marker = "  <- TOPIC_CLASSIFIER_THRESHOLD" if threshold == settings.topic_classifier_threshold else ""
+        accuracy = "-" if row["accuracy"] is None else f"{row['accuracy']:.3f}"
+        print(f"{threshold:>10.2f}{row['coverage']:>13.1%}{accuracy:>10}{marker}")
+
+
+async def _main(args) -> None:
+    await database.connect_db()
+    try:
+        examples = await load_examples()
+    finally:
+        await database.close_db()
+    print(f"{len(examples)} Gemini-labelled topics")
+
+    if args.command == "evaluate":
+        model = get_classifier()
+        if model is None:
+            raise SystemExit(f"No trained model at {settings.topic_classifier_path}")
+        print_report("Saved model vs Gemini labels (includes topics it was trained on)", evaluate(model, examples))
+        return
+
+    if len(examples) < args.min_examples:
+        raise SystemExit(f"Need at least {args.min_examples} labelled topics to train")
+    labels = sorted(ALLOWED_CATEGORIES)
+    train, test = _split(examples, args.test_fraction)
+    if test:
+        held_out = TopicClassifier(labels).fit(train, epochs=args.epochs)
+        print_report(f"Hold-out ({len(train)} train / {len(test)} test)", evaluate(held_out, test))
+
+    model = TopicClassifier(labels).fit(examples, epochs=args.epochs)
+    model.meta = {"examples": len(examples), "trained_at": datetime.now(timezone.utc).isoformat()}
+    if args.dry_run:
+        return
+    model.save(settings.topic_classifier_path)
+    print(f"\nSaved model trained on all {len(examples)} topics to {settings.topic_classifier_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the local topic classifier.")
+    parser.add_argument("command", choices=("train", "evaluate"))
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--min-examples", type=int, default=50)
+    parser.add_argument("--dry-run", action="store_true", help="report without saving the model")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
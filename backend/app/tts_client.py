@@ -1,6 +1,16 @@
+import asyncio
+
 from elevenlabs import ElevenLabs
 
 from app.config import settings
+from app.metrics import UPSTREAM_RETRIES, track_upstream
+from app.rate_limit import provider_limit, rate_limit_info
+from app.segment_cache import get_segment_cache, segment_key
+
+MODEL_ID = "eleven_multilingual_v2"
+OUTPUT_FORMAT = "mp3_44100_128"
+MAX_RETRIES = 3
+BASE_DELAY = 1.0  # seconds; doubles each retry
 
 _client: ElevenLabs | None = None
 
@@ -20,10 +30,125 @@ VOICE_MAP = {
 
 def synthesize_line(speaker: str, text: str) -> bytes:
     voice_id = VOICE_MAP.get(speaker, VOICE_MAP["host_a"])
-    audio_iterator = _get_client().text_to_speech.convert(
-        voice_id=voice_id,
-        text=text,
-        model_id="eleven_multilingual_v2",
-        output_format="mp3_44100_128",
-    )
-    return b"".join(audio_iterator)
+    with track_upstream("elevenlabs", "tts"):
+        audio_iterator = _get_client().text_to_speech.convert(
+            voice_id=voice_id,
+            text=text,
+            model_id=MODEL_ID,
+            output_format=OUTPUT_FORMAT,
+        )
+        return b"".join(audio_iterator)
+
+
+def line_segment_key(speaker: str, text: str) -> str:
+    """Return the segment-cache key for a script line."""
+    voice_id = VOICE_MAP.get(speaker, VOICE_MAP["host_a"])
+    return segment_key(voice_id, MODEL_ID, OUTPUT_FORMAT, text)
+
+
+async def synthesize_line_async(speaker: str, text: str) -> bytes:
+    """Synthesize one line under the shared ElevenLabs provider limit.
+
+    Cache hits skip the network entirely. Misses retry with exponential
+    backoff, or the provider's Retry-After on a 429; the slot is released
+    while waiting so a failing line does not hold up other episodes.
+    """
+    cache = get_segment_cache()
+    key = line_segment_key(speaker, text)
+    if cache is not None:
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
+
+    audio = await _synthesize_with_retries(speaker, text)
+    if cache is not None:
+        try:
+            await cache.put(key, audio)
+        except Exception as exc:
+            # The audio is already paid for; a full disk shouldn't fail the line
+            print(f"[tts] Failed to cache segment {key}: {exc}")
+    return audio
+
+
+async def _synthesize_with_retries(speaker: str, text: str) -> bytes:
+    for attempt in range(MAX_RETRIES):
+        try:
+            async with provider_limit("elevenlabs").slot():
+                return await asyncio.to_thread(synthesize_line, speaker, text)
+        except Exception as exc:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = max(BASE_DELAY * (2 ** attempt), rate_limit_info(exc) or 0.0)
+            UPSTREAM_RETRIES.inc(service="elevenlabs")
+            print(f"[tts] {type(exc).__name__} for {speaker}, retrying in {delay}s (attempt {attempt + 1}/{MAX_RETRIES})")
+        await asyncio.sleep(delay)
+
+
+async def iter_synthesized(script):
+    """Synthesize every script line in parallel, yielding (index, audio) as each finishes.
+
+    `script` is a list of lines, or an async iterable that yields them while
+    the script is still being written; each line starts synthesizing as soon
+    as it arrives. Lines complete in whatever order the provider answers;
+    consumers that need script order must reorder by index.
+    """
+    done: asyncio.Queue[asyncio.Task] = asyncio.Queue()
+    # Only unfinished tasks are kept, so a yielded segment's bytes can be freed
+    # once the consumer is done with them
+    pending: set[asyncio.Task] = set()
+    started = 0
+
+    async def _run(index: int, line: dict) -> tuple[int, bytes]:
+        return index, await synthesize_line_async(line["speaker"], line["text"])
+
+    def _start(line: dict) -> None:
+        nonlocal started
+        task = asyncio.create_task(_run(started, line))
+        task.add_done_callback(done.put_nowait)
+        pending.add(task)
+        started += 1
+
+    async def _feed() -> None:
+        async for line in script:
+            _start(line)
+
+    feeder = None
+    if isinstance(script, list):
+        for line in script:
+            _start(line)
+    else:
+        feeder = asyncio.create_task(_feed())
+        feeder.add_done_callback(done.put_nowait)
+
+    try:
+        finished = 0
+        while finished < started + (feeder is not None):
+            task = await done.get()
+            finished += 1
+            if task is feeder:
+                task.result()  # re-raise a script stream failure
+                continue
+            pending.discard(task)
+            result = task.result()
+            del task
+            yield result
+            del result
+    finally:
+        for task in pending:
+            task.cancel()
+        if feeder is not None:
+            feeder.cancel()
+
+
+async def synthesize_script(script: list[dict]) -> list[bytes]:
+    """Synthesize every script line in parallel, returning audio in script order."""
+    tasks = [
+        asyncio.create_task(synthesize_line_async(line["speaker"], line["text"]))
+        for line in script
+    ]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
@@ -0,0 +1,179 @@
+"""Standalone worker that runs episode generation jobs from the queue.
+
+Run with:
+    uv run python -m app.worker --concurrency 4
+
+Each worker runs up to N pipelines at once, heartbeats their leases and
+periodically sweeps expired leases left by dead workers. SIGINT/SIGTERM
+stop claiming new jobs and let running pipelines finish. With
+`--metrics-port`, the worker's pipeline metrics are served for Prometheus
+on every path of that port.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+
+from bson import ObjectId
+
+from app import db as database
+from app import metrics
+from app.audio_pool import shutdown_audio_pool, start_audio_pool
+from app.citations_client import OPEN_LIBRARY_SEARCH_URL
+from app.config import settings
+from app.db import close_db, connect_db
+from app.episode_pipeline import generate_episode, update_status
+from app.http_client import close_http_clients, open_http_clients
+from app.image_client import GOOGLE_CSE_API, WIKIPEDIA_API
+from app.jobs import claim_job, complete_job, fail_job, heartbeat, reclaim_expired
+
+POLL_INTERVAL = 2.0  # seconds between claims when the queue is empty
+ERROR_BACKOFF = 5.0  # seconds to wait after a failed queue operation
+
+
+async def _wait(stopping: asyncio.Event, seconds: float) -> None:
+    """Sleep for `seconds`, waking early if the worker is stopping."""
+    try:
+        await asyncio.wait_for(stopping.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _heartbeat_loop(job_id: ObjectId, worker_id: str, pipeline: asyncio.Task) -> None:
+    while True:
+        await asyncio.sleep(settings.job_heartbeat_seconds)
+        try:
+            held = await heartbeat(job_id, worker_id)
+        except Exception as e:
+            # The lease outlasts several beats; try again on the next one
+            print(f"[worker] Heartbeat for job {job_id} failed: {e}")
+            continue
+        if not held:
+            print(f"[worker] Lost lease on job {job_id}, abandoning it")
+            pipeline.cancel()
+            return
+
+
+async def run_job(job: dict, worker_id: str) -> None:
+    episode_id = job["episode_id"]
+    print(f"[worker] Job {job['_id']} (episode {episode_id}), attempt {job['attempts']}")
+
+    pipeline = asyncio.create_task(generate_episode(episode_id))
+    beats = asyncio.create_task(_heartbeat_loop(job["_id"], worker_id, pipeline))
+    try:
+        await pipeline
+    except asyncio.CancelledError:
+        return
+    finally:
+        beats.cancel()
+
+    try:
+        doc = await database.db["episodes"].find_one({"_id": episode_id}, {"status": 1, "error": 1})
+        if doc is None or doc["status"] == "completed":
+            await complete_job(job["_id"], worker_id)
+            return
+
+        error = (doc.get("error") or "Pipeline failed").splitlines()[0]
+        if await fail_job(job, worker_id, error):
+            await update_status(episode_id, "pending")
+    except Exception as e:
+        # The lease lapses and the sweeper requeues the job; checkpoints make the rerun cheap
+        print(f"[worker] Failed to record the outcome of job {job['_id']}: {e}")
+
+
+async def _slot(worker_id: str, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        try:
+            job = await claim_job(worker_id)
+        except Exception as e:
+            print(f"[worker] Failed to claim a job: {e}")
+            await _wait(stopping, ERROR_BACKOFF)
+            continue
+        if job is None:
+            await _wait(stopping, POLL_INTERVAL)
+            continue
+        await run_job(job, worker_id)
+
+
+async def _sweeper(stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        try:
+            requeued = await reclaim_expired()
+            if requeued:
+                print(f"[worker] Requeued {requeued} job(s) with expired leases")
+        except Exception as e:
+            print(f"[worker] Failed to sweep expired leases: {e}")
+        await _wait(stopping, settings.job_sweep_interval_seconds)
+
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        await reader.readuntil(b"\r\n\r\n")  # any request gets the metrics
+        body = metrics.render().encode()
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                f"Content-Type: {metrics.CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+            + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_worker(concurrency: int, metrics_port: int = 0) -> None:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await connect_db()
+    await open_http_clients(OPEN_LIBRARY_SEARCH_URL, GOOGLE_CSE_API, WIKIPEDIA_API)
+    await start_audio_pool()
+    metrics_server = None
+    if metrics_port:
+        metrics_server = await asyncio.start_server(_serve_metrics, port=metrics_port)
+        print(f"[worker] Serving metrics on :{metrics_port}")
+    print(f"[worker] {worker_id} running {concurrency} pipeline slot(s)")
+    try:
+        await asyncio.gather(
+            _sweeper(stopping),
+            *(_slot(worker_id, stopping) for _ in range(concurrency)),
+        )
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        shutdown_audio_pool()
+        await close_http_clients()
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run episode generation jobs from the queue.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.worker_concurrency,
+        help="pipelines to run at once (default: WORKER_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="serve Prometheus metrics on this port (default: off)",
+    )
+    args = parser.parse_args()
+    asyncio.run(run_worker(max(1, args.concurrency), args.metrics_port))
+
+
+if __name__ == "__main__":
+    main()
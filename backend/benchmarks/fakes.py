@@ -0,0 +1,419 @@
+"""Local stand-ins for the pipeline's external providers.
+
+Each fake replaces one client at the same seam the app uses (the Gemini
+and ElevenLabs SDK clients, the GCS client, and the pooled httpx clients),
+so everything above it - retries, rate limiting, caching, stitching -
+runs unchanged. Every provider has a latency distribution (lognormal
+around a median), an error rate, and 429 behaviour: a random share of
+calls plus a concurrency cap above which calls are rejected, as real
+providers do.
+
+TTS returns real MP3 data (silent MPEG-1 Layer III frames whose length
+tracks the text), so the stitcher parses and joins actual frames.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+
+import httpx
+from elevenlabs.core.api_error import ApiError
+from google.genai import errors as genai_errors
+
+from app import gemini_client, http_client, storage, tts_client
+from app.citations_client import OPEN_LIBRARY_SEARCH_URL
+from app.config import settings
+from app.image_client import GOOGLE_CSE_API, WIKIPEDIA_API
+from app.mp3_frames import parse_header, silence_frame_count, silent_frame
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo: ElevenLabs' mp3_44100_128
+_FRAME_TEMPLATE = parse_header(bytes((0xFF, 0xFB, 0x90, 0x40)), 0)
+_CHARS_PER_SECOND = 15  # speaking rate used to size fake TTS audio
+_CHUNK_SIZE = 4096  # the SDK streams audio in chunks
+_STREAM_CHUNK_CHARS = 64  # text per chunk of a streamed Gemini response
+
+CATEGORIES = ("history", "science", "technology", "culture", "philosophy", "art")
+BOOKS = (
+    "The Guns of August",
+    "A Brief History of Time",
+    "The Structure of Scientific Revolutions",
+    "Sapiens",
+    "The Selfish Gene",
+    "Guns, Germs, and Steel",
+    "The Double Helix",
+    "Cosmos",
+    "The Wealth of Nations",
+    "The Origin of Species",
+    "Silent Spring",
+    "The Code Breaker",
+)
+
+
+@dataclass
+class ProviderProfile:
+    """How one fake provider behaves. Latencies are in milliseconds."""
+
+    median_ms: float
+    sigma: float = 0.4  # lognormal spread; 0 makes every call take median_ms
+    error_rate: float = 0.0  # share of calls failing with a 5xx
+    rate_limit_rate: float = 0.0  # share of calls answered with 429
+    max_concurrency: int = 0  # calls beyond this many in flight get 429; 0 = unlimited
+    retry_after_seconds: float = 1.0
+    ms_per_kb: float = 0.0  # extra latency per KB of payload (uploads)
+
+
+DEFAULT_PROFILES = {
+    "gemini_research": ProviderProfile(median_ms=20000, sigma=0.3),
+    "gemini_script": ProviderProfile(median_ms=25000, sigma=0.3),
+    "gemini_categorize": ProviderProfile(median_ms=600),
+    "elevenlabs": ProviderProfile(median_ms=1500, max_concurrency=5),
+    "gcs": ProviderProfile(median_ms=150, ms_per_kb=0.05),
+    "openlibrary": ProviderProfile(median_ms=400, rate_limit_rate=0.02),
+    "wikipedia": ProviderProfile(median_ms=300),
+    "google_cse": ProviderProfile(median_ms=500),
+}
+
+
+def load_profiles(path: str | None = None, latency_scale: float = 1.0) -> dict[str, ProviderProfile]:
+    """Default profiles, overridden per provider by a JSON file, with latencies scaled.
+
+    The file maps provider names to partial profiles, e.g.
+    `{"elevenlabs": {"median_ms": 800, "max_concurrency": 2}}`.
+    """
+    profiles = {name: ProviderProfile(**asdict(p)) for name, p in DEFAULT_PROFILES.items()}
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        for name, values in overrides.items():
+            if name not in profiles:
+                raise ValueError(f"Unknown provider '{name}' (expected one of {', '.join(profiles)})")
+            profiles[name] = ProviderProfile(**{**asdict(profiles[name]), **values})
+    for profile in profiles.values():
+        profile.median_ms *= latency_scale
+        profile.ms_per_kb *= latency_scale
+        profile.retry_after_seconds *= latency_scale
+    return profiles
+
+
+@dataclass
+class ProviderStats:
+    calls: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    peak_in_flight: int = 0
+
+
+class FakeProvider:
+    """Latency, failure and concurrency bookkeeping shared by every fake."""
+
+    def __init__(self, name: str, profile: ProviderProfile, rng: random.Random):
+        self.name = name
+        self.profile = profile
+        self.stats = ProviderStats()
+        self._rng = rng
+        self._in_flight = 0
+        self._lock = threading.Lock()  # TTS and uploads call in from worker threads
+
+    def _begin(self) -> str:
+        """Admit a call; returns "ok", "error" or "rate_limited"."""
+        p = self.profile
+        with self._lock:
+            self.stats.calls += 1
+            roll = self._rng.random()
+            if (p.max_concurrency and self._in_flight >= p.max_concurrency) or roll < p.rate_limit_rate:
+                self.stats.rate_limited += 1
+                return "rate_limited"
+            if roll < p.rate_limit_rate + p.error_rate:
+                self.stats.errors += 1
+                return "error"
+            self._in_flight += 1
+            self.stats.peak_in_flight = max(self.stats.peak_in_flight, self._in_flight)
+            return "ok"
+
+    def _end(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _latency(self, payload_bytes: int = 0) -> float:
+        p = self.profile
+        with self._lock:
+            noise = self._rng.gauss(0.0, p.sigma) if p.sigma else 0.0
+        ms = p.median_ms * math.exp(noise) + p.ms_per_kb * payload_bytes / 1024
+        return ms / 1000
+
+    def call_sync(self, payload_bytes: int = 0) -> str:
+        outcome = self._begin()
+        if outcome != "ok":
+            time.sleep(self._latency() / 10)  # rejections come back fast
+            return outcome
+        try:
+            time.sleep(self._latency(payload_bytes))
+        finally:
+            self._end()
+        return outcome
+
+    async def call(self, payload_bytes: int = 0) -> str:
+        outcome = self._begin()
+        if outcome != "ok":
+            await asyncio.sleep(self._latency() / 10)
+            return outcome
+        try:
+            await asyncio.sleep(self._latency(payload_bytes))
+        finally:
+            self._end()
+        return outcome
+
+
+def fake_mp3(text: str) -> bytes:
+    """Silent MP3 lasting roughly as long as `text` takes to say."""
+    seconds = max(0.5, len(text) / _CHARS_PER_SECOND)
+    frame = silent_frame(_FRAME_TEMPLATE)
+    return frame * silence_frame_count(_FRAME_TEMPLATE.format, int(seconds * 1000))
+
+
+# -- Gemini -----------------------------------------------------------------
+
+
+def _raise_for(outcome: str) -> None:
+    if outcome == "rate_limited":
+        raise genai_errors.ClientError(
+            429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}}
+        )
+    if outcome == "error":
+        raise genai_errors.ServerError(
+            503, {"error": {"code": 503, "message": "Model overloaded", "status": "UNAVAILABLE"}}
+        )
+
+
+class _FakeGeminiModels:
+    def __init__(self, providers: dict[str, FakeProvider], rng: random.Random, script_lines: int):
+        self._providers = providers
+        self._rng = rng
+        self._script_lines = script_lines
+
+    async def generate_content(self, model: str, contents: str, config=None):
+        if config is not None and config.tools:
+            kind = "gemini_research"
+        elif model == "gemini-2.0-flash":
+            kind = "gemini_categorize"
+        else:
+            kind = "gemini_script"
+
+        provider = self._providers[kind]
+        _raise_for(await provider.call())
+
+        if kind == "gemini_categorize" and contents.startswith("Classify these"):
+            count = len(contents.splitlines()) - 1  # one numbered line per topic
+            text = json.dumps({"categories": [self._rng.choice(CATEGORIES) for _ in range(count)]})
+        elif kind == "gemini_categorize":
+            text = json.dumps({"category": self._rng.choice(CATEGORIES)})
+        elif kind == "gemini_research":
+            text = "\n".join(f"- Fact {i}: {'lorem ipsum ' * 12}" for i in range(40))
+        else:
+            text = json.dumps(self._script())
+        return SimpleNamespace(text=text)
+
+    async def generate_content_stream(self, model: str, contents: str, config=None):
+        """The script call, with its latency spread over the chunks of the response."""
+        provider = self._providers["gemini_script"]
+        outcome = provider._begin()
+        if outcome != "ok":
+            await asyncio.sleep(provider._latency() / 10)
+            _raise_for(outcome)
+        return self._stream(provider, json.dumps(self._script()))
+
+    async def _stream(self, provider: FakeProvider, text: str):
+        try:
+            pieces = [text[i:i + _STREAM_CHUNK_CHARS] for i in range(0, len(text), _STREAM_CHUNK_CHARS)]
+            step = provider._latency() / len(pieces)
+            for piece in pieces:
+                await asyncio.sleep(step)
+                yield SimpleNamespace(text=piece)
+        finally:
+            provider._end()
+
+    def _script(self) -> list[dict]:
+        script = []
+        for i in range(self._script_lines):
+            words = self._rng.randint(15, 45)
+            line = {
+                "speaker": "host_a" if i % 2 == 0 else "host_b",
+                "text": " ".join(f"word{self._rng.randint(0, 999)}" for _ in range(words)),
+            }
+            if self._rng.random() < 0.25:
+                line["citation_query"] = self._rng.choice(BOOKS)
+            script.append(line)
+        return script
+
+
+class FakeGeminiClient:
+    def __init__(self, providers, rng, script_lines):
+        self.aio = SimpleNamespace(models=_FakeGeminiModels(providers, rng, script_lines))
+
+
+# -- ElevenLabs ---------------------------------------------------------------
+
+
+class _FakeTextToSpeech:
+    def __init__(self, provider: FakeProvider):
+        self._provider = provider
+
+    def convert(self, voice_id: str, text: str, model_id: str, output_format: str):
+        outcome = self._provider.call_sync()
+        if outcome == "rate_limited":
+            raise ApiError(
+                status_code=429,
+                headers={"retry-after": str(self._provider.profile.retry_after_seconds)},
+                body={"detail": {"status": "too_many_concurrent_requests"}},
+            )
+        if outcome == "error":
+            raise ApiError(status_code=500, body={"detail": "internal error"})
+        audio = fake_mp3(text)
+        return iter([audio[i:i + _CHUNK_SIZE] for i in range(0, len(audio), _CHUNK_SIZE)])
+
+
+class FakeElevenLabsClient:
+    def __init__(self, provider: FakeProvider):
+        self.text_to_speech = _FakeTextToSpeech(provider)
+
+
+# -- Google Cloud Storage -----------------------------------------------------
+
+
+class _FakeBlob:
+    def __init__(self, provider: FakeProvider, bucket: str, name: str, stored: dict):
+        self._provider = provider
+        self._stored = stored
+        self.name = name
+        self.cache_control = None
+        self.public_url = f"https://storage.googleapis.com/{bucket}/{name}"
+
+    def generate_signed_url(self, **kwargs) -> str:
+        return f"{self.public_url}?X-Goog-Signature=fake"
+
+    def _upload(self, size: int) -> None:
+        outcome = self._provider.call_sync(size)
+        if outcome != "ok":
+            code = 429 if outcome == "rate_limited" else 503
+            raise RuntimeError(f"{code} from fake GCS for {self.name}")
+        self._stored[self.name] = size
+
+    def upload_from_string(self, data, content_type: str | None = None) -> None:
+        self._upload(len(data))
+
+    def upload_from_filename(self, filename: str, content_type: str | None = None) -> None:
+        self._upload(os.path.getsize(filename))
+
+
+class FakeStorageClient:
+    def __init__(self, provider: FakeProvider):
+        self._provider = provider
+        self.stored: dict[str, int] = {}  # blob name -> bytes
+
+    def bucket(self, name: str):
+        return SimpleNamespace(
+            blob=lambda blob_name, **kwargs: _FakeBlob(self._provider, name, blob_name, self.stored)
+        )
+
+
+# -- HTTP lookups (Open Library, Wikipedia, Google CSE) -------------------------
+
+
+def _http_handler(providers: dict[str, FakeProvider], rng: random.Random):
+    hosts = {
+        httpx.URL(OPEN_LIBRARY_SEARCH_URL).host: "openlibrary",
+        httpx.URL(WIKIPEDIA_API).host: "wikipedia",
+        httpx.URL(GOOGLE_CSE_API).host: "google_cse",
+    }
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        name = hosts.get(request.url.host)
+        if name is None:
+            return httpx.Response(404, json={"error": f"no fake for {request.url.host}"})
+        provider = providers[name]
+        outcome = await provider.call()
+        if outcome == "rate_limited":
+            return httpx.Response(
+                429, headers={"Retry-After": str(provider.profile.retry_after_seconds)}
+            )
+        if outcome == "error":
+            return httpx.Response(503)
+
+        if name == "openlibrary":
+            if rng.random() < 0.15:
+                return httpx.Response(200, json={"docs": []})
+            query = request.url.params.get("q", "")
+            return httpx.Response(200, json={"docs": [{
+                "title": query,
+                "author_name": ["A. Author"],
+                "first_publish_year": rng.randint(1850, 2020),
+                "cover_i": rng.randint(1, 10**7),
+                "key": f"/works/OL{rng.randint(1, 10**7)}W",
+            }]})
+        if name == "wikipedia":
+            return httpx.Response(200, json={"query": {"pages": {"1": {
+                "thumbnail": {"source": "https://upload.wikimedia.org/fake/thumb.jpg"},
+            }}}})
+        return httpx.Response(200, json={"items": [{"link": "https://images.example.com/cover.jpg"}]})
+
+    return handle
+
+
+# -- Installation ---------------------------------------------------------------
+
+
+def _use_storage(client: FakeStorageClient) -> FakeStorageClient:
+    storage._storage_client = client
+    storage._backend = None
+    settings.storage_backend = "gcs"
+    return client
+
+
+def install_storage(profile: ProviderProfile, seed: int = 0) -> FakeStorageClient:
+    """Point only the storage backend at a fake; used in audio worker processes."""
+    provider = FakeProvider("gcs", profile, random.Random(seed))
+    return _use_storage(FakeStorageClient(provider))
+
+
+@dataclass
+class FakeServices:
+    providers: dict[str, FakeProvider]
+    storage: FakeStorageClient
+    http_clients: list[httpx.AsyncClient] = field(default_factory=list)
+
+    def stats(self) -> dict[str, dict]:
+        return {name: asdict(p.stats) for name, p in self.providers.items()}
+
+    async def aclose(self) -> None:
+        for client in self.http_clients:
+            await client.aclose()
+
+
+def install(profiles: dict[str, ProviderProfile], seed: int = 0, script_lines: int = 24) -> FakeServices:
+    """Point every provider client used by the pipeline at a local fake."""
+    rng = random.Random(seed)
+    providers = {name: FakeProvider(name, profile, rng) for name, profile in profiles.items()}
+
+    gemini_client._client = FakeGeminiClient(providers, rng, script_lines)
+    tts_client._client = FakeElevenLabsClient(providers["elevenlabs"])
+    fake_storage = _use_storage(FakeStorageClient(providers["gcs"]))
+
+    # Google CSE is only queried when configured; give it fake credentials
+    settings.gcs_bucket_name = settings.gcs_bucket_name or "podcastgpt-bench"
+    settings.google_cse_cx = settings.google_cse_cx or "bench"
+    settings.google_api_key = settings.google_api_key or "bench"
+
+    transport = httpx.MockTransport(_http_handler(providers, rng))
+    clients = []
+    for url in (OPEN_LIBRARY_SEARCH_URL, WIKIPEDIA_API, GOOGLE_CSE_API):
+        client = httpx.AsyncClient(transport=transport)
+        http_client._clients[httpx.URL(url).host] = client
+        clients.append(client)
+
+    return FakeServices(providers, fake_storage, clients)
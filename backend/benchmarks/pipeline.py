@@ -0,0 +1,332 @@
+"""End-to-end pipeline benchmark against local provider stand-ins.
+
+Runs `generate_episode` for a batch of episodes with a fixed number in
+flight, against a local MongoDB and the fakes in `benchmarks.fakes`, and
+reports per-stage and end-to-end latency percentiles, throughput and peak
+RSS. Results can be saved as a named baseline and later runs compared
+against it.
+
+    cd backend
+    python -m benchmarks.pipeline --episodes 20 --concurrency 4 --latency-scale 0.1
+    python -m benchmarks.pipeline ... --save-baseline main
+    python -m benchmarks.pipeline ... --compare main   # exits 1 on regression
+
+The benchmark database (MONGODB_DB_NAME + "_bench" by default) is dropped
+before and after each run.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app import audio_pool
+from app import db as database
+from app import episode_pipeline
+from app.config import settings
+from app.http_client import close_http_clients
+from benchmarks.fakes import install, install_storage, load_profiles
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+# Pipeline stages, measured between the status transitions that bound them
+STAGES = (
+    ("research", "researching", "scriptwriting"),
+    ("script", "scriptwriting", "generating_audio"),
+    ("tts", "generating_audio", "stitching"),
+    ("finalize", "stitching", "completed"),
+)
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Linear-interpolated percentile of `values` (which must be non-empty)."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    summary = {f"p{p}": round(percentile(values, p), 3) for p in PERCENTILES}
+    summary["max"] = round(max(values), 3)
+    return summary
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StatusRecorder:
+    """Wraps `update_status` to timestamp every status transition."""
+
+    def __init__(self):
+        self.transitions: dict[str, list[tuple[str, float]]] = defaultdict(list)
+        self._original = episode_pipeline.update_status
+
+    def install(self) -> None:
+        async def recording_update_status(episode_id, status, extra=None):
+            history = self.transitions[str(episode_id)]
+            if not history or history[-1][0] != status:
+                history.append((status, time.perf_counter()))
+            await self._original(episode_id, status, extra)
+
+        episode_pipeline.update_status = recording_update_status
+
+    def uninstall(self) -> None:
+        episode_pipeline.update_status = self._original
+
+    def stage_durations(self, episode_id: str) -> dict[str, float]:
+        first_seen = {}
+        for status, at in self.transitions[episode_id]:
+            first_seen.setdefault(status, at)
+        durations = {}
+        for stage, start, end in STAGES:
+            if start in first_seen and end in first_seen:
+                durations[stage] = first_seen[end] - first_seen[start]
+        return durations
+
+
+async def _create_episode(index: int, tone: str) -> object:
+    now = datetime.now(timezone.utc)
+    result = await database.db["episodes"].insert_one({
+        "topic": f"Benchmark topic {index}",
+        "tone": tone,
+        "category": None,
+        "status": "pending",
+        "created_at": now,
+        "updated_at": None,
+        "script": None,
+        "citations": None,
+        "audio_url": None,
+        "duration_seconds": None,
+        "error": None,
+    })
+    return result.inserted_id
+
+
+async def run(args) -> dict:
+    settings.mongodb_uri = args.mongo_uri or settings.mongodb_uri
+    settings.mongodb_db_name = args.db
+    if not args.tts_cache:
+        settings.tts_cache_backend = "none"
+    if args.audio_workers is not None:
+        settings.audio_workers = args.audio_workers
+
+    profiles = load_profiles(args.profile, args.latency_scale)
+    fakes = install(profiles, seed=args.seed, script_lines=args.script_lines)
+    # Audio workers upload progressive chunks themselves
+    audio_pool.set_worker_initializer(install_storage, profiles["gcs"], args.seed)
+    recorder = StatusRecorder()
+    recorder.install()
+
+    await database.connect_db()
+    await database.client.drop_database(args.db)
+    await database.close_db()
+    await database.connect_db()  # recreate indexes on the empty database
+    await audio_pool.start_audio_pool()
+    try:
+        ids = [await _create_episode(i, "conversational") for i in range(args.episodes)]
+        end_to_end: dict[str, float] = {}
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one(episode_id) -> None:
+            async with slots:
+                started = time.perf_counter()
+                await episode_pipeline.generate_episode(episode_id)
+                end_to_end[str(episode_id)] = time.perf_counter() - started
+
+        rss_before = peak_rss_mb()
+        wall_started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in ids))
+        wall = time.perf_counter() - wall_started
+
+        docs = await database.db["episodes"].find(
+            {"_id": {"$in": ids}}, {"status": 1, "error": 1}
+        ).to_list(length=None)
+        completed = [str(d["_id"]) for d in docs if d["status"] == "completed"]
+        failures = [
+            (d.get("error") or d["status"]).splitlines()[0]
+            for d in docs
+            if d["status"] != "completed"
+        ]
+
+        stages = defaultdict(list)
+        for episode_id in completed:
+            for stage, seconds in recorder.stage_durations(episode_id).items():
+                stages[stage].append(seconds)
+
+        return {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "git_rev": _git_rev(),
+                "python": platform.python_version(),
+                "episodes": args.episodes,
+                "concurrency": args.concurrency,
+                "script_lines": args.script_lines,
+                "latency_scale": args.latency_scale,
+                "profile": args.profile,
+                "seed": args.seed,
+                "stitch_mode": settings.stitch_mode,
+                "tts_max_concurrency": settings.tts_max_concurrency,
+                "audio_workers": settings.audio_workers,
+            },
+            "results": {
+                "completed": len(completed),
+                "failed": len(failures),
+                "wall_seconds": round(wall, 3),
+                "episodes_per_minute": round(len(completed) / wall * 60, 2) if wall else 0.0,
+                "end_to_end": summarize([end_to_end[i] for i in completed]),
+                "stages": {stage: summarize(values) for stage, values in stages.items()},
+                "peak_rss_mb": peak_rss_mb(),
+                "rss_before_run_mb": rss_before,
+                "providers": fakes.stats(),
+                "uploaded_mb": round(sum(fakes.storage.stored.values()) / 1e6, 2),
+            },
+            "failures": failures[:10],
+        }
+    finally:
+        recorder.uninstall()
+        audio_pool.shutdown_audio_pool()
+        if not args.keep_db:
+            await database.client.drop_database(args.db)
+        await database.close_db()
+        await close_http_clients()
+        await fakes.aclose()
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict) -> None:
+    meta, results = report["meta"], report["results"]
+    print(
+        f"\n{results['completed']}/{meta['episodes']} episodes completed "
+        f"({meta['concurrency']} concurrent, latency scale {meta['latency_scale']}) "
+        f"in {results['wall_seconds']:.1f}s: {results['episodes_per_minute']} episodes/min, "
+        f"peak RSS {results['peak_rss_mb']} MB"
+    )
+    header = "".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}"
+    print(f"\n{'latency (s)':<14}{header}")
+    rows = [("end_to_end", results["end_to_end"])] + list(results["stages"].items())
+    for name, summary in rows:
+        if summary:
+            cells = "".join(f"{summary[f'p{p}']:>9.2f}" for p in PERCENTILES)
+            print(f"{name:<14}{cells}{summary['max']:>9.2f}")
+
+    print(f"\n{'provider':<18}{'calls':>7}{'errors':>8}{'429s':>7}{'peak':>6}")
+    for name, stats in results["providers"].items():
+        if stats["calls"]:
+            print(
+                f"{name:<18}{stats['calls']:>7}{stats['errors']:>8}"
+                f"{stats['rate_limited']:>7}{stats['peak_in_flight']:>6}"
+            )
+    for failure in report["failures"]:
+        print(f"  failed: {failure}")
+
+
+def _comparable(results: dict) -> dict[str, tuple[float, bool]]:
+    """Flatten results to {metric: (value, higher_is_better)}."""
+    metrics = {
+        "episodes_per_minute": (results["episodes_per_minute"], True),
+        "peak_rss_mb": (results["peak_rss_mb"], False),
+        "completed": (results["completed"], True),
+    }
+    for pct in ("p50", "p95"):
+        if pct in results["end_to_end"]:
+            metrics[f"end_to_end.{pct}"] = (results["end_to_end"][pct], False)
+        for stage, summary in results["stages"].items():
+            if pct in summary:
+                metrics[f"{stage}.{pct}"] = (summary[pct], False)
+    return metrics
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print a comparison table and return the metrics that regressed beyond `tolerance`."""
+    current = _comparable(report["results"])
+    previous = _comparable(baseline["results"])
+    regressions = []
+    print(f"\n{'metric':<24}{'baseline':>11}{'current':>11}{'change':>9}")
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous:
+            continue
+        base = previous[name][0]
+        change = (value - base) / base if base else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24}{base:>11.2f}{value:>11.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="episodes in flight at once")
+    parser.add_argument("--script-lines", type=int, default=24)
+    parser.add_argument(
+        "--latency-scale", type=float, default=1.0,
+        help="multiply every provider latency (e.g. 0.1 for quick runs)",
+    )
+    parser.add_argument("--profile", help="JSON file overriding provider profiles")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo-uri", help="defaults to MONGODB_URI")
+    parser.add_argument("--db", default=f"{settings.mongodb_db_name}_bench")
+    parser.add_argument("--keep-db", action="store_true", help="keep the benchmark database afterwards")
+    parser.add_argument(
+        "--audio-workers", type=int,
+        help="stitching processes (default: AUDIO_WORKERS; 0 stitches in-process)",
+    )
+    parser.add_argument("--tts-cache", action="store_true", help="leave the TTS segment cache on")
+    parser.add_argument("--json", help="also write the full report to this file")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME", help="compare against a saved baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.15,
+        help="relative change counted as a regression (default: 0.15)",
+    )
+    args = parser.parse_args()
+
+    if args.db == settings.mongodb_db_name:
+        parser.error("--db must differ from MONGODB_DB_NAME; the benchmark drops it")
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps(report, indent=2))
+        print(f"\nSaved baseline to {path}")
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import pytest
+from pydub import AudioSegment
+
+from app import mp3_frames
+from app.audio_stitcher import FFMPEG_ERROR_BYTES, PcmEncoder, StreamingStitcher
+from app.config import settings
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo: 417-byte frames
+HEADER = mp3_frames.parse_header(bytes((0xFF, 0xFB, 0x90, 0x40)), 0)
+FRAMES_PER_SEGMENT = 40
+
+
+def segment(frames: int = FRAMES_PER_SEGMENT) -> bytes:
+    return mp3_frames.silent_frame(HEADER) * frames
+
+
+@pytest.fixture(autouse=True)
+def frame_stitching(monkeypatch):
+    monkeypatch.setattr(settings, "stitch_mode", "frames")
+    monkeypatch.setattr(settings, "progressive_publish", False)
+
+
+def test_out_of_order_segments_stay_under_memory_limit():
+    audio = segment()
+    limit = 3 * len(audio)
+    stitcher = StreamingStitcher("memory-test", memory_limit_bytes=limit)
+    try:
+        # Every later line lands before line 0, so all of them have to wait
+        for index in range(10, 0, -1):
+            assert stitcher.add(index, "host_a" if index % 2 else "host_b", audio) == []
+        timestamps = stitcher.add(0, "host_b", audio)
+        _, duration, all_timestamps = stitcher.finalize()
+
+        assert stitcher.peak_buffered_bytes <= limit
+        assert stitcher.spilled_segments > 0
+        assert [t["index"] for t in timestamps] == list(range(11))
+        assert all_timestamps == timestamps
+        assert duration > 11 * FRAMES_PER_SEGMENT * 1152 / 44100
+    finally:
+        stitcher.close()
+
+
+def test_zero_memory_limit_spills_every_waiting_segment():
+    audio = segment()
+    stitcher = StreamingStitcher("spill-test", memory_limit_bytes=0)
+    try:
+        for index in (3, 2, 1):
+            stitcher.add(index, "host_a", audio)
+        assert stitcher.spilled_segments == 3
+        assert stitcher.peak_buffered_bytes == 0
+        assert len(stitcher.add(0, "host_a", audio)) == 4
+    finally:
+        stitcher.close()
+
+
+def test_ffmpeg_error_output_cannot_block_decoding(tmp_path, monkeypatch):
+    # Stands in for ffmpeg on damaged input: far more stderr than a pipe holds
+    fake = tmp_path / "ffmpeg"
+    fake.write_text("#!/bin/sh\nhead -c 200000 /dev/zero | tr '\\0' e >&2\nexit 1\n")
+    fake.chmod(0o755)
+    monkeypatch.setattr(AudioSegment, "converter", str(fake))
+
+    encoder = PcmEncoder(str(tmp_path / "out.mp3"))
+    try:
+        with pytest.raises(RuntimeError, match="could not decode damaged.mp3") as exc:
+            encoder.write_file(str(tmp_path / "damaged.mp3"))
+        assert len(str(exc.value)) < FFMPEG_ERROR_BYTES + 100
+    finally:
+        encoder.kill()
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from app.json_stream import JsonArrayStream
+
+SCRIPT = [
+    {"speaker": "host_a", "text": "Welcome back, everyone."},
+    {"speaker": "host_b", "text": 'He said "wait]" and left, [sic] \\ done', "citation_query": "diary"},
+    {"speaker": "host_a", "text": "Unicode: café — \U0001f3a7", "tags": [[1, {"x": "]"}], []]},
+]
+
+
+def feed_all(chunks) -> tuple[list, JsonArrayStream]:
+    stream = JsonArrayStream()
+    elements = []
+    for chunk in chunks:
+        elements += stream.feed(chunk)
+    return elements, stream
+
+
+def test_elements_arrive_as_soon_as_they_close():
+    stream = JsonArrayStream()
+    assert stream.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert stream.feed(': 2}') == []
+    assert stream.feed(']') == [{"b": 2}]
+    assert stream.finished
+
+
+@pytest.mark.parametrize("text", [json.dumps(SCRIPT), json.dumps(SCRIPT, indent=2)])
+def test_every_split_point(text):
+    for offset in range(len(text) + 1):
+        elements, stream = feed_all([text[:offset], text[offset:]])
+        assert elements == SCRIPT, offset
+        assert stream.finished
+
+
+def test_one_character_at_a_time():
+    text = json.dumps(SCRIPT)
+    elements, stream = feed_all(text)
+    assert elements == SCRIPT
+    assert stream.finished
+
+
+def test_escapes_and_brackets_inside_strings():
+    elements, _ = feed_all(['["a\\"]", "\\\\", "[{,}]", "\\u005d"]'])
+    assert elements == ['a"]', "\\", "[{,}]", "]"]
+
+
+def test_scalars_and_nesting():
+    elements, _ = feed_all(['[1, -2.5e3, true, null, "s", [1, [2, [3]]], {"a": {"b": []}}]'])
+    assert elements == [1, -2500.0, True, None, "s", [1, [2, [3]]], {"a": {"b": []}}]
+
+
+def test_text_around_the_array_is_ignored():
+    elements, stream = feed_all(['```json\n[{"a": 1}]\n```'])
+    assert elements == [{"a": 1}]
+    assert stream.finished
+
+
+def test_input_after_the_array_is_ignored():
+    stream = JsonArrayStream()
+    assert stream.feed("[1] [2]") == [1]
+    assert stream.feed(", 3]") == []
+
+
+@pytest.mark.parametrize("text", ["[]", "[ ]", "[\n\t]"])
+def test_empty_array(text):
+    elements, stream = feed_all([text])
+    assert elements == []
+    assert stream.finished
+
+
+@pytest.mark.parametrize("text", ["[1,]", "[1, ]", "[,1]", "[1,,2]"])
+def test_empty_elements_are_rejected(text):
+    with pytest.raises(ValueError):
+        feed_all([text])
+
+
+@pytest.mark.parametrize("text", ["[1 2]", "[tr ue]", '["a" "b"]', '[{"a": 1} {"b": 2}]'])
+def test_whitespace_inside_an_element_is_kept(text):
+    with pytest.raises(ValueError):
+        feed_all([text])
+
+
+def test_unbalanced_brackets_are_rejected():
+    with pytest.raises(ValueError):
+        feed_all(['[{"a": 1}}]'])
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app import rate_limit
+from app.rate_limit import ProviderLimit
+
+
+class TooManyRequests(Exception):
+    """Shaped like the ElevenLabs SDK's 429."""
+
+    status_code = 429
+    headers = {"Retry-After": "0"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand (only for code that doesn't sleep)."""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_back_off_halves_once_per_burst(clock):
+    limit = ProviderLimit("test", max_concurrency=8)
+    limit.back_off(5)
+    limit.back_off(5)  # same burst: the pause is still running
+    assert limit.concurrency == 4
+
+    clock[0] += 6
+    limit.back_off(5)
+    assert limit.concurrency == 2
+
+    for _ in range(5):
+        clock[0] += 10
+        limit.back_off(5)
+    assert limit.concurrency == 1
+
+
+def test_back_off_caps_the_pause(clock):
+    limit = ProviderLimit("test", max_concurrency=2)
+    limit.back_off(3600)
+    assert limit._paused_until == clock[0] + rate_limit.MAX_BACKOFF_SECONDS
+
+
+def test_concurrency_grows_back_after_successes():
+    async def succeed(limit: ProviderLimit, times: int) -> None:
+        for _ in range(times):
+            async with limit.slot():
+                pass
+
+    async def run():
+        limit = ProviderLimit("test", max_concurrency=4)
+        limit.back_off(0)
+        assert limit.concurrency == 2
+        await succeed(limit, 1)
+        assert limit.concurrency == 2
+        await succeed(limit, 1)
+        assert limit.concurrency == 3  # a run of `concurrency` successes adds one
+        await succeed(limit, 3)
+        assert limit.concurrency == 4
+        await succeed(limit, 10)
+        assert limit.concurrency == 4  # never past max_concurrency
+
+    asyncio.run(run())
+
+
+def test_slot_caps_calls_in_flight():
+    async def run():
+        limit = ProviderLimit("test", max_concurrency=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with limit.slot():
+                peak = max(peak, limit.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        assert peak == 2
+        assert limit.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_slot_is_released_when_the_call_raises():
+    async def run():
+        limit = ProviderLimit("test", max_concurrency=1)
+        with pytest.raises(ValueError):
+            async with limit.slot():
+                raise ValueError("upstream error")
+        assert limit.in_flight == 0
+        assert limit.concurrency == 1  # not a 429: no back-off
+
+        with pytest.raises(TooManyRequests):
+            async with limit.slot():
+                raise TooManyRequests()
+        assert limit.in_flight == 0
+
+        async def enter():
+            async with limit.slot():
+                pass
+
+        await asyncio.wait_for(enter(), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_429_from_a_call_halves_concurrency():
+    async def run():
+        limit = ProviderLimit("test", max_concurrency=4)
+        with pytest.raises(TooManyRequests):
+            async with limit.slot():
+                raise TooManyRequests()
+        assert limit.concurrency == 2
+
+    asyncio.run(run())
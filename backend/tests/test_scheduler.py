@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app import scheduler
+from app.scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_NEW,
+    PRIORITY_REGENERATE,
+    AlreadyRunning,
+    PipelineScheduler,
+    QueueFull,
+)
+
+
+async def until(condition) -> None:
+    for _ in range(1000):
+        if condition():
+            return
+        await asyncio.sleep(0)
+    raise AssertionError("condition never became true")
+
+
+@pytest.fixture
+def pipelines(monkeypatch):
+    """Stand-in generate_episode: records each start, then waits to be released."""
+
+    class Pipelines:
+        started: list[ObjectId] = []
+        release: asyncio.Event | None = None
+
+        @classmethod
+        async def generate(cls, episode_id):
+            cls.started.append(episode_id)
+            if cls.release is not None:
+                await cls.release.wait()
+
+    Pipelines.started = []
+    monkeypatch.setattr(scheduler, "generate_episode", Pipelines.generate)
+    return Pipelines
+
+
+def test_runs_by_priority_then_arrival(pipelines):
+    async def run():
+        sched = PipelineScheduler(max_running=1, queue_limit=10)
+        batch_1, new_1, regen, new_2, batch_2 = (ObjectId() for _ in range(5))
+        sched.submit(batch_1, PRIORITY_BATCH)
+        sched.submit(new_1, PRIORITY_NEW)
+        sched.submit(regen, PRIORITY_REGENERATE)
+        sched.submit(new_2, PRIORITY_NEW)
+        sched.submit(batch_2, PRIORITY_BATCH)
+        sched.start()
+        await until(lambda: len(pipelines.started) == 5)
+        await sched.stop()
+        assert pipelines.started == [new_1, new_2, batch_1, batch_2, regen]
+
+    asyncio.run(run())
+
+
+def test_position_counts_free_runner_slots(pipelines):
+    async def run():
+        pipelines.release = asyncio.Event()
+        sched = PipelineScheduler(max_running=2, queue_limit=10)
+        a, b, c, d = (ObjectId() for _ in range(4))
+        for episode_id in (a, b, c, d):
+            sched.submit(episode_id, PRIORITY_BATCH)
+        # Nothing is running yet, so the first two start as soon as runners are free
+        assert [sched.position(e) for e in (a, b, c, d)] == [None, None, 1, 2]
+
+        sched.start()
+        await until(lambda: sched.running == 2)
+        assert [sched.position(e) for e in (c, d)] == [1, 2]
+        assert sched.position(a) is None  # running, no longer queued
+
+        urgent = ObjectId()
+        sched.submit(urgent, PRIORITY_NEW)
+        assert [sched.position(e) for e in (urgent, c, d)] == [1, 2, 3]
+
+        pipelines.release.set()
+        await until(lambda: sched.depth == 0 and sched.running == 0)
+        await sched.stop()
+
+    asyncio.run(run())
+
+
+def test_admit_rejects_counts_past_the_queue_limit(pipelines):
+    sched = PipelineScheduler(max_running=2, queue_limit=3)
+    sched.admit(3)
+    with pytest.raises(QueueFull):
+        sched.admit(4)
+
+    sched.submit(ObjectId(), PRIORITY_NEW)
+    sched.submit(ObjectId(), PRIORITY_NEW)
+    sched.admit(1)
+    with pytest.raises(QueueFull) as exc:
+        sched.admit(2)
+    assert exc.value.retry_after == 45  # default 90 s pipeline over 2 runners
+
+    sched.submit(ObjectId(), PRIORITY_NEW)
+    with pytest.raises(QueueFull):
+        sched.admit()
+
+
+def test_running_episode_cannot_be_queued_again(pipelines):
+    async def run():
+        pipelines.release = asyncio.Event()
+        sched = PipelineScheduler(max_running=1, queue_limit=10)
+        episode_id = ObjectId()
+        sched.submit(episode_id, PRIORITY_NEW)
+        sched.submit(episode_id, PRIORITY_REGENERATE)
+        assert sched.depth == 1
+        assert sched.status(episode_id) == "queued"
+
+        sched.start()
+        await until(lambda: sched.running == 1)
+        assert sched.status(episode_id) == "running"
+        with pytest.raises(AlreadyRunning):
+            sched.submit(episode_id, PRIORITY_REGENERATE)
+        assert sched.depth == 0
+
+        pipelines.release.set()
+        await until(lambda: sched.running == 0)
+        assert sched.status(episode_id) is None
+        sched.submit(episode_id, PRIORITY_REGENERATE)
+        await until(lambda: len(pipelines.started) == 2)
+        await sched.stop()
+
+    asyncio.run(run())
+
+
+def test_failed_pipeline_frees_its_runner(pipelines, monkeypatch):
+    async def failing(episode_id):
+        pipelines.started.append(episode_id)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(scheduler, "generate_episode", failing)
+
+    async def run():
+        sched = PipelineScheduler(max_running=1, queue_limit=10)
+        first, second = ObjectId(), ObjectId()
+        sched.submit(first, PRIORITY_NEW)
+        sched.submit(second, PRIORITY_NEW)
+        sched.start()
+        await until(lambda: len(pipelines.started) == 2 and sched.running == 0)
+        await sched.stop()
+        assert sched.status(first) is None
+
+    asyncio.run(run())
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import math
+
+import pytest
+
+from app import topic_classifier
+from app.config import settings
+from app.topic_classifier import FEATURE_BITS, TopicClassifier, categorize, features
+
+EXAMPLES = [
+    ("Quantum physics for beginners", "science"),
+    ("How black holes bend light", "science"),
+    ("The physics of black holes", "science"),
+    ("Quantum computing explained", "science"),
+    ("Particle physics and the Higgs boson", "science"),
+    ("The fall of the Roman Empire", "history"),
+    ("Medieval castles and their sieges", "history"),
+    ("Life in the Roman Republic", "history"),
+    ("Kings and queens of medieval England", "history"),
+    ("The Roman Empire at its height", "history"),
+]
+
+
+@pytest.fixture(scope="module")
+def model() -> TopicClassifier:
+    return TopicClassifier(["science", "history"]).fit(EXAMPLES)
+
+
+@pytest.fixture
+def use_model(monkeypatch):
+    """Install `model` (or no model) as the loaded classifier."""
+
+    def install(model: TopicClassifier | None) -> None:
+        monkeypatch.setattr(topic_classifier, "_model", model)
+        monkeypatch.setattr(topic_classifier, "_model_loaded", True)
+
+    return install
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Stand-in categorize_topic that records its calls and answers `gemini.answer`."""
+
+    class Gemini:
+        answer: str | None = "history"
+        calls: list[str] = []
+
+    Gemini.calls = []
+
+    async def categorize_topic(topic, default=None):
+        Gemini.calls.append(topic)
+        return Gemini.answer if Gemini.answer is not None else default
+
+    monkeypatch.setattr(topic_classifier, "categorize_topic", categorize_topic)
+    return Gemini
+
+
+def test_features_are_deterministic_and_normalized():
+    x = features("Black Holes and Time Warps")
+    assert x == features("  black holes and time warps ")
+    assert all(0 <= i < 1 << FEATURE_BITS for i in x)
+    assert math.isclose(sum(v * v for v in x.values()), 1.0)
+    assert features("") == {}
+
+
+def test_related_words_share_features():
+    assert set(features("astrophysics")) & set(features("astronomy"))
+    assert not set(features("astrophysics")) & set(features("medieval"))
+
+
+def test_fit_separates_toy_topics(model):
+    for topic, label in EXAMPLES:
+        assert model.predict(topic)[0] == label
+    label, confidence = model.predict("Quantum black holes")
+    assert label == "science" and confidence > 0.5
+    assert model.predict("Roman sieges")[0] == "history"
+    assert math.isclose(sum(model.predict_proba("anything at all").values()), 1.0)
+
+
+def test_save_load_round_trip(model, tmp_path):
+    path = str(tmp_path / "models" / "topics.json")
+    model.meta = {"examples": len(EXAMPLES)}
+    model.save(path)
+    loaded = TopicClassifier.load(path)
+
+    assert loaded.labels == model.labels
+    assert loaded.meta == {"examples": len(EXAMPLES)}
+    for topic in ("Quantum black holes", "Roman sieges"):
+        expected = model.predict_proba(topic)
+        for label, p in loaded.predict_proba(topic).items():
+            assert math.isclose(p, expected[label], abs_tol=1e-4)
+
+
+def test_load_rejects_other_versions(model, tmp_path, monkeypatch):
+    path = tmp_path / "topics.json"
+    model.save(str(path))
+    payload = json.loads(path.read_text())
+    payload["version"] += 1
+    path.write_text(json.dumps(payload))
+
+    with pytest.raises(ValueError, match="incompatible"):
+        TopicClassifier.load(str(path))
+
+    # The app starts without the model rather than failing
+    monkeypatch.setattr(settings, "topic_classifier_path", str(path))
+    monkeypatch.setattr(topic_classifier, "_model", None)
+    monkeypatch.setattr(topic_classifier, "_model_loaded", False)
+    assert topic_classifier.get_classifier() is None
+
+
+def test_confident_prediction_skips_gemini(model, use_model, gemini, monkeypatch):
+    use_model(model)
+    monkeypatch.setattr(settings, "topic_classifier_threshold", 0.5)
+    assert asyncio.run(categorize("Quantum black holes")) == ("science", "local")
+    assert gemini.calls == []
+
+
+def test_unsure_prediction_asks_gemini(model, use_model, gemini, monkeypatch):
+    use_model(model)
+    monkeypatch.setattr(settings, "topic_classifier_threshold", 1.0)
+    assert asyncio.run(categorize("Quantum black holes")) == ("history", "llm")
+    assert gemini.calls == ["Quantum black holes"]
+
+
+def test_without_a_model_every_topic_goes_to_gemini(use_model, gemini):
+    use_model(None)
+    assert asyncio.run(categorize("Quantum black holes")) == ("history", "llm")
+    assert gemini.calls == ["Quantum black holes"]
+
+
+def test_failed_gemini_call_falls_back_to_other(use_model, gemini):
+    use_model(None)
+    gemini.answer = None
+    assert asyncio.run(categorize("Quantum black holes")) == ("other", "fallback")
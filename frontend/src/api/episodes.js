@@ -6,7 +6,8 @@ export async function fetchEpisodes(search = '', { signal, category = '', tone =
   if (sortOrder) params.set('sort_order', sortOrder)
   const res = await fetch(`/api/episodes?${params}`, { signal })
   if (!res.ok) throw new Error(`Failed to fetch episodes: ${res.status}`)
-  return res.json()
+  const page = await res.json()
+  return page.items
 }
 
 export async function fetchCategories({ signal } = {}) {
@@ -44,3 +45,17 @@ export async function regenerateEpisode(id) {
   }
   return res.json()
 }
+
+// Live progress over server-sent events. Calls onUpdate with a full episode
+// ("snapshot") and then with partial field updates; returns an unsubscribe
+// function.
+export function subscribeEpisodes(ids, onUpdate) {
+  if (ids.length === 0) return () => {}
+  const params = new URLSearchParams({ ids: ids.join(',') })
+  const source = new EventSource(`/api/episodes/events?${params}`)
+  const handle = (e) => onUpdate(JSON.parse(e.data))
+  source.addEventListener('snapshot', handle)
+  source.addEventListener('update', handle)
+  source.addEventListener('end', () => source.close())
+  return () => source.close()
+}
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react'
 import { Link } from 'wouter'
 import Markdown from 'react-markdown'
-import { fetchEpisode } from '../api/episodes'
+import { fetchEpisode, subscribeEpisodes } from '../api/episodes'
 
 const STATUS_STYLES = {
   completed: { bg: 'bg-[rgba(30,215,96,0.15)]', text: 'text-premium-green', label: 'Ready' },
@@ -38,6 +38,15 @@ export default function EpisodePage({ id, onPlay }) {
     return () => controller.abort()
   }, [id])
 
+  // Follow generation progress live until the episode finishes
+  const inProgress = !!episode && episode.status !== 'completed' && episode.status !== 'failed'
+  useEffect(() => {
+    if (!inProgress) return
+    return subscribeEpisodes([id], (update) => {
+      setEpisode((prev) => (prev ? { ...prev, ...update } : prev))
+    })
+  }, [id, inProgress])
+
   if (loading) {
     return (
       <div className="flex justify-center items-center min-h-[40vh]">
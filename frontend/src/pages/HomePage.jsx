@@ -6,8 +6,18 @@ import {
   fetchEpisodes,
   fetchEpisode,
   regenerateEpisode,
+  subscribeEpisodes,
 } from "../api/episodes";
 
+// Episode fields shown in the grid that can change while generating
+const LIST_FIELDS = [
+  "status",
+  "category",
+  "cover_image_url",
+  "audio_url",
+  "duration_seconds",
+];
+
 export default function HomePage({ searchQuery, onPlay, refreshKey }) {
   const [episodes, setEpisodes] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -84,40 +94,26 @@ export default function HomePage({ searchQuery, onPlay, refreshKey }) {
     };
   }, [searchQuery, refreshKey, filters]);
 
-  // Poll for in-progress episodes every 5 seconds
-  const prevHadInProgress = useRef(false);
+  // Follow in-progress episodes over a single server-sent events stream
+  const activeIds = episodes
+    .filter((ep) => ep.status !== "completed" && ep.status !== "failed")
+    .map((ep) => ep.id)
+    .join(",");
   useEffect(() => {
-    const hasInProgress = episodes.some(
-      (ep) =>
-        ep.status !== "completed" &&
-        ep.status !== "failed" &&
-        ep.status !== "pending",
-    );
-
-    // If episodes just finished, do one final refresh to get the completed state
-    if (!hasInProgress && prevHadInProgress.current) {
-      prevHadInProgress.current = false;
-      fetchEpisodes(searchQuery, filters)
-        .then(setEpisodes)
-        .catch(() => {});
-      return;
-    }
-    prevHadInProgress.current = hasInProgress;
-
-    if (!hasInProgress) return;
-
-    const interval = setInterval(async () => {
-      try {
-        const data = await fetchEpisodes(searchQuery, filters);
-        checkForNewFailures(data);
-        setEpisodes(data);
-      } catch {
-        // silently ignore polling errors
-      }
-    }, 3000);
-
-    return () => clearInterval(interval);
-  }, [episodes, searchQuery, filters]);
+    if (!activeIds) return;
+    return subscribeEpisodes(activeIds.split(","), (update) => {
+      const fields = Object.fromEntries(
+        LIST_FIELDS.filter((k) => k in update).map((k) => [k, update[k]]),
+      );
+      setEpisodes((prev) => {
+        const next = prev.map((ep) =>
+          ep.id === update.id ? { ...ep, ...fields } : ep,
+        );
+        checkForNewFailures(next);
+        return next;
+      });
+    });
+  }, [activeIds]);
 
   const audioSrc = (url) => (url.startsWith("http") ? url : `/api${url}`);
 